@@ -0,0 +1,59 @@
+# benchmarks/common.py
+"""基準測試共用的統計與執行工具"""
+import asyncio
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(samples: List[float], elapsed: float) -> Dict[str, Any]:
+    return {
+        "operations": len(samples),
+        "elapsed_s": round(elapsed, 6),
+        "throughput_ops_s": round(len(samples) / elapsed, 2) if elapsed > 0 else None,
+        "p50_ms": round(percentile(samples, 50) * 1000, 4),
+        "p99_ms": round(percentile(samples, 99) * 1000, 4),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_isolated(coro) -> Any:
+    """
+    在暫存目錄中執行基準測試協程。
+    Cog 會將數據寫到目前目錄，因此不會覆蓋正式數據；Cog 的 print 輸出導向標準錯誤，保持標準輸出為純 JSON。
+    """
+    project_root = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            with contextlib.redirect_stdout(sys.stderr):
+                return asyncio.run(coro)
+        finally:
+            os.chdir(project_root)
+
+
+def write_results(results: Dict[str, Any], output: Optional[str] = None):
+    text = json.dumps(results, indent=4, ensure_ascii=False)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
@@ -0,0 +1,127 @@
+# benchmarks/cwa_fixture.py
+"""
+本機的中央氣象署 F-C0032-001 替身。
+
+回傳與正式 API 相同結構的合成預報，並統計收到的請求數，
+讓天氣快取與每日推播可以在離線環境中測試與進行基準測試。
+
+單獨執行 (於專案根目錄)：
+    python -m benchmarks.cwa_fixture --port 8080
+之後將 utils.weather.CWA_API_BASE 設為 http://127.0.0.1:8080 即可讓機器人改用此替身。
+"""
+import argparse
+import asyncio
+import socket
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from utils.weather import FORECAST_DATASET
+
+WEATHER_STATES = ["晴時多雲", "多雲", "多雲時陰", "陰短暫雨", "多雲午後短暫雷陣雨"]
+PERIOD_HOURS = 12
+PERIODS = 3
+
+
+def _fixture_cities() -> List[str]:
+    from cogs.weather import CITY_NAMES
+    return CITY_NAMES
+
+
+def build_location(name: str, start: datetime) -> Dict[str, Any]:
+    """依縣市名稱產生固定的合成預報，同一縣市每次結果相同"""
+    seed = sum(map(ord, name))
+    times = [
+        (start + timedelta(hours=PERIOD_HOURS * i), start + timedelta(hours=PERIOD_HOURS * (i + 1)))
+        for i in range(PERIODS)
+    ]
+
+    def element(element_name: str, values: List[str]) -> Dict[str, Any]:
+        return {
+            "elementName": element_name,
+            "time": [
+                {
+                    "startTime": begin.strftime("%Y-%m-%d %H:%M:%S"),
+                    "endTime": end.strftime("%Y-%m-%d %H:%M:%S"),
+                    "parameter": {"parameterName": value},
+                }
+                for (begin, end), value in zip(times, values)
+            ],
+        }
+
+    min_temps = [18 + (seed + i) % 8 for i in range(PERIODS)]
+    return {
+        "locationName": name,
+        "weatherElement": [
+            element("Wx", [WEATHER_STATES[(seed + i) % len(WEATHER_STATES)] for i in range(PERIODS)]),
+            element("PoP", [str((seed * 7 + i * 30) % 100) for i in range(PERIODS)]),
+            element("MinT", [str(t) for t in min_temps]),
+            element("MaxT", [str(t + 4 + (seed + i) % 5) for i, t in enumerate(min_temps)]),
+        ],
+    }
+
+
+class CWAFixture:
+    """以 aiohttp 提供 /F-C0032-001，可設定延遲以模擬網路往返"""
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+        self.locations_requested: Counter = Counter()
+        self.cities = _fixture_cities()
+        self.runner: Optional[web.AppRunner] = None
+        self.base_url: Optional[str] = None
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(f"/{FORECAST_DATASET}", self.handle_forecast)
+        return app
+
+    async def handle_forecast(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if not request.query.get("Authorization"):
+            return web.json_response({"success": "false", "message": "Unauthorized"}, status=401)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        requested = request.query.get("locationName")
+        names = [name for name in requested.split(",") if name] if requested else self.cities
+        self.locations_requested.update(names)
+        start = datetime.now().replace(minute=0, second=0, microsecond=0)
+        locations = [build_location(name, start) for name in names if name in self.cities]
+        return web.json_response({
+            "success": "true",
+            "result": {"resource_id": FORECAST_DATASET},
+            "records": {"datasetDescription": "三十六小時天氣預報", "location": locations},
+        })
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """啟動伺服器並回傳 base URL；port 為 0 時使用任意可用的埠"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        self.runner = web.AppRunner(self.build_app())
+        await self.runner.setup()
+        await web.SockSite(self.runner, sock).start()
+        self.base_url = f"http://{host}:{sock.getsockname()[1]}"
+        return self.base_url
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="中央氣象署 F-C0032-001 的本機替身")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="每個請求額外的延遲 (毫秒)")
+    args = parser.parse_args(argv)
+    fixture = CWAFixture(latency=args.latency_ms / 1000)
+    web.run_app(fixture.build_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
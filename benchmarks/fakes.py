@@ -0,0 +1,301 @@
+# benchmarks/fakes.py
+"""
+離線基準測試用的假 Discord 物件。
+只實作各 Cog 實際用到的屬性與方法，並統計每一種 REST 呼叫的次數，
+讓基準測試可以在沒有真實伺服器的情況下執行。
+"""
+import asyncio
+import itertools
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+_id_counter = itertools.count(10_000_000)
+
+
+def next_id() -> int:
+    return next(_id_counter)
+
+
+class RestCounter:
+    """統計假物件產生的 REST 呼叫次數"""
+    def __init__(self):
+        self.calls: Counter = Counter()
+
+    def hit(self, name: str):
+        self.calls[name] += 1
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(self.calls)
+
+
+class FakeRole:
+    def __init__(self, guild, name: str, position: int = 1):
+        self.id = next_id()
+        self.guild = guild
+        self.name = name
+        self.position = position
+        self.mention = f"<@&{self.id}>"
+
+    @property
+    def members(self) -> List["FakeMember"]:
+        return [member for member in self.guild.members if self in member.roles]
+
+    def __eq__(self, other):
+        return isinstance(other, FakeRole) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __lt__(self, other):
+        return self.position < other.position
+
+    def __le__(self, other):
+        return self.position <= other.position
+
+    def __gt__(self, other):
+        return self.position > other.position
+
+    def __ge__(self, other):
+        return self.position >= other.position
+
+
+class FakeUser:
+    def __init__(self, rest: RestCounter, name: str, bot: bool = False):
+        self.id = next_id()
+        self.name = name
+        self.display_name = name
+        self.bot = bot
+        self.mention = f"<@{self.id}>"
+        self._rest = rest
+
+    async def send(self, *args, **kwargs):
+        self._rest.hit("dm_send")
+
+
+class FakeMember(FakeUser):
+    def __init__(self, rest: RestCounter, guild, name: str, bot: bool = False, roles: Optional[List[FakeRole]] = None):
+        super().__init__(rest, name, bot)
+        self.guild = guild
+        self.roles: List[FakeRole] = [guild.default_role] + list(roles or [])
+
+    @property
+    def top_role(self) -> FakeRole:
+        return max(self.roles)
+
+    async def add_roles(self, *roles, **kwargs):
+        self._rest.hit("member_add_roles")
+        self.roles.extend(r for r in roles if r not in self.roles)
+
+    async def remove_roles(self, *roles, **kwargs):
+        self._rest.hit("member_remove_roles")
+        self.roles = [r for r in self.roles if r not in roles]
+
+    async def edit(self, *, roles=None, **kwargs):
+        self._rest.hit("member_edit")
+        if roles is not None:
+            self.roles = list(roles)
+
+
+class FakeReaction:
+    def __init__(self, emoji: str):
+        self.emoji = emoji
+        self._users: Dict[int, FakeUser] = {}
+
+    @property
+    def count(self) -> int:
+        return len(self._users)
+
+    async def users(self):
+        # 與 discord.py 相同，每 100 位使用者需要一次 REST 呼叫
+        for index, user in enumerate(list(self._users.values())):
+            if index % 100 == 0:
+                user._rest.hit("reaction_users_page")
+            yield user
+
+
+class FakeMessage:
+    def __init__(self, rest: RestCounter, channel, content: Optional[str] = None, embed=None, view=None):
+        self.id = next_id()
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+        self.embeds = [embed] if embed is not None else []
+        self.view = view
+        self._rest = rest
+        self._reactions: Dict[str, FakeReaction] = {}
+
+    @property
+    def reactions(self) -> List[FakeReaction]:
+        return list(self._reactions.values())
+
+    def add_user_reaction(self, emoji: str, user: FakeUser):
+        """模擬使用者在 Discord 用戶端按下反應 (不計入機器人的 REST 呼叫)"""
+        self._reactions.setdefault(emoji, FakeReaction(emoji))._users[user.id] = user
+
+    async def add_reaction(self, emoji):
+        self._rest.hit("message_add_reaction")
+        self._reactions.setdefault(str(emoji), FakeReaction(str(emoji)))
+
+    async def remove_reaction(self, emoji, member):
+        self._rest.hit("message_remove_reaction")
+        reaction = self._reactions.get(str(emoji))
+        if reaction:
+            reaction._users.pop(member.id, None)
+
+    async def edit(self, **kwargs):
+        self._rest.hit("message_edit")
+        if "embed" in kwargs:
+            self.embeds = [kwargs["embed"]]
+        return self
+
+
+class FakeTextChannel:
+    def __init__(self, rest: RestCounter, guild, name: str):
+        self.id = next_id()
+        self.guild = guild
+        self.name = name
+        self.mention = f"<#{self.id}>"
+        self._rest = rest
+        self._messages: Dict[int, FakeMessage] = {}
+
+    async def send(self, content: Optional[str] = None, *, embed=None, view=None, **kwargs):
+        self._rest.hit("channel_send")
+        message = FakeMessage(self._rest, self, content, embed, view)
+        self._messages[message.id] = message
+        return message
+
+    async def fetch_message(self, message_id: int) -> FakeMessage:
+        self._rest.hit("channel_fetch_message")
+        return self._messages[int(message_id)]
+
+    def get_partial_message(self, message_id: int) -> FakeMessage:
+        return self._messages[int(message_id)]
+
+
+class FakeGuild:
+    def __init__(self, rest: RestCounter, name: str = "bench-guild"):
+        self.id = next_id()
+        self.name = name
+        self._rest = rest
+        self.default_role = FakeRole(self, "@everyone", position=0)
+        self._roles: Dict[int, FakeRole] = {self.default_role.id: self.default_role}
+        self._members: Dict[int, FakeMember] = {}
+        self._channels: Dict[int, FakeTextChannel] = {}
+        self.me = self.add_member("bench-bot", bot=True, roles=[self.add_role("bot", position=1000)])
+
+    @property
+    def roles(self) -> List[FakeRole]:
+        return sorted(self._roles.values())
+
+    @property
+    def members(self) -> List[FakeMember]:
+        return list(self._members.values())
+
+    @property
+    def member_count(self) -> int:
+        return len(self._members)
+
+    def add_role(self, name: str, position: int = 1) -> FakeRole:
+        role = FakeRole(self, name, position)
+        self._roles[role.id] = role
+        return role
+
+    def add_member(self, name: str, bot: bool = False, roles: Optional[List[FakeRole]] = None) -> FakeMember:
+        member = FakeMember(self._rest, self, name, bot, roles)
+        self._members[member.id] = member
+        return member
+
+    def add_text_channel(self, name: str) -> FakeTextChannel:
+        channel = FakeTextChannel(self._rest, self, name)
+        self._channels[channel.id] = channel
+        return channel
+
+    def get_role(self, role_id: int) -> Optional[FakeRole]:
+        return self._roles.get(role_id)
+
+    def get_member(self, user_id: int) -> Optional[FakeMember]:
+        return self._members.get(user_id)
+
+    def get_channel(self, channel_id: int) -> Optional[FakeTextChannel]:
+        return self._channels.get(channel_id)
+
+
+class FakeRawReactionEvent:
+    """對應 discord.RawReactionActionEvent 中被 Cog 使用的欄位"""
+    def __init__(self, guild: FakeGuild, message: FakeMessage, member: FakeMember, emoji: str):
+        self.guild_id = guild.id
+        self.channel_id = message.channel.id
+        self.message_id = message.id
+        self.user_id = member.id
+        self.member = member
+        self.emoji = emoji
+
+
+class FakeCurrencyCog:
+    """與 cogs.currency.Currency 相同介面的記憶體版貨幣系統，latency 可模擬儲存層延遲"""
+    def __init__(self, default_balance: int = 0, latency: float = 0.0):
+        self.default_balance = default_balance
+        self.latency = latency
+        self.balances: Dict[int, int] = {}
+
+    async def _io(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def get_user_money(self, user_id: int) -> int:
+        await self._io()
+        return self.balances.get(user_id, self.default_balance)
+
+    async def deduct_user_money(self, user_id: int, amount: int) -> bool:
+        await self._io()
+        current = self.balances.get(user_id, self.default_balance)
+        if current < amount:
+            return False
+        self.balances[user_id] = current - amount
+        return True
+
+    async def add_user_money(self, user_id: int, amount: int):
+        await self._io()
+        self.balances[user_id] = self.balances.get(user_id, self.default_balance) + amount
+
+
+class FakeLevelingCog:
+    def __init__(self, default_level: int = 0):
+        self.default_level = default_level
+        self.levels: Dict[int, int] = {}
+
+    async def get_user_level(self, user_id: int) -> int:
+        return self.levels.get(user_id, self.default_level)
+
+
+class FakeBot:
+    """提供 Cog 會呼叫的 commands.Bot 方法"""
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.user = None
+        self._guilds: Dict[int, FakeGuild] = {}
+        self._cogs: Dict[str, Any] = {}
+        self._views: List[Any] = []
+
+    @property
+    def guilds(self) -> List[FakeGuild]:
+        return list(self._guilds.values())
+
+    def add_guild(self, guild: FakeGuild):
+        self._guilds[guild.id] = guild
+        self.user = guild.me
+
+    def add_fake_cog(self, name: str, cog: Any):
+        self._cogs[name] = cog
+
+    def get_guild(self, guild_id: int) -> Optional[FakeGuild]:
+        return self._guilds.get(guild_id)
+
+    def get_cog(self, name: str) -> Optional[Any]:
+        return self._cogs.get(name)
+
+    def add_view(self, view, *, message_id=None):
+        self._views.append(view)
+
+    async def wait_until_ready(self):
+        return None
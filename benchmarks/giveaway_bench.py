@@ -0,0 +1,167 @@
+# benchmarks/giveaway_bench.py
+"""
+抽獎系統離線基準測試。
+
+以假的 Guild / Member / Message / Reaction 與 Currency / Leveling Cog 驅動
+`Giveaways.on_raw_reaction_add` 的參與高峰以及 `Giveaways._end_giveaway`，
+並以 JSON 輸出吞吐量、p50/p99 延遲與記憶體峰值，方便比較不同版本。
+
+使用方式 (於專案根目錄執行)：
+    python -m benchmarks.giveaway_bench --entrants 1000 --prizes 10
+"""
+import argparse
+import asyncio
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from benchmarks.common import git_revision, run_isolated, summarize, write_results
+from benchmarks.fakes import (
+    FakeBot,
+    FakeCurrencyCog,
+    FakeGuild,
+    FakeLevelingCog,
+    FakeRawReactionEvent,
+    RestCounter,
+)
+
+ENTRY_EMOJI = "🎉"
+
+
+async def build_giveaway(args, rest: RestCounter):
+    from cogs.giveaways import Giveaways
+    from cogs.giveaway_data import get_guild_data
+
+    bot = FakeBot(asyncio.get_running_loop())
+    guild = FakeGuild(rest)
+    bot.add_guild(guild)
+    bot.add_fake_cog("Currency", FakeCurrencyCog(default_balance=args.balance))
+    bot.add_fake_cog("Leveling", FakeLevelingCog(default_level=args.level))
+    channel = guild.add_text_channel("giveaways")
+    members = [guild.add_member(f"user-{i}") for i in range(args.entrants)]
+
+    cog = Giveaways(bot)
+    guild_data = get_guild_data(cog.giveaway_data, guild.id)
+    guild_data["prize_pools"]["bench"] = {
+        "cost_token": args.cost,
+        "required_role_id": None,
+        "items": [
+            {"item_name": f"prize-{i}", "quantity": max(1, args.entrants // max(1, args.prizes)), "probability": 1 + i % 100}
+            for i in range(args.prizes)
+        ],
+    }
+
+    message = await channel.send(content="bench giveaway")
+    await message.add_reaction(ENTRY_EMOJI)
+    giveaway_info = {
+        "prize_pool_name": "bench",
+        "channel_id": channel.id,
+        "end_time": time.time() + 3600,
+        "entry_emoji": ENTRY_EMOJI,
+        "entry_mode": "reaction",
+        "cost_token": args.cost,
+        "required_entry_role_id": None,
+        "required_entry_level": args.required_level,
+        "participants": [],
+        "status": "active",
+        "max_participants": args.max_participants,
+    }
+    guild_data["active_giveaways"][str(message.id)] = giveaway_info
+    return bot, guild, channel, members, cog, message, giveaway_info
+
+
+async def run_reaction_burst(cog, guild, message, members) -> Dict[str, Any]:
+    samples: List[float] = []
+    started = time.perf_counter()
+    for member in members:
+        message.add_user_reaction(ENTRY_EMOJI, member)
+        payload = FakeRawReactionEvent(guild, message, member, ENTRY_EMOJI)
+        t0 = time.perf_counter()
+        await cog.on_raw_reaction_add(payload)
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples, time.perf_counter() - started)
+
+
+async def run_end_giveaway(cog, guild, channel, message, giveaway_info) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    await cog._end_giveaway(guild, channel, message, giveaway_info)
+    elapsed = time.perf_counter() - t0
+    result = summarize([elapsed], elapsed)
+    result["winners"] = len(giveaway_info.get("winners", []))
+    return result
+
+
+async def measure_peak_memory(args) -> float:
+    """以獨立的一輪量測參與高峰與開獎的記憶體峰值，不包含匯入 Cog 與建立假物件"""
+    rest = RestCounter()
+    bot, guild, channel, members, cog, message, giveaway_info = await build_giveaway(args, rest)
+    tracemalloc.start()
+    try:
+        await run_reaction_burst(cog, guild, message, members)
+        await run_end_giveaway(cog, guild, channel, message, giveaway_info)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        cog.cog_unload()
+    return round(peak / 1024, 1)
+
+
+async def run(args) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        "benchmark": "giveaways",
+        "revision": args.revision,
+        "python": sys.version.split()[0],
+        "params": {
+            "entrants": args.entrants,
+            "prizes": args.prizes,
+            "cost": args.cost,
+            "balance": args.balance,
+            "required_level": args.required_level,
+            "max_participants": args.max_participants,
+            "repeat": args.repeat,
+        },
+        "runs": [],
+    }
+    for _ in range(args.repeat):
+        # 計時與記憶體分開量測：tracemalloc 會拖慢每次配置，開啟時的延遲與吞吐量不具參考價值
+        rest = RestCounter()
+        bot, guild, channel, members, cog, message, giveaway_info = await build_giveaway(args, rest)
+        rest.calls.clear()
+        burst = await run_reaction_burst(cog, guild, message, members)
+        burst["rest_calls"] = rest.as_dict()
+        rest.calls.clear()
+        end = await run_end_giveaway(cog, guild, channel, message, giveaway_info)
+        end["rest_calls"] = rest.as_dict()
+        cog.cog_unload()
+
+        results["runs"].append({
+            "reaction_add": burst,
+            "end_giveaway": end,
+            "peak_memory_kib": await measure_peak_memory(args),
+        })
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Giveaways 離線基準測試")
+    parser.add_argument("--entrants", type=int, default=1000, help="參與人數")
+    parser.add_argument("--prizes", type=int, default=10, help="獎池中的獎品種類數")
+    parser.add_argument("--cost", type=int, default=0, help="每次參與消耗的代幣")
+    parser.add_argument("--balance", type=int, default=100, help="每位成員的初始代幣")
+    parser.add_argument("--required-level", type=int, default=0, help="參與所需等級")
+    parser.add_argument("--level", type=int, default=10, help="每位成員的等級")
+    parser.add_argument("--max-participants", type=int, default=0, help="參與人數上限 (0 為不限)")
+    parser.add_argument("--repeat", type=int, default=1, help="重複執行次數")
+    parser.add_argument("--output", help="將 JSON 結果寫入檔案，預設輸出至標準輸出")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.revision = git_revision()
+    write_results(run_isolated(run(args)), args.output)
+
+
+if __name__ == "__main__":
+    main()
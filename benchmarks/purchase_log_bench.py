@@ -0,0 +1,100 @@
+# benchmarks/purchase_log_bench.py
+"""
+購買紀錄離線基準測試。
+
+寫入大量購買紀錄後重新載入，測量載入時間、欄位陣列佔用的記憶體，
+以及 /購買紀錄 與 /商品銷售統計 所用查詢的 p50/p99 延遲。
+
+使用方式 (於專案根目錄執行)：
+    python -m benchmarks.purchase_log_bench --records 1000000
+"""
+import argparse
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import git_revision, run_isolated, summarize, write_results
+
+GUILD_ID = 123456789012345678
+
+
+def time_queries(query, keys: List[Any]) -> Dict[str, Any]:
+    samples: List[float] = []
+    started = time.perf_counter()
+    for key in keys:
+        t0 = time.perf_counter()
+        query(key)
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples, time.perf_counter() - started)
+
+
+async def run(args) -> Dict[str, Any]:
+    from utils.purchase_log import PurchaseLog
+
+    rng = random.Random(args.seed)
+    user_ids = [rng.randrange(10**17, 10**18) for _ in range(args.users)]
+    item_names = [f"商品-{i}" for i in range(args.items)]
+
+    log = PurchaseLog()
+    log.load()
+    started = time.perf_counter()
+    for _ in range(args.records):
+        price = rng.randint(1, 500)
+        log.append(GUILD_ID, rng.choice(user_ids), rng.choice(item_names), price if rng.random() > args.refund_ratio else -price)
+    append_elapsed = time.perf_counter() - started
+    log.close()
+
+    started = time.perf_counter()
+    log = PurchaseLog()
+    log.load()
+    load_elapsed = time.perf_counter() - started
+    column_bytes = sum(
+        column.buffer_info()[1] * column.itemsize
+        for column in (log.timestamps, log.user_ids, log.prices, log.item_codes)
+    )
+
+    user_keys = [rng.choice(user_ids) for _ in range(args.queries)]
+    item_keys = [rng.choice(item_names) for _ in range(args.queries)]
+    results = {
+        "benchmark": "purchase_log",
+        "revision": args.revision,
+        "python": sys.version.split()[0],
+        "params": {
+            "records": args.records,
+            "users": args.users,
+            "items": args.items,
+            "queries": args.queries,
+            "refund_ratio": args.refund_ratio,
+        },
+        "append_throughput_ops_s": round(args.records / append_elapsed, 2) if append_elapsed > 0 else None,
+        "load_s": round(load_elapsed, 3),
+        "column_memory_mib": round(column_bytes / 2**20, 1),
+        "user_history": time_queries(lambda user_id: log.user_history(GUILD_ID, user_id, 10), user_keys),
+        "item_stats": time_queries(lambda name: (log.get_item_stats(GUILD_ID, name), log.recent_item_records(GUILD_ID, name)), item_keys),
+        "top_items": time_queries(lambda _: log.top_items(GUILD_ID), item_keys[:min(args.queries, 1000)]),
+    }
+    log.close()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="購買紀錄離線基準測試")
+    parser.add_argument("--records", type=int, default=1_000_000, help="寫入的購買紀錄筆數")
+    parser.add_argument("--users", type=int, default=50_000, help="購買者人數")
+    parser.add_argument("--items", type=int, default=500, help="商品種類數")
+    parser.add_argument("--queries", type=int, default=10_000, help="每種查詢的次數")
+    parser.add_argument("--refund-ratio", type=float, default=0.01, help="退款紀錄的比例")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    parser.add_argument("--output", help="將 JSON 結果寫入檔案，預設輸出至標準輸出")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.revision = git_revision()
+    write_results(run_isolated(run(args)), args.output)
+
+
+if __name__ == "__main__":
+    main()
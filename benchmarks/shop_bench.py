@@ -0,0 +1,122 @@
+# benchmarks/shop_bench.py
+"""
+商店限量搶購離線基準測試。
+
+讓數百位假成員同時呼叫 `Shop.purchase_item` 搶購限量商品，
+以 JSON 輸出吞吐量、p50/p99 延遲、記憶體峰值，並檢查是否超賣或重複扣款。
+
+使用方式 (於專案根目錄執行)：
+    python -m benchmarks.shop_bench --buyers 500 --stock 100
+"""
+import argparse
+import asyncio
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from benchmarks.common import git_revision, run_isolated, summarize, write_results
+from benchmarks.fakes import FakeBot, FakeCurrencyCog, FakeGuild, RestCounter
+
+ITEM_NAME = "限量商品"
+
+
+async def run_once(args) -> Dict[str, Any]:
+    from cogs.shop import Shop, PurchaseError
+
+    rest = RestCounter()
+    bot = FakeBot(asyncio.get_running_loop())
+    guild = FakeGuild(rest)
+    bot.add_guild(guild)
+    currency = FakeCurrencyCog(default_balance=args.balance, latency=args.io_latency_ms / 1000)
+    bot.add_fake_cog("Currency", currency)
+    buyers = [guild.add_member(f"buyer-{i}") for i in range(args.buyers)]
+
+    shop = Shop(bot)
+    await shop.cog_load()
+    await shop.purchase_log_ready.wait()
+    shop.get_catalog(guild.id).add({
+        "name": ITEM_NAME,
+        "cost": args.price,
+        "gained_role_id": None,
+        "required_role_id": None,
+        "quantity": args.stock,
+    })
+
+    samples: List[float] = []
+    outcomes = {"sold": 0, "rejected": 0, "errors": 0}
+
+    async def buy(member):
+        t0 = time.perf_counter()
+        try:
+            await shop.purchase_item(guild, member, ITEM_NAME)
+            outcomes["sold"] += 1
+        except PurchaseError:
+            outcomes["rejected"] += 1
+        except Exception:
+            outcomes["errors"] += 1
+        samples.append(time.perf_counter() - t0)
+
+    # 每位買家同時送出 clicks 次點擊，模擬搶購時的連點
+    attempts = [buy(member) for member in buyers for _ in range(args.clicks)]
+    tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*attempts)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    shop.cog_unload()
+
+    charged = sum(args.balance - currency.balances.get(member.id, args.balance) for member in buyers)
+    remaining = shop.get_catalog(guild.id).get(ITEM_NAME)["quantity"]
+    result = summarize(samples, elapsed)
+    result.update(outcomes)
+    result.update({
+        "remaining_stock": remaining,
+        "total_charged": charged,
+        "oversold": outcomes["sold"] > args.stock or remaining < 0,
+        "charge_mismatch": charged != outcomes["sold"] * args.price,
+        "peak_memory_kib": round(peak / 1024, 1),
+    })
+    return result
+
+
+async def run(args) -> Dict[str, Any]:
+    return {
+        "benchmark": "shop_purchase",
+        "revision": args.revision,
+        "python": sys.version.split()[0],
+        "params": {
+            "buyers": args.buyers,
+            "clicks": args.clicks,
+            "stock": args.stock,
+            "price": args.price,
+            "balance": args.balance,
+            "io_latency_ms": args.io_latency_ms,
+            "repeat": args.repeat,
+        },
+        "runs": [await run_once(args) for _ in range(args.repeat)],
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Shop 限量搶購離線基準測試")
+    parser.add_argument("--buyers", type=int, default=500, help="同時搶購的買家數")
+    parser.add_argument("--clicks", type=int, default=2, help="每位買家同時點擊的次數")
+    parser.add_argument("--stock", type=int, default=100, help="商品庫存")
+    parser.add_argument("--price", type=int, default=10, help="商品價格")
+    parser.add_argument("--balance", type=int, default=15, help="每位買家的初始代幣")
+    parser.add_argument("--io-latency-ms", type=float, default=1.0, help="模擬貨幣儲存層每次操作的延遲 (毫秒)")
+    parser.add_argument("--repeat", type=int, default=1, help="重複執行次數")
+    parser.add_argument("--output", help="將 JSON 結果寫入檔案，預設輸出至標準輸出")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.revision = git_revision()
+    write_results(run_isolated(run(args)), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/weather_broadcast_bench.py
+"""
+每日天氣預報推播離線基準測試。
+
+以 benchmarks.cwa_fixture 取代中央氣象署 API，讓大量假伺服器各自訂閱數個縣市，
+測量一次推播的 API 請求數、渲染的縣市數、送出的訊息數與耗時，並以 JSON 輸出。
+
+使用方式 (於專案根目錄執行)：
+    python -m benchmarks.weather_broadcast_bench --guilds 500 --cities-per-guild 5
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from typing import Any, Dict
+
+from benchmarks.common import git_revision, run_isolated, write_results
+from benchmarks.cwa_fixture import CWAFixture
+from benchmarks.fakes import FakeBot, FakeGuild, RestCounter
+
+BROADCAST_HOUR = 7
+
+
+async def run(args) -> Dict[str, Any]:
+    import utils.weather as weather_utils
+    from cogs.weather import CITY_NAMES, Weather
+    from utils.rate_limiter import RateLimitedQueue
+
+    fixture = CWAFixture(latency=args.latency_ms / 1000)
+    weather_utils._client = weather_utils.CWAClient("fixture", await fixture.start())
+
+    rng = random.Random(args.seed)
+    rest = RestCounter()
+    bot = FakeBot(asyncio.get_running_loop())
+    cog = Weather(bot)
+    # 基準測試直接呼叫 broadcast，不需要背景排程
+    cog.prefetch_task.cancel()
+    cog.broadcast_task.cancel()
+    cog.broadcast_queue = RateLimitedQueue(args.send_interval)
+
+    subscribed_city_count = 0
+    for index in range(args.guilds):
+        guild = FakeGuild(rest, name=f"guild-{index}")
+        bot.add_guild(guild)
+        channel = guild.add_text_channel("weather")
+        cities = rng.sample(CITY_NAMES, min(args.cities_per_guild, len(CITY_NAMES)))
+        subscribed_city_count += len(cities)
+        cog.subscriptions[str(guild.id)] = {str(channel.id): {"cities": cities, "hour": BROADCAST_HOUR}}
+
+    runs = []
+    for label in ("cold_cache", "warm_cache"):
+        requests_before = fixture.requests
+        rest.calls.clear()
+        started = time.perf_counter()
+        stats = await cog.broadcast(BROADCAST_HOUR)
+        elapsed = time.perf_counter() - started
+        runs.append({
+            "cache": label,
+            "elapsed_s": round(elapsed, 4),
+            "api_requests": fixture.requests - requests_before,
+            "cities_rendered": stats["cities"],
+            "channels": stats["channels"],
+            "messages_sent": stats["messages"],
+            "failed": stats["failed"],
+            "rest_calls": rest.as_dict(),
+        })
+
+    await cog.cog_unload()
+    await fixture.stop()
+    return {
+        "benchmark": "weather_broadcast",
+        "revision": args.revision,
+        "python": sys.version.split()[0],
+        "params": {
+            "guilds": args.guilds,
+            "cities_per_guild": args.cities_per_guild,
+            "latency_ms": args.latency_ms,
+            "send_interval": args.send_interval,
+        },
+        # 每個伺服器、每個縣市各自呼叫 API 與渲染時需要的次數，作為對照
+        "naive_api_requests": subscribed_city_count,
+        "runs": runs,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="每日天氣預報推播離線基準測試")
+    parser.add_argument("--guilds", type=int, default=500, help="訂閱的伺服器數量")
+    parser.add_argument("--cities-per-guild", type=int, default=5, help="每個伺服器訂閱的縣市數")
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="替身 API 的回應延遲 (毫秒)")
+    parser.add_argument("--send-interval", type=float, default=0.0, help="推播佇列的訊息間隔秒數")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    parser.add_argument("--output", help="將 JSON 結果寫入檔案，預設輸出至標準輸出")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.revision = git_revision()
+    write_results(run_isolated(run(args)), args.output)
+
+
+if __name__ == "__main__":
+    main()
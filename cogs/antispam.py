@@ -0,0 +1,340 @@
+# cogs/antispam.py
+import discord
+from discord.ext import commands
+from discord import app_commands
+import asyncio
+import datetime
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Literal, Optional, Tuple
+
+from utils.purge import PurgeFilter, purge_messages
+from utils.sliding_window import SlidingWindowCounter
+
+ANTISPAM_CONFIG_FILE = 'antispam_config.json'
+WINDOW_BUCKETS = 10 # 每個滑動視窗切成的時間桶數量
+DUPLICATE_HISTORY = 8 # 每位使用者保留的最近訊息雜湊數量，重複上限不能超過此值
+MAX_TRACKED_USERS = 50000 # 同時追蹤的使用者上限，超過時淘汰最久沒有發言的使用者
+MAX_TRACKED_CHANNELS = 5000
+IDLE_EVICT_SECONDS = 300 # 超過此秒數沒有發言的使用者或頻道會被移除
+PURGE_SCAN_LIMIT = 200 # 刪除洗版訊息時最多檢查的訊息數
+
+DEFAULT_CONFIG = {
+    "enabled": False,
+    "window": 10, # 滑動視窗秒數
+    "max_messages": 8, # 單一使用者在視窗內的訊息上限
+    "max_duplicates": 4, # 單一使用者在視窗內重複相同內容的上限
+    "max_mentions": 10, # 單一使用者在視窗內提及人數的上限
+    "channel_max_messages": 40, # 單一頻道在視窗內的訊息上限 (突襲偵測)
+    "actions": ["timeout", "purge"], # 使用者觸發時的處置：timeout、purge
+    "timeout_seconds": 300,
+    "lock_channel": True, # 頻道觸發時是否暫時鎖定頻道
+    "lock_seconds": 120,
+    "log_channel_id": None
+}
+
+ACTION_PRESETS = {
+    "禁言並刪除": ["timeout", "purge"],
+    "只禁言": ["timeout"],
+    "只刪除訊息": ["purge"],
+    "只通知": []
+}
+
+class UserActivity:
+    """單一使用者的滑動視窗計數，記憶體大小固定"""
+    __slots__ = ("messages", "mentions", "hashes", "hash_times", "hash_pos", "last_seen", "flagged_until")
+
+    def __init__(self, window: float):
+        self.messages = SlidingWindowCounter(window, WINDOW_BUCKETS)
+        self.mentions = SlidingWindowCounter(window, WINDOW_BUCKETS)
+        self.hashes: List[int] = [0] * DUPLICATE_HISTORY
+        self.hash_times: List[float] = [float('-inf')] * DUPLICATE_HISTORY
+        self.hash_pos = 0
+        self.last_seen = 0.0
+        self.flagged_until = 0.0
+
+    def record_content(self, content_hash: int, now: float, window: float) -> int:
+        """記錄內容雜湊並回傳視窗內相同內容的次數 (包含這一次)"""
+        duplicates = 1 + sum(
+            1 for stored, seen in zip(self.hashes, self.hash_times)
+            if stored == content_hash and now - seen <= window
+        )
+        self.hashes[self.hash_pos] = content_hash
+        self.hash_times[self.hash_pos] = now
+        self.hash_pos = (self.hash_pos + 1) % DUPLICATE_HISTORY
+        return duplicates
+
+class ChannelActivity:
+    __slots__ = ("messages", "last_seen", "locked_until")
+
+    def __init__(self, window: float):
+        self.messages = SlidingWindowCounter(window, WINDOW_BUCKETS)
+        self.last_seen = 0.0
+        self.locked_until = 0.0
+
+class AntiSpam(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.config_file = ANTISPAM_CONFIG_FILE
+        self.configs: Dict[str, dict] = self._load_config()
+        # 以最後發言時間排序，最前面的項目永遠是最久沒有活動的，淘汰只需要檢查開頭
+        self.users: "OrderedDict[Tuple[int, int], UserActivity]" = OrderedDict()
+        self.channels: "OrderedDict[Tuple[int, int], ChannelActivity]" = OrderedDict()
+        self.action_tasks: set = set()
+        self.unlock_tasks: Dict[int, asyncio.Task] = {}
+
+    def _load_config(self) -> Dict[str, dict]:
+        if os.path.exists(self.config_file):
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                try:
+                    return json.load(f)
+                except json.JSONDecodeError:
+                    return {}
+        return {}
+
+    def _save_config(self):
+        with open(self.config_file, 'w', encoding='utf-8') as f:
+            json.dump(self.configs, f, indent=4, ensure_ascii=False)
+
+    def get_config(self, guild_id: int) -> dict:
+        return {**DEFAULT_CONFIG, **self.configs.get(str(guild_id), {})}
+
+    def cog_unload(self):
+        for task in list(self.action_tasks):
+            task.cancel()
+        # 取消解鎖排程時會立即恢復頻道權限
+        for task in self.unlock_tasks.values():
+            task.cancel()
+
+    def _reset_guild_state(self, guild_id: int):
+        """視窗長度改變時，舊的計數器無法沿用，清除該伺服器的追蹤狀態"""
+        for key in [key for key in self.users if key[0] == guild_id]:
+            del self.users[key]
+        for key in [key for key in self.channels if key[0] == guild_id]:
+            del self.channels[key]
+
+    @staticmethod
+    def _evict(tracked: OrderedDict, now: float, max_size: int):
+        while tracked:
+            _, oldest = next(iter(tracked.items()))
+            if len(tracked) <= max_size and now - oldest.last_seen < IDLE_EVICT_SECONDS:
+                break
+            tracked.popitem(last=False)
+
+    def _touch_user(self, key: Tuple[int, int], window: float, now: float) -> UserActivity:
+        activity = self.users.get(key)
+        if activity is None:
+            activity = self.users[key] = UserActivity(window)
+        else:
+            self.users.move_to_end(key)
+        activity.last_seen = now
+        self._evict(self.users, now, MAX_TRACKED_USERS)
+        return activity
+
+    def _touch_channel(self, key: Tuple[int, int], window: float, now: float) -> ChannelActivity:
+        activity = self.channels.get(key)
+        if activity is None:
+            activity = self.channels[key] = ChannelActivity(window)
+        else:
+            self.channels.move_to_end(key)
+        activity.last_seen = now
+        self._evict(self.channels, now, MAX_TRACKED_CHANNELS)
+        return activity
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.action_tasks.add(task)
+        task.add_done_callback(self.action_tasks.discard)
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        if message.guild is None or message.author.bot or not isinstance(message.author, discord.Member):
+            return
+        guild_config = self.configs.get(str(message.guild.id))
+        if not guild_config or not guild_config.get("enabled"):
+            return
+        if message.author.guild_permissions.manage_messages:
+            return
+
+        config = self.get_config(message.guild.id)
+        window = config["window"]
+        now = time.monotonic()
+
+        # 每則訊息只做固定次數的計數與比對
+        user = self._touch_user((message.guild.id, message.author.id), window, now)
+        message_count = user.messages.add(now)
+        mention_count = user.mentions.add(now, len(message.raw_mentions) + len(message.raw_role_mentions) + (5 if message.mention_everyone else 0))
+        content = message.content.strip().casefold()
+        duplicate_count = user.record_content(hash(content), now, window) if content else 0
+
+        channel = self._touch_channel((message.guild.id, message.channel.id), window, now)
+        channel_count = channel.messages.add(now)
+
+        reasons = []
+        if message_count > config["max_messages"]:
+            reasons.append(f"{window} 秒內發送 {message_count} 則訊息")
+        if duplicate_count > config["max_duplicates"]:
+            reasons.append(f"{window} 秒內重複相同內容 {duplicate_count} 次")
+        if mention_count > config["max_mentions"]:
+            reasons.append(f"{window} 秒內提及 {mention_count} 次")
+        if reasons and now >= user.flagged_until:
+            # 處置期間不重複觸發，計數仍持續累積
+            user.flagged_until = now + window
+            self._spawn(self.punish_member(message, config, reasons))
+
+        if config["lock_channel"] and channel_count > config["channel_max_messages"] and now >= channel.locked_until:
+            channel.locked_until = now + config["lock_seconds"]
+            self._spawn(self.lock_channel(message.channel, config, channel_count))
+
+    async def punish_member(self, message: discord.Message, config: dict, reasons: List[str]):
+        member = message.author
+        reason_text = "、".join(reasons)
+        results = []
+
+        if "timeout" in config["actions"]:
+            try:
+                await member.timeout(datetime.timedelta(seconds=config["timeout_seconds"]), reason=f"防洗版：{reason_text}")
+                results.append(f"已禁言 {config['timeout_seconds']} 秒")
+            except discord.HTTPException as e:
+                results.append(f"禁言失敗 ({e})")
+
+        if "purge" in config["actions"]:
+            # 只刪除該使用者最近在此頻道的訊息 (保留一倍視窗的緩衝，涵蓋處置前的延遲)
+            since = discord.utils.utcnow() - datetime.timedelta(seconds=config["window"] * 2)
+            try:
+                stats = await purge_messages(
+                    message.channel, PurgeFilter(user_id=member.id),
+                    after=discord.Object(id=discord.utils.time_snowflake(since)), scan_limit=PURGE_SCAN_LIMIT
+                )
+                results.append(f"已刪除 {stats.deleted} 則訊息")
+            except discord.HTTPException as e:
+                results.append(f"刪除訊息失敗 ({e})")
+
+        await self.send_log(
+            message.guild, config, "🚨 偵測到洗版",
+            f"成員：{member.mention} ({member.id})\n頻道：{message.channel.mention}\n原因：{reason_text}\n處置：{'、'.join(results) or '僅通知'}"
+        )
+
+    async def lock_channel(self, channel: discord.TextChannel, config: dict, channel_count: int):
+        default_role = channel.guild.default_role
+        overwrite = channel.overwrites_for(default_role)
+        original = overwrite.send_messages
+        if original is False:
+            return
+        overwrite.send_messages = False
+        try:
+            await channel.set_permissions(default_role, overwrite=overwrite, reason="防洗版：頻道訊息量異常，暫時鎖定")
+        except discord.HTTPException as e:
+            print(f"鎖定頻道 {channel.id} 失敗：{e}")
+            return
+
+        await self.send_log(
+            channel.guild, config, "🔒 頻道已暫時鎖定",
+            f"頻道：{channel.mention}\n原因：{config['window']} 秒內有 {channel_count} 則訊息\n將在 {config['lock_seconds']} 秒後自動解除。"
+        )
+        self.unlock_tasks[channel.id] = asyncio.create_task(self._unlock_later(channel, original, config["lock_seconds"]))
+
+    async def _unlock_later(self, channel: discord.TextChannel, original: Optional[bool], delay: float):
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            # 即使排程被取消 (例如卸載 Cog)，也要恢復原本的權限設定
+            self.unlock_tasks.pop(channel.id, None)
+            overwrite = channel.overwrites_for(channel.guild.default_role)
+            overwrite.send_messages = original
+            try:
+                await channel.set_permissions(channel.guild.default_role, overwrite=overwrite, reason="防洗版：自動解除鎖定")
+            except discord.HTTPException as e:
+                print(f"解除鎖定頻道 {channel.id} 失敗：{e}")
+
+    async def send_log(self, guild: discord.Guild, config: dict, title: str, description: str):
+        log_channel_id = config.get("log_channel_id")
+        if not log_channel_id:
+            return
+        log_channel = guild.get_channel(int(log_channel_id))
+        if log_channel is None:
+            return
+        embed = discord.Embed(title=title, description=description, color=discord.Color.red(), timestamp=discord.utils.utcnow())
+        try:
+            await log_channel.send(embed=embed)
+        except discord.HTTPException as e:
+            print(f"發送防洗版紀錄失敗：{e}")
+
+    @app_commands.command(name="防洗版設定", description="設定防洗版與突襲偵測（需管理權限）")
+    @app_commands.describe(
+        啟用="是否啟用防洗版",
+        視窗秒數="計算訊息量的滑動視窗長度",
+        訊息上限="單一成員在視窗內最多可發送的訊息數",
+        重複上限=f"單一成員在視窗內最多可重複相同內容的次數 (最多 {DUPLICATE_HISTORY})",
+        提及上限="單一成員在視窗內最多可提及的次數",
+        頻道訊息上限="單一頻道在視窗內的訊息上限，超過時視為突襲",
+        處置="成員觸發時的處置方式",
+        禁言秒數="禁言的秒數",
+        鎖定頻道="頻道觸發突襲偵測時是否暫時鎖定頻道",
+        鎖定秒數="鎖定頻道的秒數",
+        通知頻道="發送偵測紀錄的頻道"
+    )
+    @commands.has_permissions(manage_guild=True)
+    async def configure_antispam(
+        self,
+        interaction: discord.Interaction,
+        啟用: Optional[bool] = None,
+        視窗秒數: Optional[app_commands.Range[int, 2, 300]] = None,
+        訊息上限: Optional[app_commands.Range[int, 2, 500]] = None,
+        重複上限: Optional[app_commands.Range[int, 1, DUPLICATE_HISTORY - 1]] = None,
+        提及上限: Optional[app_commands.Range[int, 1, 500]] = None,
+        頻道訊息上限: Optional[app_commands.Range[int, 5, 5000]] = None,
+        處置: Optional[Literal["禁言並刪除", "只禁言", "只刪除訊息", "只通知"]] = None,
+        禁言秒數: Optional[app_commands.Range[int, 10, 2419200]] = None,
+        鎖定頻道: Optional[bool] = None,
+        鎖定秒數: Optional[app_commands.Range[int, 10, 86400]] = None,
+        通知頻道: Optional[discord.TextChannel] = None
+    ):
+        guild_config = self.configs.setdefault(str(interaction.guild_id), {})
+        updates = {
+            "enabled": 啟用,
+            "window": 視窗秒數,
+            "max_messages": 訊息上限,
+            "max_duplicates": 重複上限,
+            "max_mentions": 提及上限,
+            "channel_max_messages": 頻道訊息上限,
+            "actions": ACTION_PRESETS[處置] if 處置 else None,
+            "timeout_seconds": 禁言秒數,
+            "lock_channel": 鎖定頻道,
+            "lock_seconds": 鎖定秒數,
+            "log_channel_id": 通知頻道.id if 通知頻道 else None
+        }
+        if 視窗秒數 is not None and 視窗秒數 != self.get_config(interaction.guild_id)["window"]:
+            self._reset_guild_state(interaction.guild_id)
+        guild_config.update({key: value for key, value in updates.items() if value is not None})
+        self._save_config()
+        await interaction.response.send_message(embed=self._config_embed(interaction.guild_id), ephemeral=True)
+
+    @app_commands.command(name="防洗版狀態", description="查看目前的防洗版設定")
+    async def antispam_status(self, interaction: discord.Interaction):
+        await interaction.response.send_message(embed=self._config_embed(interaction.guild_id), ephemeral=True)
+
+    def _config_embed(self, guild_id: int) -> discord.Embed:
+        config = self.get_config(guild_id)
+        action_name = next((name for name, actions in ACTION_PRESETS.items() if actions == config["actions"]), "自訂")
+        embed = discord.Embed(
+            title="🛡️ 防洗版設定",
+            description="已啟用" if config["enabled"] else "未啟用 (使用 `/防洗版設定 啟用:True` 開啟)",
+            color=discord.Color.green() if config["enabled"] else discord.Color.greyple()
+        )
+        embed.add_field(name="視窗", value=f"{config['window']} 秒")
+        embed.add_field(name="訊息上限", value=str(config["max_messages"]))
+        embed.add_field(name="重複上限", value=str(config["max_duplicates"]))
+        embed.add_field(name="提及上限", value=str(config["max_mentions"]))
+        embed.add_field(name="處置", value=f"{action_name} (禁言 {config['timeout_seconds']} 秒)")
+        embed.add_field(
+            name="突襲偵測",
+            value=f"頻道 {config['channel_max_messages']} 則 / 視窗" + (f"，鎖定 {config['lock_seconds']} 秒" if config["lock_channel"] else "，不鎖定")
+        )
+        embed.add_field(name="通知頻道", value=f"<#{config['log_channel_id']}>" if config["log_channel_id"] else "未設定", inline=False)
+        return embed
+
+async def setup(bot):
+    await bot.add_cog(AntiSpam(bot))
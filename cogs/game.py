@@ -2,33 +2,72 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import random
+import secrets
 from typing import Literal
 
-# 新增一個用於處理猜測輸入的 Modal
+from utils.component_router import ComponentRouter, detach, modal_values
+
+# 新增一個用於處理猜測輸入的 Modal，送出後由 Game.on_interaction 處理
 class GuessModal(discord.ui.Modal):
-    def __init__(self, game_cog, digits: int):
-        super().__init__(title=f"猜測你的{digits}位數字")
-        self.game_cog = game_cog
-        self.digits = digits
+    def __init__(self, game_cog, digits: int, game_id: str):
+        super().__init__(title=f"猜測你的{digits}位數字", custom_id=game_cog.router.custom_id("submit", game_id))
         
         self.guess_input = discord.ui.TextInput(
             label=f"請輸入一個不重複的{digits}位數字",
             placeholder=f"例如：{''.join(map(str, range(digits)))}",
+            custom_id="guess",
             max_length=digits,
             min_length=digits,
         )
         self.add_item(self.guess_input)
+        detach(self)
 
-    async def on_submit(self, interaction: discord.Interaction):
-        user_id_str = str(interaction.user.id)
-        if user_id_str not in self.game_cog.games:
+# 猜數字按鈕，custom_id 帶有遊戲編號，舊遊戲留下的按鈕不會誤用到新遊戲
+class GuessButtonView(discord.ui.View):
+    def __init__(self, game_cog, game_id: str):
+        super().__init__(timeout=None)
+        self.add_item(discord.ui.Button(
+            label="猜數字",
+            style=discord.ButtonStyle.primary,
+            custom_id=game_cog.router.custom_id("guess", game_id)
+        ))
+        detach(self)
+
+class Game(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        # 儲存遊戲狀態，新增 'digits' 欄位
+        # {"user_id": {"secret": "1234", "attempts": 0, "digits": 4, "game_id": "1a2b3c4d"}}
+        self.games = {}
+        # 猜數字按鈕與 Modal 都依 custom_id 分派，不需要為每次猜測保存 View
+        self.router = ComponentRouter("1a2b")
+        self.router.add("guess", self._on_guess_button, 1)
+        self.router.add("submit", self._on_guess_submit, 1)
+
+    def _get_game(self, interaction: discord.Interaction, game_id: str):
+        game = self.games.get(str(interaction.user.id))
+        if game is None or game["game_id"] != game_id:
+            return None
+        return game
+
+    async def _on_guess_button(self, interaction: discord.Interaction, game_id: str):
+        game = self._get_game(interaction, game_id)
+        if game is None:
+            await interaction.response.send_message("你還沒有開始遊戲，或這個按鈕屬於已結束的遊戲！請先使用 `/開始遊戲`。", ephemeral=True)
+            return
+        
+        await interaction.response.send_modal(GuessModal(self, game["digits"], game_id))
+
+    async def _on_guess_submit(self, interaction: discord.Interaction, game_id: str):
+        game = self._get_game(interaction, game_id)
+        if game is None:
             await interaction.response.send_message("請先使用 `/開始遊戲` 指令來開始一局新的遊戲。", ephemeral=True)
             return
 
-        secret_number = self.game_cog.games[user_id_str]["secret"]
-        attempts = self.game_cog.games[user_id_str]["attempts"]
-        guess = self.guess_input.value
-        digits = self.digits
+        secret_number = game["secret"]
+        attempts = game["attempts"]
+        guess = modal_values(interaction).get("guess", "")
+        digits = game["digits"]
 
         if not guess.isdigit() or len(set(guess)) != digits or len(guess) != digits:
             await interaction.response.send_message(
@@ -42,44 +81,21 @@ class GuessModal(discord.ui.Modal):
         b = sum(1 for digit in guess if digit in secret_number) - a
         
         attempts += 1
-        self.game_cog.games[user_id_str]["attempts"] = attempts
+        game["attempts"] = attempts
 
         if a == digits:
             # 猜對了！
             response = f"恭喜你！🎉 你用 {attempts} 次猜對了數字 **{secret_number}**！"
-            del self.game_cog.games[user_id_str]
+            del self.games[str(interaction.user.id)]
             await interaction.response.send_message(response)
         else:
             # 猜錯了
             response = f"你的猜測是：`{guess}`，結果是 **{a}A{b}B**！\n你已經猜了 {attempts} 次。"
-            await interaction.response.send_message(response, view=GuessButtonView(self.game_cog))
-
-# 猜數字按鈕
-class GuessButton(discord.ui.Button):
-    def __init__(self, game_cog):
-        super().__init__(label="猜數字", style=discord.ButtonStyle.primary)
-        self.game_cog = game_cog
-
-    async def callback(self, interaction: discord.Interaction):
-        user_id_str = str(interaction.user.id)
-        if user_id_str not in self.game_cog.games:
-            await interaction.response.send_message("你還沒有開始遊戲！請先使用 `/開始遊戲`。", ephemeral=True)
-            return
-        
-        digits = self.game_cog.games[user_id_str]["digits"]
-        await interaction.response.send_modal(GuessModal(self.game_cog, digits))
-
-class GuessButtonView(discord.ui.View):
-    def __init__(self, game_cog):
-        super().__init__(timeout=None)
-        self.add_item(GuessButton(game_cog))
+            await interaction.response.send_message(response, view=GuessButtonView(self, game_id))
 
-class Game(commands.Cog):
-    def __init__(self, bot):
-        self.bot = bot
-        # 儲存遊戲狀態，新增 'digits' 欄位
-        # {"user_id": {"secret": "1234", "attempts": 0, "digits": 4}}
-        self.games = {}
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        await self.router.dispatch(interaction)
 
     def _generate_secret_number(self, digits: int):
         if not 1 <= digits <= 10:
@@ -106,13 +122,14 @@ class Game(commands.Cog):
         self.games[user_id_str] = {
             "secret": secret_number,
             "attempts": 0,
-            "digits": digits
+            "digits": digits,
+            "game_id": secrets.token_hex(4)
         }
         
         await interaction.response.send_message(
             f"遊戲開始！我已經想好了一個不重複的**{digits}位數字**。請點擊下面的「猜數字」按鈕開始猜測。", 
             ephemeral=True, 
-            view=GuessButtonView(self)
+            view=GuessButtonView(self, self.games[user_id_str]["game_id"])
         )
 
     @app_commands.command(name="結束遊戲", description="結束當前的 1a2b 遊戲")
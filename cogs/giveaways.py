@@ -6,18 +6,41 @@ import os
 import asyncio
 import datetime
 import random
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Tuple, Literal
 
 from .giveaway_data import load_giveaway_data, save_giveaway_data, get_guild_data
 from .giveaway_utils import parse_duration
 
+# 參與人數計數器的最短更新間隔（秒），無論有多少人參與，每則抽獎訊息在此間隔內最多只會編輯一次
+PARTICIPANT_COUNTER_INTERVAL = 5
+PARTICIPANT_COUNTER_FIELD_NAME = "目前參與人數"
+
+class GiveawayEntryView(discord.ui.View):
+    """按鈕參與模式的常駐視圖，所有抽獎訊息共用同一個 custom_id"""
+    def __init__(self, giveaway_cog):
+        super().__init__(timeout=None)
+        self.giveaway_cog = giveaway_cog
+
+    @discord.ui.button(label="參與抽獎", style=discord.ButtonStyle.success, emoji="🎉", custom_id="giveaway_entry_button")
+    async def entry_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.giveaway_cog._handle_button_entry(interaction)
+
 class Giveaways(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.giveaway_data: Dict[str, Any] = load_giveaway_data()
         self.active_giveaway_tasks: Dict[str, asyncio.Task] = {}
+        self.entry_view = GiveawayEntryView(self)
+        # 參與人數計數器：每則抽獎訊息最多只有一個等待中的編輯任務
+        self.counter_update_tasks: Dict[str, asyncio.Task] = {}
+        self.counter_messages: Dict[str, discord.Message] = {}
         self.bot.loop.create_task(self.check_unfinished_giveaways())
 
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # 機器人啟動時，重新註冊按鈕參與的常駐視圖
+        self.bot.add_view(self.entry_view)
+
     async def check_unfinished_giveaways(self):
         await self.bot.wait_until_ready()
         print("機器人已就緒，檢查是否有未處理的抽獎活動。")
@@ -245,7 +268,8 @@ class Giveaways(commands.Cog):
         抽獎訊息="抽獎活動的簡短說明或標題",
         參與反應="使用者點擊此反應符號即可參與抽獎",
         所需等級="參與抽獎所需的最低等級",
-        參與人數上限="最多允許參與抽獎的人數"
+        參與人數上限="最多允許參與抽獎的人數",
+        參與方式="使用反應符號或按鈕參與 (預設為反應)"
     )
     @commands.has_permissions(manage_guild=True)
     async def start_giveaway(
@@ -256,7 +280,8 @@ class Giveaways(commands.Cog):
         抽獎訊息: Optional[str] = "點擊 🎉 參與抽獎！",
         參與反應: Optional[str] = "🎉",
         所需等級: app_commands.Range[int, 0] = 0,
-        參與人數上限: app_commands.Range[int, 0] = 100
+        參與人數上限: app_commands.Range[int, 0] = 100,
+        參與方式: Literal["反應", "按鈕"] = "反應"
     ):
         await interaction.response.defer(ephemeral=True)
         guild_data = get_guild_data(self.giveaway_data, interaction.guild_id)
@@ -279,6 +304,7 @@ class Giveaways(commands.Cog):
         cost_token = prize_pool_data.get("cost_token", 0)
         required_entry_role_id = prize_pool_data.get("required_role_id")
         required_entry_role = interaction.guild.get_role(int(required_entry_role_id)) if required_entry_role_id else None
+        entry_mode = "button" if 參與方式 == "按鈕" else "reaction"
 
         embed = discord.Embed(
             title=f"🎁 抽獎活動：{獎池} 🎁",
@@ -287,23 +313,28 @@ class Giveaways(commands.Cog):
                 f"獎池：`{獎池}`\n"
                 f"結束時間：<t:{int(end_time.timestamp())}:R>\n"
                 + (f"最多參與人數：`{參與人數上限}`\n" if 參與人數上限 > 0 else "參與人數：`無限制`\n")
-                + f"參與反應：{參與反應}\n"
+                + (f"參與反應：{參與反應}\n" if entry_mode == "reaction" else "參與方式：點擊下方按鈕\n")
                 + (f"每次參與需消耗：`{cost_token}` 代幣\n" if cost_token > 0 else "")
                 + (f"所需身分組：{required_entry_role.mention}\n" if required_entry_role else "")
                 + (f"所需等級：`{所需等級}` 等級\n" if 所需等級 > 0 else "")
             ),
             color=discord.Color.green()
         )
-        embed.set_footer(text="點擊下面的反應符號參與！")
+        embed.set_footer(text="點擊下面的反應符號參與！" if entry_mode == "reaction" else "點擊下面的按鈕參與，再次點擊可退出！")
 
         prizes_list = []
         for item in prize_pool_data["items"]:
             prizes_list.append(f"- {item['item_name']} x{item['quantity']} (機率: {item['probability']}%)")
         embed.add_field(name="獎品列表", value="\n".join(prizes_list), inline=False)
+        if entry_mode == "button":
+            embed.add_field(name=PARTICIPANT_COUNTER_FIELD_NAME, value="`0`", inline=False)
 
         try:
-            giveaway_message = await interaction.channel.send(embed=embed)
-            await giveaway_message.add_reaction(參與反應)
+            if entry_mode == "button":
+                giveaway_message = await interaction.channel.send(embed=embed, view=self.entry_view)
+            else:
+                giveaway_message = await interaction.channel.send(embed=embed)
+                await giveaway_message.add_reaction(參與反應)
         except discord.Forbidden:
             await interaction.followup.send("我沒有足夠的權限在該頻道發送訊息或添加反應符號。")
             return
@@ -316,6 +347,7 @@ class Giveaways(commands.Cog):
             "channel_id": interaction.channel.id,
             "end_time": end_time.timestamp(),
             "entry_emoji": 參與反應,
+            "entry_mode": entry_mode,
             "cost_token": cost_token,
             "required_entry_role_id": required_entry_role_id,
             "required_entry_level": 所需等級,
@@ -361,20 +393,25 @@ class Giveaways(commands.Cog):
             return
 
         reacted_users_ids = []
-        try:
-            message = await channel.fetch_message(int(message_id_str))
-            for reaction in message.reactions:
-                if str(reaction.emoji) == giveaway_info["entry_emoji"]:
-                    async for user in reaction.users():
-                        if not user.bot:
-                            reacted_users_ids.append(str(user.id))
-                    break
-        except (discord.NotFound, discord.Forbidden):
-            print(f"警告: 無法獲取抽獎訊息 {message_id_str} 的反應。將使用儲存的參與者列表。")
-            reacted_users_ids = giveaway_info["participants"]
-        except Exception as e:
-            print(f"獲取反應時發生錯誤: {e}。將使用儲存的參與者列表。")
+        self._cancel_counter_update(message_id_str)
+        if giveaway_info.get("entry_mode") == "button":
+            # 按鈕模式的參與者已在點擊時記錄，不需要讀取反應
             reacted_users_ids = giveaway_info["participants"]
+        else:
+            try:
+                message = await channel.fetch_message(int(message_id_str))
+                for reaction in message.reactions:
+                    if str(reaction.emoji) == giveaway_info["entry_emoji"]:
+                        async for user in reaction.users():
+                            if not user.bot:
+                                reacted_users_ids.append(str(user.id))
+                        break
+            except (discord.NotFound, discord.Forbidden):
+                print(f"警告: 無法獲取抽獎訊息 {message_id_str} 的反應。將使用儲存的參與者列表。")
+                reacted_users_ids = giveaway_info["participants"]
+            except Exception as e:
+                print(f"獲取反應時發生錯誤: {e}。將使用儲存的參與者列表。")
+                reacted_users_ids = giveaway_info["participants"]
 
         participants_ids = list(set(reacted_users_ids))
         eligible_participants: List[discord.Member] = []
@@ -417,10 +454,11 @@ class Giveaways(commands.Cog):
                         await currency_cog.deduct_user_money(member.id, cost_token)
                         final_participants.append(member)
                     else:
-                        try:
-                            await message.remove_reaction(giveaway_info["entry_emoji"], member)
-                        except discord.HTTPException:
-                            pass
+                        if giveaway_info.get("entry_mode") != "button":
+                            try:
+                                await message.remove_reaction(giveaway_info["entry_emoji"], member)
+                            except discord.HTTPException:
+                                pass
                         await member.send(f"很抱歉，您在抽獎 `{prize_pool_name}` 中代幣不足，未能參與。所需代幣: {cost_token}")
                 except AttributeError:
                     await channel.send("⚠️ 抽獎代幣系統未正常運作，本次抽獎將免費參與。")
@@ -497,6 +535,57 @@ class Giveaways(commands.Cog):
         
         save_giveaway_data(self.giveaway_data)
 
+    async def _check_entry_eligibility(self, guild: discord.Guild, guild_data: Dict[str, Any], giveaway: Dict[str, Any], member: discord.Member) -> Tuple[bool, Optional[str]]:
+        """
+        檢查成員是否可以參與抽獎。
+        回傳 (是否接受, 訊息)：被拒絕時訊息為原因；接受時訊息為需要告知成員的警告 (可為 None)。
+        """
+        prize_pool_name = giveaway["prize_pool_name"]
+        prize_pool_data = guild_data["prize_pools"].get(prize_pool_name)
+
+        if not prize_pool_data:
+            return False, f"很抱歉，抽獎 `{prize_pool_name}` 的配置有誤，請聯繫管理員。"
+
+        pool_required_role_id = prize_pool_data.get("required_role_id")
+        if pool_required_role_id:
+            required_role = guild.get_role(int(pool_required_role_id))
+            if required_role and required_role not in member.roles:
+                return False, f"您需要擁有 `{required_role.name}` 身分組才能參與。"
+
+        required_level = giveaway.get("required_entry_level", 0)
+        if required_level > 0:
+            user_level = 0
+            leveling_cog = self.bot.get_cog('Leveling')
+            if leveling_cog:
+                try:
+                    user_level = await leveling_cog.get_user_level(member.id)
+                except AttributeError:
+                    pass
+
+            if user_level < required_level:
+                return False, f"您目前的等級是 `{user_level}`，所需最低等級為 `{required_level}`。"
+
+        current_participants_count = len(set(giveaway["participants"]))
+        max_participants_limit = giveaway.get("max_participants", 0)
+
+        if max_participants_limit > 0 and current_participants_count >= max_participants_limit and str(member.id) not in giveaway["participants"]:
+            return False, f"抽獎已達參與人數上限 (`{max_participants_limit}` 人)。"
+
+        cost_token = giveaway.get("cost_token", 0)
+        if cost_token > 0:
+            currency_cog = self.bot.get_cog('Currency')
+            if currency_cog:
+                try:
+                    user_balance = await currency_cog.get_user_money(member.id)
+                    if user_balance < cost_token:
+                        return False, f"您所需 `{cost_token}` 代幣不足。"
+                except (AttributeError, Exception):
+                    return True, "警告：機器人貨幣系統暫時無法運作，無法檢查您的代幣餘額。請通知管理員。"
+            else:
+                return True, "警告：抽獎需要代幣，但貨幣系統未找到。本次參與可能不計入代幣消耗。"
+
+        return True, None
+
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
         if payload.guild_id is None or payload.member.bot:
@@ -512,63 +601,16 @@ class Giveaways(commands.Cog):
 
         if str(payload.message_id) in active_giveaways:
             giveaway = active_giveaways[str(payload.message_id)]
-            if giveaway["status"] != "active":
+            if giveaway["status"] != "active" or giveaway.get("entry_mode") == "button":
                 return
 
             if str(payload.emoji) != giveaway["entry_emoji"]:
                 return
 
-            prize_pool_name = giveaway["prize_pool_name"]
-            prize_pool_data = guild_data["prize_pools"].get(prize_pool_name)
-
-            if not prize_pool_data:
-                await member.send(f"很抱歉，抽獎 `{giveaway['prize_pool_name']}` 的配置有誤，請聯繫管理員。")
-                try:
-                    channel = guild.get_channel(giveaway["channel_id"])
-                    if channel:
-                        message = await channel.fetch_message(payload.message_id)
-                        await message.remove_reaction(payload.emoji, member)
-                except discord.HTTPException: pass
-                return
-
-            pool_required_role_id = prize_pool_data.get("required_role_id")
-            if pool_required_role_id:
-                required_role = guild.get_role(int(pool_required_role_id))
-                if required_role and required_role not in member.roles:
-                    await member.send(f"您需要擁有 `{required_role.name}` 身分組才能參與。")
-                    try:
-                        channel = guild.get_channel(giveaway["channel_id"])
-                        if channel:
-                            message = await channel.fetch_message(payload.message_id)
-                            await message.remove_reaction(payload.emoji, member)
-                    except discord.HTTPException: pass
-                    return
-
-            required_level = giveaway.get("required_entry_level", 0)
-            if required_level > 0:
-                user_level = 0
-                leveling_cog = self.bot.get_cog('Leveling')
-                if leveling_cog:
-                    try:
-                        user_level = await leveling_cog.get_user_level(member.id)
-                    except AttributeError:
-                        pass
-                
-                if user_level < required_level:
-                    await member.send(f"您目前的等級是 `{user_level}`，所需最低等級為 `{required_level}`。")
-                    try:
-                        channel = guild.get_channel(giveaway["channel_id"])
-                        if channel:
-                            message = await channel.fetch_message(payload.message_id)
-                            await message.remove_reaction(payload.emoji, member)
-                    except discord.HTTPException: pass
-                    return
-
-            current_participants_count = len(set(giveaway["participants"]))
-            max_participants_limit = giveaway.get("max_participants", 0)
-            
-            if max_participants_limit > 0 and current_participants_count >= max_participants_limit and str(member.id) not in giveaway["participants"]:
-                await member.send(f"抽獎已達參與人數上限 (`{max_participants_limit}` 人)。")
+            accepted, notice = await self._check_entry_eligibility(guild, guild_data, giveaway, member)
+            if notice:
+                await member.send(notice)
+            if not accepted:
                 try:
                     channel = guild.get_channel(giveaway["channel_id"])
                     if channel:
@@ -577,29 +619,90 @@ class Giveaways(commands.Cog):
                 except discord.HTTPException: pass
                 return
 
-            cost_token = giveaway.get("cost_token", 0)
-            if cost_token > 0:
-                currency_cog = self.bot.get_cog('Currency')
-                if currency_cog:
-                    try:
-                        user_balance = await currency_cog.get_user_money(member.id)
-                        if user_balance < cost_token:
-                            await member.send(f"您所需 `{cost_token}` 代幣不足。")
-                            try:
-                                channel = guild.get_channel(giveaway["channel_id"])
-                                if channel:
-                                    message = await channel.fetch_message(payload.message_id)
-                                    await message.remove_reaction(payload.emoji, member)
-                            except discord.HTTPException: pass
-                            return
-                    except (AttributeError, Exception):
-                        await member.send("警告：機器人貨幣系統暫時無法運作，無法檢查您的代幣餘額。請通知管理員。")
-                else:
-                    await member.send("警告：抽獎需要代幣，但貨幣系統未找到。本次參與可能不計入代幣消耗。")
-            
             giveaway["participants"].append(str(member.id))
             save_giveaway_data(self.giveaway_data)
 
+    async def _handle_button_entry(self, interaction: discord.Interaction):
+        """處理按鈕參與：只以暫時性回覆告知結果，拒絕時不產生任何額外的 API 呼叫"""
+        guild = interaction.guild
+        member = interaction.user
+        message_id_str = str(interaction.message.id)
+
+        guild_data = get_guild_data(self.giveaway_data, guild.id)
+        giveaway = guild_data.get("active_giveaways", {}).get(message_id_str)
+        if not giveaway or giveaway["status"] != "active":
+            await interaction.response.send_message("此抽獎活動已結束或不存在。", ephemeral=True)
+            return
+
+        user_id_str = str(member.id)
+        if user_id_str in giveaway["participants"]:
+            # 再次點擊視為退出抽獎
+            while user_id_str in giveaway["participants"]:
+                giveaway["participants"].remove(user_id_str)
+            save_giveaway_data(self.giveaway_data)
+            await interaction.response.send_message(f"您已退出抽獎 `{giveaway['prize_pool_name']}`。", ephemeral=True)
+            self._schedule_counter_update(interaction.message)
+            return
+
+        accepted, notice = await self._check_entry_eligibility(guild, guild_data, giveaway, member)
+        if not accepted:
+            await interaction.response.send_message(f"❌ {notice}", ephemeral=True)
+            return
+
+        # 資格檢查期間其他點擊可能已經加入，加入前再檢查一次人數上限 (兩者之間不可有 await)
+        max_participants_limit = giveaway.get("max_participants", 0)
+        if max_participants_limit > 0 and len(set(giveaway["participants"])) >= max_participants_limit and user_id_str not in giveaway["participants"]:
+            await interaction.response.send_message(f"❌ 抽獎已達參與人數上限 (`{max_participants_limit}` 人)。", ephemeral=True)
+            return
+        if user_id_str not in giveaway["participants"]:
+            giveaway["participants"].append(user_id_str)
+        save_giveaway_data(self.giveaway_data)
+        reply = f"✅ 您已成功參與抽獎 `{giveaway['prize_pool_name']}`！再次點擊按鈕可退出。"
+        if notice:
+            reply += f"\n{notice}"
+        await interaction.response.send_message(reply, ephemeral=True)
+        self._schedule_counter_update(interaction.message)
+
+    def _schedule_counter_update(self, message: discord.Message):
+        """排程更新參與人數；已有等待中的更新時只替換訊息物件，不會產生新的編輯"""
+        message_id_str = str(message.id)
+        self.counter_messages[message_id_str] = message
+        if message_id_str not in self.counter_update_tasks:
+            self.counter_update_tasks[message_id_str] = asyncio.create_task(self._run_counter_update(message_id_str))
+
+    def _cancel_counter_update(self, message_id_str: str):
+        task = self.counter_update_tasks.pop(message_id_str, None)
+        if task and task is not asyncio.current_task():
+            task.cancel()
+        self.counter_messages.pop(message_id_str, None)
+
+    async def _run_counter_update(self, message_id_str: str):
+        try:
+            await asyncio.sleep(PARTICIPANT_COUNTER_INTERVAL)
+            message = self.counter_messages.pop(message_id_str, None)
+            # 先移除任務，讓編輯期間的新參與排入下一個更新週期
+            self.counter_update_tasks.pop(message_id_str, None)
+            if not message or not message.embeds:
+                return
+
+            giveaway = get_guild_data(self.giveaway_data, message.guild.id)["active_giveaways"].get(message_id_str)
+            if not giveaway or giveaway["status"] != "active":
+                return
+
+            embed = message.embeds[0].copy()
+            count_value = f"`{len(set(giveaway['participants']))}`"
+            for index, field in enumerate(embed.fields):
+                if field.name == PARTICIPANT_COUNTER_FIELD_NAME:
+                    embed.set_field_at(index, name=PARTICIPANT_COUNTER_FIELD_NAME, value=count_value, inline=False)
+                    break
+            else:
+                embed.add_field(name=PARTICIPANT_COUNTER_FIELD_NAME, value=count_value, inline=False)
+            await message.edit(embed=embed)
+        except asyncio.CancelledError:
+            pass
+        except discord.HTTPException as e:
+            print(f"更新抽獎 {message_id_str} 的參與人數時發生錯誤: {e}")
+
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
         if payload.guild_id is None:
@@ -614,7 +717,7 @@ class Giveaways(commands.Cog):
 
         if str(payload.message_id) in active_giveaways:
             giveaway = active_giveaways[str(payload.message_id)]
-            if giveaway["status"] != "active":
+            if giveaway["status"] != "active" or giveaway.get("entry_mode") == "button":
                 return
             
             if str(payload.emoji) != giveaway["entry_emoji"]:
@@ -628,6 +731,8 @@ class Giveaways(commands.Cog):
     def cog_unload(self):
         for task in self.active_giveaway_tasks.values():
             task.cancel()
+        for task in self.counter_update_tasks.values():
+            task.cancel()
         print("所有活躍抽獎的任務已取消。")
 
 async def setup(bot):
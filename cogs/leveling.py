@@ -105,6 +105,10 @@ class Leveling(commands.Cog):
         self.bot = bot
         self.leveling_data = LevelingData()
 
+    async def get_user_level(self, user_id: int) -> int:
+        """供其他 Cog 查詢等級，只讀取記憶體中的資料，不會建立新紀錄或寫入檔案"""
+        return self.leveling_data.data.get(str(user_id), {}).get("level", 0)
+
     @commands.Cog.listener()
     async def on_message(self, message):
         if message.author.bot:
@@ -2,8 +2,38 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
+import asyncio
 import json
 import os
+import time
+from typing import Dict, List, Literal, Tuple
+
+from utils.coalescer import AdaptiveCoalescer
+from utils.member_stats import MemberGrowthStore, sparkline
+from utils.message_template import PLACEHOLDERS, MessageTemplate, TemplateError, format_account_age
+
+# 短時間內大量成員加入或離開時，合併成一則訊息的設定
+COALESCE_MIN_INTERVAL = 2.0 # 同一伺服器兩則訊息之間的最短間隔（秒），安靜時立即發送
+COALESCE_MAX_INTERVAL = 30.0 # 持續湧入時合併的最長間隔（秒）
+COALESCE_MAX_MENTIONS = 20 # 單則訊息最多標記的成員數，其餘以人數顯示
+MAX_MESSAGE_LENGTH = 2000
+GROWTH_SAVE_INTERVAL = 60 # 成員成長紀錄有變動時，寫入檔案的間隔（秒）
+
+# 指令的統計範圍 -> (解析度, 格數, 趨勢圖解析度, 趨勢圖格數, 趨勢圖說明)
+GROWTH_RANGES = {
+    "過去一小時": ("minute", 60, "minute", 60, "每分鐘"),
+    "過去一天": ("hour", 24, "hour", 24, "每小時"),
+    "過去一週": ("hour", 168, "day", 7, "每天"),
+    "過去一個月": ("hour", 720, "day", 30, "每天"),
+    "過去一年": ("day", 365, "day", 365, "每天")
+}
+
+def format_member_list(members: List[discord.abc.User], overflow: int) -> str:
+    """將成員列表格式化為「@a、@b 以及其他 47 位成員」"""
+    mentions = "、".join(member.mention for member in members)
+    if overflow:
+        return f"{mentions} 以及其他 {overflow} 位成員"
+    return mentions
 
 class MemberEvents(commands.Cog):
     def __init__(self, bot):
@@ -12,6 +42,33 @@ class MemberEvents(commands.Cog):
         self.goodbye_file = 'goodbye_messages.json'
         self.welcome_messages = self.load_data(self.welcome_file)
         self.goodbye_messages = self.load_data(self.goodbye_file)
+        # 編譯後的範本：("welcome" 或 "goodbye") -> {guild_id: MessageTemplate}
+        self.templates: Dict[str, Dict[str, MessageTemplate]] = {
+            "welcome": self.compile_templates(self.welcome_messages),
+            "goodbye": self.compile_templates(self.goodbye_messages)
+        }
+        # key 為 ("welcome" 或 "goodbye", guild_id)
+        self.coalescer = AdaptiveCoalescer(
+            self.send_member_message, COALESCE_MIN_INTERVAL, COALESCE_MAX_INTERVAL, COALESCE_MAX_MENTIONS
+        )
+        self.growth = MemberGrowthStore()
+        self.growth_save_task = self.bot.loop.create_task(self.save_growth_periodically())
+
+    async def cog_unload(self):
+        self.growth_save_task.cancel()
+        if self.growth.dirty:
+            self.growth.save()
+        # 送出尚在累積中的訊息
+        await self.coalescer.flush_all()
+
+    async def save_growth_periodically(self):
+        while True:
+            await asyncio.sleep(GROWTH_SAVE_INTERVAL)
+            if self.growth.dirty:
+                try:
+                    self.growth.save()
+                except OSError as e:
+                    print(f"儲存成員成長紀錄時發生錯誤：{e}")
 
     def load_data(self, filename):
         if os.path.exists(filename):
@@ -23,43 +80,126 @@ class MemberEvents(commands.Cog):
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=4)
 
+    @staticmethod
+    def compile_templates(settings: Dict[str, dict]) -> Dict[str, MessageTemplate]:
+        templates = {}
+        for guild_id, data in settings.items():
+            try:
+                templates[guild_id] = MessageTemplate(data['message'])
+            except TemplateError as e:
+                # 舊版設定未經驗證，無法解析時以純文字發送
+                print(f"伺服器 {guild_id} 的訊息範本格式錯誤，將以純文字發送：{e}")
+                templates[guild_id] = MessageTemplate.literal(data['message'])
+        return templates
+
+    async def save_message_setting(self, interaction: discord.Interaction, kind: str, channel: discord.TextChannel, message: str) -> bool:
+        """驗證並編譯範本後儲存，格式錯誤時回覆錯誤訊息並回傳 False"""
+        try:
+            template = MessageTemplate(message)
+        except TemplateError as e:
+            await interaction.response.send_message(f"訊息格式錯誤：{e}", ephemeral=True)
+            return False
+        await interaction.response.defer(ephemeral=True)
+        guild_id = str(interaction.guild_id)
+        data, filename = (self.welcome_messages, self.welcome_file) if kind == "welcome" else (self.goodbye_messages, self.goodbye_file)
+        data[guild_id] = {'channel_id': channel.id, 'message': message}
+        self.templates[kind][guild_id] = template
+        self.save_data(data, filename)
+        return True
+
+    @app_commands.command(name="訊息標記說明", description="列出歡迎與離開訊息可使用的標記")
+    async def template_help(self, interaction: discord.Interaction):
+        lines = [f"`{{{name}}}`：{description}" for name, description in PLACEHOLDERS.items()]
+        lines.append("若要顯示大括號本身，請輸入 `{{` 或 `}}`。")
+        await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
     @app_commands.command(name="設定歡迎訊息", description="設定成員加入伺服器時發送的歡迎訊息")
-    @app_commands.describe(channel="發送歡迎訊息的頻道", message="歡迎訊息內容，可使用 {user} 標記")
+    @app_commands.describe(channel="發送歡迎訊息的頻道", message="歡迎訊息內容，可使用 {user}、{server}、{member_count} 等標記 (見 /訊息標記說明)")
     @commands.has_permissions(manage_guild=True)
     async def set_welcome_message(self, interaction: discord.Interaction, channel: discord.TextChannel, message: str):
-        await interaction.response.defer(ephemeral=True)
-        self.welcome_messages[str(interaction.guild_id)] = {'channel_id': channel.id, 'message': message}
-        self.save_data(self.welcome_messages, self.welcome_file)
+        if not await self.save_message_setting(interaction, "welcome", channel, message):
+            return
         await interaction.followup.send(f"已成功設定歡迎訊息，將在 {channel.mention} 發送。", ephemeral=True)
 
     @app_commands.command(name="設定離開訊息", description="設定成員離開伺服器時發送的訊息")
-    @app_commands.describe(channel="發送離開訊息的頻道", message="離開訊息內容，可使用 {user} 標記")
+    @app_commands.describe(channel="發送離開訊息的頻道", message="離開訊息內容，可使用 {user}、{server}、{member_count} 等標記 (見 /訊息標記說明)")
     @commands.has_permissions(manage_guild=True)
     async def set_goodbye_message(self, interaction: discord.Interaction, channel: discord.TextChannel, message: str):
-        await interaction.response.defer(ephemeral=True)
-        self.goodbye_messages[str(interaction.guild_id)] = {'channel_id': channel.id, 'message': message}
-        self.save_data(self.goodbye_messages, self.goodbye_file)
+        if not await self.save_message_setting(interaction, "goodbye", channel, message):
+            return
         await interaction.followup.send(f"已成功設定離開訊息，將在 {channel.mention} 發送。", ephemeral=True)
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
-        guild_id = str(member.guild.id)
-        if guild_id in self.welcome_messages:
-            channel_id = self.welcome_messages[guild_id]['channel_id']
-            message = self.welcome_messages[guild_id]['message'].format(user=member.mention)
-            channel = member.guild.get_channel(channel_id)
-            if channel:
-                await channel.send(message)
+        self.growth.record(member.guild.id, True, time.time())
+        if str(member.guild.id) in self.welcome_messages:
+            self.coalescer.add(("welcome", member.guild.id), member)
 
     @commands.Cog.listener()
     async def on_member_remove(self, member):
-        guild_id = str(member.guild.id)
-        if guild_id in self.goodbye_messages:
-            channel_id = self.goodbye_messages[guild_id]['channel_id']
-            message = self.goodbye_messages[guild_id]['message'].format(user=member.mention)
-            channel = member.guild.get_channel(channel_id)
-            if channel:
-                await channel.send(message)
+        self.growth.record(member.guild.id, False, time.time())
+        if str(member.guild.id) in self.goodbye_messages:
+            self.coalescer.add(("goodbye", member.guild.id), member)
+
+    async def send_member_message(self, key: Tuple[str, int], members: List[discord.Member], overflow: int):
+        kind, guild_id = key
+        settings = (self.welcome_messages if kind == "welcome" else self.goodbye_messages).get(str(guild_id))
+        template = self.templates[kind].get(str(guild_id))
+        guild = self.bot.get_guild(guild_id)
+        if not settings or template is None or guild is None:
+            return
+        channel = guild.get_channel(settings['channel_id'])
+        if channel is None:
+            return
+        # 只有範本用到的標記才會計算；多位成員合併時，個人資訊以第一位成員為準
+        first = members[0]
+        message = template.render({
+            "user": lambda: format_member_list(members, overflow),
+            "username": lambda: "、".join(member.display_name for member in members) + (f" 等 {len(members) + overflow} 人" if overflow else ""),
+            "server": lambda: guild.name,
+            "member_count": lambda: guild.member_count,
+            "account_age": lambda: format_account_age(first.created_at),
+            "count": lambda: len(members) + overflow
+        })
+        if len(message) > MAX_MESSAGE_LENGTH:
+            message = message[:MAX_MESSAGE_LENGTH - 1] + "…"
+        await channel.send(message)
+
+    @app_commands.command(name="成員成長", description="查看伺服器成員的加入與離開統計")
+    @app_commands.describe(範圍="統計的時間範圍")
+    async def member_growth(
+        self,
+        interaction: discord.Interaction,
+        範圍: Literal["過去一小時", "過去一天", "過去一週", "過去一個月", "過去一年"] = "過去一週"
+    ):
+        resolution, slots, chart_resolution, chart_slots, chart_label = GROWTH_RANGES[範圍]
+        growth = self.growth.get(interaction.guild_id)
+        now = time.time()
+        joins = growth.joins[resolution].total(now, slots)
+        leaves = growth.leaves[resolution].total(now, slots)
+        net = joins - leaves
+
+        embed = discord.Embed(
+            title=f"📈 {interaction.guild.name} 成員成長 ({範圍})",
+            color=discord.Color.green() if net >= 0 else discord.Color.red()
+        )
+        embed.add_field(name="加入", value=f"{joins} 人")
+        embed.add_field(name="離開", value=f"{leaves} 人")
+        embed.add_field(name="淨成長", value=f"{net:+d} 人")
+        # 一年的趨勢圖以週為單位合併，避免超過欄位長度
+        join_series = growth.joins[chart_resolution].series(now, chart_slots)
+        leave_series = growth.leaves[chart_resolution].series(now, chart_slots)
+        if chart_slots > 60:
+            join_series = [sum(join_series[i:i + 7]) for i in range(0, len(join_series), 7)]
+            leave_series = [sum(leave_series[i:i + 7]) for i in range(0, len(leave_series), 7)]
+            chart_label = "每週"
+        embed.add_field(
+            name=f"趨勢 ({chart_label}，舊 → 新)",
+            value=f"加入 `{sparkline(join_series)}`\n離開 `{sparkline(leave_series)}`",
+            inline=False
+        )
+        embed.set_footer(text=f"目前成員數：{interaction.guild.member_count} 人")
+        await interaction.response.send_message(embed=embed)
 
 async def setup(bot):
     await bot.add_cog(MemberEvents(bot))
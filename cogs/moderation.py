@@ -2,63 +2,419 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from typing import Optional
+import asyncio
+import functools
+import json
+import os
+import re
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Literal, Optional, Set
+
+from utils.purge import PurgeFilter, PurgeStats, purge_messages
+from utils.rate_limiter import RateLimitedQueue
+from utils.role_jobs import ACTIVE_STATUSES, ROLE_JOB_STATUSES, ROLE_JOBS_FILE, MemberFilter, new_role_job
+
+# 訊息 ID 或訊息連結 (https://discord.com/channels/<伺服器>/<頻道>/<訊息>) 結尾的 ID
+MESSAGE_REFERENCE_PATTERN = re.compile(r"(\d{15,21})/?$")
+
+TAIWAN_TZ = timezone(timedelta(hours=8))
+ROLE_JOB_ACTION_INTERVAL = 0.5 # 每次身分組 API 呼叫之間的最短間隔（秒）
+ROLE_JOB_QUEUE_SIZE = 20 # 等待執行的操作上限，同時也是重新啟動後最多重做的操作數
+ROLE_JOB_CHECKPOINT_INTERVAL = 10.0 # 儲存進度與更新進度訊息的最短間隔（秒）
+ROLE_JOB_HISTORY = 5 # 每個伺服器保留的已結束工作數量
 
 class Moderation(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.active_purges: Set[int] = set() # 正在進行刪除作業的頻道
+        self.role_jobs: Dict[str, dict] = self._load_role_jobs()
+        self.role_job_tasks: Dict[str, asyncio.Task] = {}
+        self.role_job_resume_events: Dict[str, asyncio.Event] = {}
+        self.resume_role_jobs_task = self.bot.loop.create_task(self.resume_role_jobs())
+
+    def cog_unload(self):
+        self.resume_role_jobs_task.cancel()
+        # 工作狀態保留為進行中，下次載入時會從最後的檢查點繼續
+        for task in self.role_job_tasks.values():
+            task.cancel()
 
-    @app_commands.command(name="大量刪除訊息", description="大量刪除指定數量或指定使用者的訊息")
+    @app_commands.command(name="大量刪除訊息", description="大量刪除符合條件的訊息，可超過 100 條")
     @app_commands.describe(
-        數量="要刪除的訊息數量 (1-100條)",
-        使用者="指定要刪除哪個使用者的訊息 (可選，留空則刪除所有人的訊息)"
+        數量="要刪除的訊息數量 (符合條件的訊息，1-100000條)",
+        使用者="指定要刪除哪個使用者的訊息 (可選，留空則刪除所有人的訊息)",
+        關鍵字="只刪除內容符合此正規表示式的訊息 (不分大小寫)",
+        只含附件="只刪除含有附件的訊息",
+        只限機器人="只刪除機器人發送的訊息",
+        之前="只刪除此訊息 (ID 或連結) 之前的訊息",
+        之後="只刪除此訊息 (ID 或連結) 之後的訊息",
+        掃描上限="最多檢查多少條訊息 (可選，留空則掃描到找滿數量或頻道開頭)"
     )
     @commands.has_permissions(manage_messages=True) # 需要管理訊息權限
     @app_commands.checks.cooldown(1, 10.0, key=lambda i: (i.guild_id, i.channel_id)) # 設定 10 秒冷卻時間，防止濫用
     async def bulk_delete_messages(
         self,
         interaction: discord.Interaction,
-        數量: app_commands.Range[int, 1, 100], # 數量限制在 1 到 100 之間
-        使用者: Optional[discord.Member] = None # 使用者參數是可選的
+        數量: app_commands.Range[int, 1, 100000],
+        使用者: Optional[discord.Member] = None, # 使用者參數是可選的
+        關鍵字: Optional[str] = None,
+        只含附件: bool = False,
+        只限機器人: bool = False,
+        之前: Optional[str] = None,
+        之後: Optional[str] = None,
+        掃描上限: Optional[app_commands.Range[int, 1, 1000000]] = None
     ):
-        await interaction.response.defer(ephemeral=True) # 延遲回覆，讓使用者知道指令正在處理，回覆僅自己可見
-
         channel = interaction.channel
-        
-        # 根據是否指定使用者來定義檢查函數
-        # 這個函數會被 channel.purge 用來判斷哪些訊息應該被刪除
-        def check_func(message):
-            # 確保不刪除機器人自己的互動訊息，儘管由於 ephemeral=True 通常不會在頻道中生成持久訊息
-            # 或者可以添加條件來排除特定訊息ID，但對於purge來說，這通常不是必需的
-            if 使用者: # 如果指定了使用者
-                return message.author == 使用者 # 只刪除該使用者的訊息
-            return True # 如果沒有指定使用者，則刪除所有訊息
+        if channel.id in self.active_purges:
+            await interaction.response.send_message("此頻道已有正在進行的刪除作業，請等待完成。", ephemeral=True)
+            return
 
-        try:
-            # 使用 channel.purge 進行批量刪除。
-            # limit 參數指定要檢查的訊息數量 (從最新開始)，check 函數篩選實際要刪除的訊息。
-            # purge 會自動處理 Discord 的 14 天訊息限制，超出時間的訊息將無法被刪除。
-            deleted_messages = await channel.purge(limit=數量, check=check_func)
-            deleted_count = len(deleted_messages) # 實際刪除的訊息數量
-
-            # 向使用者發送確認訊息，設定 ephemeral=False 讓頻道中所有人可見，告知刪除結果
-            if 使用者:
-                await interaction.followup.send(
-                    f"已成功刪除 {deleted_count} 條來自 {使用者.mention} 的訊息。", ephemeral=False
-                )
+        pattern = None
+        if 關鍵字:
+            try:
+                pattern = re.compile(關鍵字, re.IGNORECASE)
+            except re.error as e:
+                await interaction.response.send_message(f"關鍵字不是有效的正規表示式：{e}", ephemeral=True)
+                return
+
+        before = after = None
+        for label, value in (("之前", 之前), ("之後", 之後)):
+            if value is None:
+                continue
+            match = MESSAGE_REFERENCE_PATTERN.search(value.strip())
+            if not match:
+                await interaction.response.send_message(f"「{label}」需要填入訊息 ID 或訊息連結。", ephemeral=True)
+                return
+            if label == "之前":
+                before = discord.Object(id=int(match.group(1)))
             else:
-                await interaction.followup.send(
-                    f"已成功刪除 {deleted_count} 條訊息。", ephemeral=False
+                after = discord.Object(id=int(match.group(1)))
+
+        await interaction.response.defer(ephemeral=True) # 延遲回覆，讓使用者知道指令正在處理，回覆僅自己可見
+
+        check = PurgeFilter(
+            user_id=使用者.id if 使用者 else None,
+            pattern=pattern,
+            has_attachment=只含附件,
+            bot_only=只限機器人
+        )
+
+        async def report_progress(stats: PurgeStats):
+            if not stats.finished:
+                await interaction.edit_original_response(
+                    content=f"🧹 刪除中… 已檢查 {stats.scanned} 條，已刪除 {stats.deleted} / {數量} 條。"
                 )
 
+        self.active_purges.add(channel.id)
+        try:
+            stats = await purge_messages(
+                channel, check, limit=數量, before=before, after=after,
+                scan_limit=掃描上限, progress_callback=report_progress
+            )
         except discord.Forbidden: # 機器人缺少權限
-            await interaction.followup.send(
-                "我沒有足夠的權限刪除訊息。請檢查我的身份組權限，確保我有 '管理訊息' 權限。", ephemeral=True
+            await self._send_purge_result(
+                interaction, "我沒有足夠的權限刪除訊息。請檢查我的身份組權限，確保我有 '管理訊息' 和 '讀取訊息歷史' 權限。", ephemeral=True
             )
+            return
         except discord.HTTPException as e: # Discord API 錯誤
-            await interaction.followup.send(f"刪除訊息時發生錯誤: {e}", ephemeral=True)
+            await self._send_purge_result(interaction, f"刪除訊息時發生錯誤: {e}", ephemeral=True)
+            return
         except Exception as e: # 其他未知錯誤
-            await interaction.followup.send(f"發生未知錯誤: {e}", ephemeral=True)
+            await self._send_purge_result(interaction, f"發生未知錯誤: {e}", ephemeral=True)
+            return
+        finally:
+            self.active_purges.discard(channel.id)
+
+        summary = f"已成功刪除 {stats.deleted} 條來自 {使用者.mention} 的訊息。" if 使用者 else f"已成功刪除 {stats.deleted} 條訊息。"
+        details = f"共檢查 {stats.scanned} 條訊息"
+        if stats.single_deleted:
+            details += f"，其中 {stats.single_deleted} 條超過 14 天，已逐條刪除"
+        if stats.failed:
+            details += f"，{stats.failed} 條刪除失敗"
+        try:
+            await interaction.edit_original_response(content="✅ 刪除作業完成。")
+        except discord.HTTPException:
+            pass # 互動權杖已過期，進度訊息無法再更新
+        # 設定 ephemeral=False 讓頻道中所有人可見，告知刪除結果
+        await self._send_purge_result(interaction, f"{summary}\n-# {details}。", ephemeral=False)
+
+    async def _send_purge_result(self, interaction: discord.Interaction, content: str, ephemeral: bool):
+        """
+        以互動回覆發送結果；大量刪除常超過互動權杖的 15 分鐘期限，
+        此時改為直接在頻道發送 (無法再以僅自己可見的方式回覆，改為標記執行者)。
+        """
+        try:
+            await interaction.followup.send(content, ephemeral=ephemeral)
+            return
+        except discord.HTTPException:
+            pass
+        try:
+            await interaction.channel.send(f"{interaction.user.mention} {content}" if ephemeral else content)
+        except discord.HTTPException as e:
+            print(f"發送大量刪除結果失敗：{e}")
+
+    def _load_role_jobs(self) -> Dict[str, dict]:
+        if os.path.exists(ROLE_JOBS_FILE):
+            with open(ROLE_JOBS_FILE, 'r', encoding='utf-8') as f:
+                try:
+                    return json.load(f)
+                except json.JSONDecodeError:
+                    return {}
+        return {}
+
+    def _save_role_jobs(self):
+        with open(ROLE_JOBS_FILE, 'w', encoding='utf-8') as f:
+            json.dump(self.role_jobs, f, indent=4, ensure_ascii=False)
+
+    def _prune_role_jobs(self, guild_id: int):
+        finished = sorted(
+            (job for job in self.role_jobs.values() if job["guild_id"] == guild_id and job["status"] not in ACTIVE_STATUSES),
+            key=lambda job: job["created_at"], reverse=True
+        )
+        for job in finished[ROLE_JOB_HISTORY:]:
+            del self.role_jobs[job["id"]]
+
+    def _active_role_job(self, guild_id: int) -> Optional[dict]:
+        return next((job for job in self.role_jobs.values() if job["guild_id"] == guild_id and job["status"] in ACTIVE_STATUSES), None)
+
+    def _start_role_job(self, job_id: str):
+        event = self.role_job_resume_events.setdefault(job_id, asyncio.Event())
+        event.set()
+        task = self.role_job_tasks.get(job_id)
+        if task is None or task.done():
+            self.role_job_tasks[job_id] = asyncio.create_task(self.run_role_job(job_id))
+
+    async def resume_role_jobs(self):
+        """重新啟動後繼續執行中斷的工作，已暫停的工作等待管理員繼續"""
+        await self.bot.wait_until_ready()
+        for job_id, job in list(self.role_jobs.items()):
+            if job["status"] == "running":
+                print(f"繼續執行批量身分組工作 {job_id} (已處理至成員 {job['cursor']})")
+                self._start_role_job(job_id)
+
+    def _role_job_summary(self, job: dict) -> str:
+        action = "新增" if job["action"] == "add" else "移除"
+        lines = [
+            f"**批量{action}身分組** <@&{job['role_id']}> (工作 `{job['id']}`)",
+            f"條件：{MemberFilter.from_dict(job['filter']).describe()}",
+            f"狀態：{ROLE_JOB_STATUSES[job['status']]}",
+            f"進度：已檢查 {job['scanned']} / {job['total']} 位成員，符合 {job['matched']} 位，"
+            f"已{action} {job['changed']} 位，失敗 {job['failed']} 位"
+        ]
+        if job.get("error"):
+            lines.append(f"錯誤：{job['error']}")
+        return "\n".join(lines)
+
+    async def _update_role_job_message(self, job: dict):
+        channel = self.bot.get_channel(job["channel_id"]) if job.get("channel_id") else None
+        if channel is None or not job.get("message_id"):
+            return
+        try:
+            await channel.get_partial_message(job["message_id"]).edit(content=self._role_job_summary(job))
+        except discord.HTTPException as e:
+            print(f"更新批量身分組工作 {job['id']} 的進度訊息失敗：{e}")
+
+    async def _apply_role_change(self, job: dict, member: discord.Member, role: discord.Role):
+        try:
+            if job["action"] == "add":
+                await member.add_roles(role, reason=f"批量身分組工作 {job['id']}")
+            else:
+                await member.remove_roles(role, reason=f"批量身分組工作 {job['id']}")
+            job["changed"] += 1
+        except discord.HTTPException:
+            job["failed"] += 1
+            raise
+
+    async def run_role_job(self, job_id: str):
+        job = self.role_jobs[job_id]
+        guild = self.bot.get_guild(job["guild_id"])
+        role = guild.get_role(job["role_id"]) if guild else None
+        if role is None or role >= guild.me.top_role:
+            job["status"] = "failed"
+            job["error"] = "找不到目標身分組，或身分組位階高於機器人。"
+            job["finished_at"] = int(time.time())
+            self._save_role_jobs()
+            await self._update_role_job_message(job)
+            return
+
+        if not guild.chunked:
+            await guild.chunk()
+        check = MemberFilter.from_dict(job["filter"])
+        leveling_cog = self.bot.get_cog('Leveling') if check.min_level is not None else None
+        resume_event = self.role_job_resume_events.setdefault(job_id, asyncio.Event())
+        queue = RateLimitedQueue(ROLE_JOB_ACTION_INTERVAL, maxsize=ROLE_JOB_QUEUE_SIZE)
+        add = job["action"] == "add"
+        job["total"] = guild.member_count or len(guild.members)
+        last_checkpoint = time.monotonic()
+
+        async def checkpoint(cursor: int):
+            # 等待佇列清空後，cursor 之前的成員才算處理完成
+            nonlocal last_checkpoint
+            await queue.join()
+            job["cursor"] = cursor
+            self._save_role_jobs()
+            last_checkpoint = time.monotonic()
+            await self._update_role_job_message(job)
+
+        try:
+            # 依成員 ID 排序，檢查點只需要記錄一個 ID
+            members = sorted((member for member in guild.members if member.id > job["cursor"]), key=lambda member: member.id)
+            cursor = job["cursor"]
+            for member in members:
+                if not resume_event.is_set():
+                    await checkpoint(cursor)
+                    await resume_event.wait()
+                if job["status"] == "cancelled":
+                    break
+
+                job["scanned"] += 1
+                level = await leveling_cog.get_user_level(member.id) if leveling_cog else 0
+                if not member.bot and check(member, level):
+                    job["matched"] += 1
+                    # 已經是目標狀態的成員不需要呼叫 API
+                    if (member.get_role(role.id) is None) == add:
+                        await queue.put(functools.partial(self._apply_role_change, job, member, role))
+                cursor = member.id
+
+                if time.monotonic() - last_checkpoint >= ROLE_JOB_CHECKPOINT_INTERVAL:
+                    await checkpoint(cursor)
+
+            if job["status"] != "cancelled":
+                await queue.join()
+                job["cursor"] = cursor
+                job["status"] = "completed"
+        except discord.HTTPException as e:
+            print(f"批量身分組工作 {job_id} 發生錯誤：{e}")
+            job["status"] = "failed"
+            job["error"] = str(e)
+        except Exception as e:
+            # 非預期的錯誤也要結束工作，避免狀態停留在進行中而擋住新的工作
+            print(f"批量身分組工作 {job_id} 發生未預期的錯誤：{e!r}")
+            job["status"] = "failed"
+            job["error"] = f"未預期的錯誤：{e}"
+        finally:
+            queue.close()
+
+        job["finished_at"] = int(time.time())
+        self.role_job_resume_events.pop(job_id, None)
+        self.role_job_tasks.pop(job_id, None)
+        self._prune_role_jobs(job["guild_id"])
+        self._save_role_jobs()
+        await self._update_role_job_message(job)
+
+    @app_commands.command(name="批量身分組", description="依條件為大量成員新增或移除身分組，於背景執行")
+    @app_commands.describe(
+        身分組="要新增或移除的身分組",
+        操作="新增或移除",
+        擁有身分組="只處理擁有此身分組的成員 (可選)",
+        加入日期早於="只處理在此日期之前加入的成員，格式 YYYY-MM-DD (可選)",
+        最低等級="只處理等級大於或等於此值的成員 (可選)"
+    )
+    @commands.has_permissions(manage_roles=True)
+    async def bulk_role(
+        self,
+        interaction: discord.Interaction,
+        身分組: discord.Role,
+        操作: Literal["新增", "移除"],
+        擁有身分組: Optional[discord.Role] = None,
+        加入日期早於: Optional[str] = None,
+        最低等級: Optional[app_commands.Range[int, 1, 10000]] = None
+    ):
+        guild = interaction.guild
+        if 身分組 >= guild.me.top_role or 身分組.managed or 身分組.is_default():
+            await interaction.response.send_message("我無法管理這個身分組，請確認它的位階低於機器人的最高身分組。", ephemeral=True)
+            return
+        if 身分組 >= interaction.user.top_role and interaction.user.id != guild.owner_id:
+            await interaction.response.send_message("你只能批量調整位階低於自己最高身分組的身分組。", ephemeral=True)
+            return
+        if 最低等級 is not None and self.bot.get_cog('Leveling') is None:
+            await interaction.response.send_message("等級系統未載入，無法使用等級條件。", ephemeral=True)
+            return
+
+        joined_before = None
+        if 加入日期早於:
+            try:
+                joined_before = datetime.strptime(加入日期早於.strip(), "%Y-%m-%d").replace(tzinfo=TAIWAN_TZ).timestamp()
+            except ValueError:
+                await interaction.response.send_message("加入日期格式錯誤，請使用 YYYY-MM-DD，例如 2024-01-31。", ephemeral=True)
+                return
+
+        active_job = self._active_role_job(guild.id)
+        if active_job:
+            await interaction.response.send_message(
+                f"此伺服器已有未結束的批量身分組工作 `{active_job['id']}`，請等待完成或使用 `/身分組工作` 取消。", ephemeral=True
+            )
+            return
+
+        member_filter = MemberFilter(擁有身分組.id if 擁有身分組 else None, joined_before, 最低等級)
+        job_id = secrets.token_hex(4)
+        job = new_role_job(job_id, guild.id, 身分組.id, "add" if 操作 == "新增" else "remove", member_filter, interaction.user.id)
+        job["total"] = guild.member_count or len(guild.members)
+        await interaction.response.send_message(self._role_job_summary(job), allowed_mentions=discord.AllowedMentions.none())
+        message = await interaction.original_response()
+        job["channel_id"] = message.channel.id
+        job["message_id"] = message.id
+        self.role_jobs[job_id] = job
+        self._save_role_jobs()
+        self._start_role_job(job_id)
+
+    @app_commands.command(name="身分組工作", description="查看、暫停、繼續或取消批量身分組工作")
+    @app_commands.describe(操作="要執行的操作", 編號="工作編號 (可選，留空則為目前未結束的工作)")
+    @commands.has_permissions(manage_roles=True)
+    async def manage_role_job(
+        self,
+        interaction: discord.Interaction,
+        操作: Literal["查看", "暫停", "繼續", "取消"],
+        編號: Optional[str] = None
+    ):
+        if 編號:
+            job = self.role_jobs.get(編號.strip())
+            if job is None or job["guild_id"] != interaction.guild_id:
+                job = None
+        else:
+            job = self._active_role_job(interaction.guild_id)
+            if job is None and 操作 == "查看":
+                jobs = [job for job in self.role_jobs.values() if job["guild_id"] == interaction.guild_id]
+                job = max(jobs, key=lambda job: job["created_at"], default=None)
+        if job is None:
+            await interaction.response.send_message("找不到批量身分組工作。", ephemeral=True)
+            return
+
+        job_id = job["id"]
+        if 操作 == "暫停":
+            if job["status"] != "running":
+                await interaction.response.send_message(f"工作目前{ROLE_JOB_STATUSES[job['status']]}，無法暫停。", ephemeral=True)
+                return
+            job["status"] = "paused"
+            self.role_job_resume_events.setdefault(job_id, asyncio.Event()).clear()
+            self._save_role_jobs()
+        elif 操作 == "繼續":
+            if job["status"] != "paused":
+                await interaction.response.send_message(f"工作目前{ROLE_JOB_STATUSES[job['status']]}，無法繼續。", ephemeral=True)
+                return
+            job["status"] = "running"
+            self._save_role_jobs()
+            self._start_role_job(job_id)
+        elif 操作 == "取消":
+            if job["status"] not in ACTIVE_STATUSES:
+                await interaction.response.send_message(f"工作目前{ROLE_JOB_STATUSES[job['status']]}，無法取消。", ephemeral=True)
+                return
+            job["status"] = "cancelled"
+            task = self.role_job_tasks.get(job_id)
+            if task is None or task.done():
+                # 已暫停且在重新啟動後尚未執行的工作，直接結束
+                job["finished_at"] = int(time.time())
+                self._prune_role_jobs(job["guild_id"])
+                await self._update_role_job_message(job)
+            else:
+                # 喚醒等待中的工作，讓它自行結束並更新進度訊息
+                self.role_job_resume_events.setdefault(job_id, asyncio.Event()).set()
+            self._save_role_jobs()
+
+        await interaction.response.send_message(
+            self._role_job_summary(job), ephemeral=True, allowed_mentions=discord.AllowedMentions.none()
+        )
 
 async def setup(bot):
     # 將 Moderation cog 添加到機器人中
@@ -4,13 +4,95 @@ from discord.ext import commands
 from discord import app_commands
 import json
 import os
-from typing import Optional
+import asyncio
+import functools
+import re
+import time
+from typing import Optional, Dict, Tuple, List, Literal, Callable, Awaitable, Set
+
+from utils.rate_limiter import RateLimitedQueue
+
+# 同一成員的身分組變更會先累積此秒數，再以單一次 member.edit 套用
+ROLE_UPDATE_DELAY = 1.5
+
+# 元件式身分組面板的 custom_id 前綴，格式為 rr:select:<序號> 或 rr:toggle:<role_id>
+COMPONENT_PREFIX = "rr:"
+SELECT_OPTIONS_PER_MENU = 25 # Discord 單一選單最多 25 個選項
+MAX_COMPONENT_ROWS = 5 # 單則訊息最多 5 列元件
+BUTTONS_PER_ROW = 5
+ROLE_MENTION_PATTERN = re.compile(r"<@&(\d+)>")
+
+# 離線期間反應變動的同步設定
+RECONCILE_ON_STARTUP = True
+# 啟動時的同步預設只補上遺漏的身分組；移除需手動以 /同步反應身份組 執行
+RECONCILE_REMOVE_ON_STARTUP = False
+RECONCILE_ACTION_INTERVAL = 0.5 # 每次身分組 API 呼叫之間的最短間隔（秒）
+RECONCILE_PROGRESS_INTERVAL = 3 # 進度回報的最短間隔（秒）
+REACTION_GRANTS_FILE = 'react_role_grants.json'
+GRANTS_SAVE_DELAY = 5.0 # 反應賦予紀錄的變動會合併在此秒數內一次寫入檔案
 
 class ReactRoles(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.reaction_roles_file = 'react_roles.json'
         self.reaction_messages = self.load_reaction_messages()
+        # 反向索引：message_id -> (guild_id, {emoji: role_id})，用於在處理事件前快速排除無關的反應
+        self.message_index: Dict[int, Tuple[int, Dict[str, int]]] = {}
+        # 已解析的身分組物件快取：role_id -> discord.Role
+        self.role_cache: Dict[int, discord.Role] = {}
+        # 等待套用的身分組變更：(guild_id, member_id) -> {role_id: True 為新增 / False 為移除}
+        self.pending_role_updates: Dict[Tuple[int, int], Dict[int, bool]] = {}
+        self.role_update_tasks: Dict[Tuple[int, int], asyncio.Task] = {}
+        self.reconcile_lock = asyncio.Lock()
+        self.startup_reconciled = False
+        # 由反應面板賦予的身分組：(guild_id, role_id) -> {member_id}，同步時只會從這些成員移除身分組
+        self.reaction_grants: Dict[Tuple[int, int], Set[int]] = self.load_reaction_grants()
+        self.grants_save_task: Optional[asyncio.Task] = None
+        self.rebuild_message_index()
+
+    def cog_unload(self):
+        for task in self.role_update_tasks.values():
+            task.cancel()
+        if self.grants_save_task and not self.grants_save_task.done():
+            self.grants_save_task.cancel()
+            self.save_reaction_grants()
+
+    def load_reaction_grants(self) -> Dict[Tuple[int, int], Set[int]]:
+        if not os.path.exists(REACTION_GRANTS_FILE):
+            return {}
+        with open(REACTION_GRANTS_FILE, 'r', encoding='utf-8') as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError:
+                return {}
+        return {
+            (int(guild_id), int(role_id)): set(member_ids)
+            for guild_id, roles in data.items()
+            for role_id, member_ids in roles.items()
+        }
+
+    def save_reaction_grants(self):
+        data: Dict[str, Dict[str, List[int]]] = {}
+        for (guild_id, role_id), member_ids in self.reaction_grants.items():
+            if member_ids:
+                data.setdefault(str(guild_id), {})[str(role_id)] = sorted(member_ids)
+        with open(REACTION_GRANTS_FILE, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+    async def _delayed_save_grants(self):
+        await asyncio.sleep(GRANTS_SAVE_DELAY)
+        self.save_reaction_grants()
+
+    def _set_reaction_grant(self, guild_id: int, role_id: int, member_id: int, granted: bool):
+        members = self.reaction_grants.setdefault((guild_id, role_id), set())
+        if granted == (member_id in members):
+            return
+        if granted:
+            members.add(member_id)
+        else:
+            members.discard(member_id)
+        if self.grants_save_task is None or self.grants_save_task.done():
+            self.grants_save_task = asyncio.create_task(self._delayed_save_grants())
 
     def load_reaction_messages(self):
         """從 JSON 檔案載入反應身分組訊息數據"""
@@ -27,6 +109,211 @@ class ReactRoles(commands.Cog):
         """將反應身分組訊息數據儲存到 JSON 檔案"""
         with open(self.reaction_roles_file, 'w', encoding='utf-8') as f:
             json.dump(self.reaction_messages, f, indent=4)
+        self.rebuild_message_index()
+
+    def rebuild_message_index(self):
+        """依照 reaction_messages 重建訊息 ID 反向索引"""
+        index: Dict[int, Tuple[int, Dict[str, int]]] = {}
+        for guild_id, messages in self.reaction_messages.items():
+            for message_id, message_data in messages.items():
+                try:
+                    roles = {emoji: int(role_id) for emoji, role_id in message_data.get('roles', {}).items()}
+                    index[int(message_id)] = (int(guild_id), roles)
+                except (ValueError, TypeError):
+                    print(f"警告: 反應身分組訊息 {message_id} 的數據無效，已略過。")
+        self.message_index = index
+        self.role_cache.clear()
+
+    def _resolve_role(self, guild: discord.Guild, role_id: int) -> Optional[discord.Role]:
+        """從快取取得身分組物件，快取未命中時才向 guild 查詢"""
+        role = self.role_cache.get(role_id)
+        if role is None:
+            role = guild.get_role(role_id)
+            if role is not None:
+                self.role_cache[role_id] = role
+        return role
+
+    def _route_reaction(self, payload) -> Optional[Tuple[discord.Guild, discord.Role]]:
+        """以反向索引判斷反應是否屬於追蹤中的訊息，是的話回傳 (guild, role)"""
+        entry = self.message_index.get(payload.message_id)
+        if entry is None:
+            return None
+        guild_id, roles = entry
+        role_id = roles.get(str(payload.emoji))
+        if role_id is None or payload.guild_id != guild_id:
+            return None
+
+        guild = self.bot.get_guild(guild_id)
+        if not guild:
+            return None
+        role = self._resolve_role(guild, role_id)
+        if not role:
+            return None
+        return guild, role
+
+    async def reconcile_reaction_roles(
+        self,
+        guild_id: Optional[int] = None,
+        progress_callback: Optional[Callable[[Dict[str, int]], Awaitable[None]]] = None,
+        remove: bool = True
+    ) -> Dict[str, int]:
+        """
+        比對追蹤中訊息的反應與身分組持有者，補上機器人離線期間遺漏的變更。
+        以身分組為單位逐一串流反應使用者，記憶體只需保存單一身分組的反應者 ID。
+        移除時只處理先前由反應面板賦予身分組的成員，從其他來源取得的身分組不受影響。
+        """
+        # (guild_id, role_id) -> [(channel_id, message_id, emoji)]，同一身分組可能出現在多個面板
+        role_sources: Dict[Tuple[int, int], List[Tuple[int, int, str]]] = {}
+        for guild_id_str, messages in self.reaction_messages.items():
+            if guild_id is not None and int(guild_id_str) != guild_id:
+                continue
+            for message_id, message_data in messages.items():
+                for emoji_repr, role_id in message_data.get('roles', {}).items():
+                    key = (int(guild_id_str), int(role_id))
+                    role_sources.setdefault(key, []).append((int(message_data['channel_id']), int(message_id), emoji_repr))
+
+        stats = {"roles_total": len(role_sources), "roles_done": 0, "roles_skipped": 0, "added": 0, "removed": 0, "completed": 0, "failed": 0}
+        queue = RateLimitedQueue(RECONCILE_ACTION_INTERVAL)
+        message_cache: Dict[int, Optional[discord.Message]] = {}
+
+        async with self.reconcile_lock:
+            try:
+                for (role_guild_id, role_id), sources in role_sources.items():
+                    guild = self.bot.get_guild(role_guild_id)
+                    role = self._resolve_role(guild, role_id) if guild else None
+                    if not role or guild.me.top_role <= role:
+                        stats["roles_skipped"] += 1
+                        continue
+
+                    reacted_ids = set()
+                    complete = True
+                    for channel_id, message_id, emoji_repr in sources:
+                        if message_id not in message_cache:
+                            channel = guild.get_channel(channel_id)
+                            try:
+                                message_cache[message_id] = await channel.fetch_message(message_id) if channel else None
+                            except discord.HTTPException:
+                                message_cache[message_id] = None
+                        message = message_cache[message_id]
+                        if message is None:
+                            complete = False
+                            continue
+
+                        reaction = next((r for r in message.reactions if str(r.emoji) == emoji_repr), None)
+                        if reaction is None:
+                            continue
+                        try:
+                            async for user in reaction.users():
+                                if user.bot or user.id in reacted_ids:
+                                    continue
+                                reacted_ids.add(user.id)
+                                member = guild.get_member(user.id)
+                                if member and role not in member.roles:
+                                    stats["added"] += 1
+                                    await queue.put(functools.partial(self._reconcile_role_change, member, role, True))
+                        except discord.HTTPException as e:
+                            print(f"讀取訊息 {message_id} 的反應 {emoji_repr} 時發生錯誤：{e}")
+                            complete = False
+
+                    # 無法完整讀取反應時不移除身分組，避免誤刪
+                    if remove and complete:
+                        granted_ids = self.reaction_grants.get((role_guild_id, role_id), set())
+                        for member_id in list(granted_ids - reacted_ids):
+                            member = guild.get_member(member_id)
+                            if member is None or member.get_role(role_id) is None:
+                                # 已離開伺服器或身分組已被移除，只需要清除紀錄
+                                self._set_reaction_grant(role_guild_id, role_id, member_id, False)
+                                continue
+                            stats["removed"] += 1
+                            await queue.put(functools.partial(self._reconcile_role_change, member, role, False))
+
+                    stats["roles_done"] += 1
+                    stats["completed"], stats["failed"] = queue.completed, queue.failed
+                    if progress_callback:
+                        try:
+                            await progress_callback(stats)
+                        except discord.HTTPException as e:
+                            # 進度回報失敗 (例如互動權杖過期) 不影響同步本身
+                            print(f"回報反應身分組同步進度失敗：{e}")
+
+                await queue.join()
+            finally:
+                queue.close()
+
+        stats["completed"], stats["failed"] = queue.completed, queue.failed
+        return stats
+
+    async def _reconcile_role_change(self, member: discord.Member, role: discord.Role, add: bool):
+        if add:
+            await member.add_roles(role, reason="反應身分組同步")
+        else:
+            await member.remove_roles(role, reason="反應身分組同步")
+        self._set_reaction_grant(member.guild.id, role.id, member.id, add)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # on_ready 可能在重新連線時多次觸發，只在第一次執行同步
+        if not RECONCILE_ON_STARTUP or self.startup_reconciled:
+            return
+        self.startup_reconciled = True
+
+        last_report = 0.0
+        async def report(stats):
+            nonlocal last_report
+            if time.monotonic() - last_report >= RECONCILE_PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                print(f"反應身分組同步中：{stats['roles_done']}/{stats['roles_total']} 個身分組，新增 {stats['added']}，移除 {stats['removed']}")
+
+        stats = await self.reconcile_reaction_roles(progress_callback=report, remove=RECONCILE_REMOVE_ON_STARTUP)
+        print(
+            f"反應身分組同步完成：新增 {stats['added']}，移除 {stats['removed']}，"
+            f"失敗 {stats['failed']}，略過 {stats['roles_skipped']} 個身分組。"
+        )
+
+    @app_commands.command(name="同步反應身份組", description="比對反應與身份組，補上機器人離線期間遺漏的變更")
+    @app_commands.describe(移除="是否移除已取消反應的成員的身份組 (只限先前由反應面板賦予的身份組)")
+    @commands.has_permissions(manage_roles=True)
+    async def reconcile_command(self, interaction: discord.Interaction, 移除: bool = True):
+        await interaction.response.defer(ephemeral=True)
+        if self.reconcile_lock.locked():
+            await interaction.followup.send("身份組同步正在進行中，將在目前的同步完成後開始。", ephemeral=True)
+
+        last_report = 0.0
+        async def report(stats):
+            nonlocal last_report
+            if time.monotonic() - last_report >= RECONCILE_PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                await interaction.edit_original_response(
+                    content=f"同步中… {stats['roles_done']}/{stats['roles_total']} 個身份組，"
+                            f"待新增 {stats['added']}，待移除 {stats['removed']}，已完成 {stats['completed']}"
+                )
+
+        stats = await self.reconcile_reaction_roles(guild_id=interaction.guild_id, progress_callback=report, remove=移除)
+        summary = (
+            f"✅ 同步完成！新增 {stats['added']} 個、移除 {stats['removed']} 個身份組"
+            f"（失敗 {stats['failed']}，略過 {stats['roles_skipped']} 個身份組）。"
+        )
+        try:
+            await interaction.edit_original_response(content=summary)
+        except discord.HTTPException:
+            # 同步超過互動權杖的 15 分鐘期限時，改為在頻道中回報
+            try:
+                await interaction.channel.send(f"{interaction.user.mention} {summary}")
+            except discord.HTTPException as e:
+                print(f"回報反應身分組同步結果失敗：{e}")
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        # 身分組被其他方式移除後，不再視為由反應面板賦予
+        if len(after.roles) >= len(before.roles):
+            return
+        for role in set(before.roles) - set(after.roles):
+            if after.id in self.reaction_grants.get((after.guild.id, role.id), ()):
+                self._set_reaction_grant(after.guild.id, role.id, after.id, False)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.role_cache.pop(role.id, None)
 
     async def send_reaction_role_message(self, channel: discord.TextChannel, message_data: dict):
         """發送或更新反應身分組嵌入訊息"""
@@ -66,22 +353,56 @@ class ReactRoles(commands.Cog):
             message_data['message_id'] = str(message.id) # 更新訊息 ID
             self.save_reaction_messages() # 儲存更新後的數據
 
-        # 為訊息添加反應符號
+        # 為訊息添加反應符號，Unicode 與自訂表情符號 (<:name:id>) 皆可直接傳入
         for emoji_repr in message_data['roles'].keys():
             try:
-                # 檢查 emoji_repr 是否為有效 emoji
-                # 如果是 Unicode emoji，直接添加
-                # 如果是自訂 emoji (<:name:id>), 則需要從 guild 中獲取
-                if discord.utils.get(self.bot.emojis, name=emoji_repr.strip(':').split(':')[0]) or \
-                   (emoji_repr.startswith('<') and emoji_repr.endswith('>')): # Custom emoji format
-                    await message.add_reaction(emoji_repr)
-                else: # Assume it's a standard unicode emoji
-                    await message.add_reaction(emoji_repr)
+                await message.add_reaction(emoji_repr)
             except discord.HTTPException as e:
                 print(f"無法添加反應 {emoji_repr} 到訊息 {message.id}: {e}")
             except Exception as e:
                 print(f"添加反應時發生未知錯誤 {emoji_repr}: {e}")
 
+    def build_component_panel(self, roles: List[discord.Role], panel_type: str) -> discord.ui.View:
+        """建立元件式身分組面板；狀態全部編碼在 custom_id 與選項值中，不需要保存 View"""
+        view = discord.ui.View(timeout=None)
+        if panel_type == "select":
+            for index in range(0, len(roles), SELECT_OPTIONS_PER_MENU):
+                chunk = roles[index:index + SELECT_OPTIONS_PER_MENU]
+                view.add_item(discord.ui.Select(
+                    custom_id=f"{COMPONENT_PREFIX}select:{index // SELECT_OPTIONS_PER_MENU}",
+                    placeholder="選擇您想要的身份組",
+                    min_values=0,
+                    max_values=len(chunk),
+                    options=[discord.SelectOption(label=role.name[:100], value=str(role.id)) for role in chunk]
+                ))
+        else:
+            for index, role in enumerate(roles):
+                view.add_item(discord.ui.Button(
+                    label=role.name[:80],
+                    style=discord.ButtonStyle.secondary,
+                    custom_id=f"{COMPONENT_PREFIX}toggle:{role.id}",
+                    row=index // BUTTONS_PER_ROW
+                ))
+        return view
+
+    def _parse_role_list(self, guild: discord.Guild, roles_input: str) -> Tuple[List[discord.Role], List[str]]:
+        """解析以逗號分隔的身分組提及、ID 或名稱，回傳 (身分組列表, 無法辨識的輸入)"""
+        roles: List[discord.Role] = []
+        unknown: List[str] = []
+        for token in roles_input.split(','):
+            token = token.strip()
+            if not token:
+                continue
+            mention_ids = ROLE_MENTION_PATTERN.findall(token)
+            candidates = [guild.get_role(int(role_id)) for role_id in mention_ids] if mention_ids else [
+                discord.utils.get(guild.roles, name=token) or (guild.get_role(int(token)) if token.isdigit() else None)
+            ]
+            for role in candidates:
+                if role is None:
+                    unknown.append(token)
+                elif role not in roles:
+                    roles.append(role)
+        return roles, unknown
 
     @app_commands.command(name="設定自動身份組訊息", description="設定一個自動身份組訊息")
     @app_commands.describe(
@@ -194,73 +515,244 @@ class ReactRoles(commands.Cog):
         else:
              await interaction.followup.send("設定自動身份組訊息時發生錯誤，請檢查。", ephemeral=True)
 
+    @app_commands.command(name="設定身份組選單", description="設定一個使用選單或按鈕的自動身份組面板")
+    @app_commands.describe(
+        channel="面板發送的頻道",
+        title="嵌入訊息的標題",
+        description="嵌入訊息的描述",
+        roles="以逗號分隔的身份組 (提及、名稱或ID)，例如: @紅色, @藍色, 123456789",
+        panel_type="面板類型 (選單最多 125 個身份組，按鈕最多 25 個)",
+        color="嵌入訊息的顏色 (例如: #RRGGBB，預設為白色)"
+    )
+    @commands.has_permissions(manage_roles=True)
+    async def set_component_role_panel(
+        self,
+        interaction: discord.Interaction,
+        channel: discord.TextChannel,
+        title: str,
+        description: str,
+        roles: str,
+        panel_type: Literal["選單", "按鈕"] = "選單",
+        color: Optional[str] = None
+    ):
+        await interaction.response.defer(ephemeral=True)
+
+        embed_color_int = 0xFFFFFF # 預設為白色
+        if color:
+            color_str_clean = color.lstrip('#')
+            if len(color_str_clean) == 6 and all(c in '0123456789abcdefABCDEF' for c in color_str_clean):
+                embed_color_int = int(color_str_clean, 16)
+            else:
+                await interaction.followup.send("提供的顏色碼格式不正確，請使用 #RRGGBB 格式（例如：#FF0000）。將使用預設白色。", ephemeral=True)
+
+        role_list, unknown = self._parse_role_list(interaction.guild, roles)
+        if unknown:
+            await interaction.followup.send(f"找不到身份組：`{'`, `'.join(unknown)}`。請檢查名稱或 ID。", ephemeral=True)
+            return
+        if not role_list:
+            await interaction.followup.send("您至少需要指定一個身份組來設定身份組面板。", ephemeral=True)
+            return
+
+        component_type = "select" if panel_type == "選單" else "button"
+        limit = SELECT_OPTIONS_PER_MENU * MAX_COMPONENT_ROWS if component_type == "select" else BUTTONS_PER_ROW * MAX_COMPONENT_ROWS
+        if len(role_list) > limit:
+            await interaction.followup.send(f"{panel_type}面板最多只能放 {limit} 個身份組。", ephemeral=True)
+            return
+
+        top_role = interaction.guild.me.top_role
+        unmanageable = [role.name for role in role_list if top_role <= role]
+        if unmanageable:
+            await interaction.followup.send(
+                f"我的機器人身份組 ({top_role.name}) 權限不足，無法管理 `{'`, `'.join(unmanageable)}` 身份組。"
+                "請確保我的機器人身份組在 Discord 設定中高於我需要管理的身份組。", ephemeral=True
+            )
+            return
+
+        embed = discord.Embed(title=title, description=description, color=discord.Color(embed_color_int))
+        view = self.build_component_panel(role_list, component_type)
+        message = await channel.send(embed=embed, view=view)
+        # 面板由 on_interaction 統一處理，停止 View 以免常駐在機器人的 View 儲存區
+        view.stop()
+
+        guild_id = str(interaction.guild_id)
+        if guild_id not in self.reaction_messages:
+            self.reaction_messages[guild_id] = {}
+        self.reaction_messages[guild_id][str(message.id)] = {
+            "channel_id": channel.id,
+            "embed_title": title,
+            "embed_description": description,
+            "embed_color": embed_color_int,
+            "panel_type": component_type,
+            "role_ids": [str(role.id) for role in role_list]
+        }
+        self.save_reaction_messages()
+        await interaction.followup.send(f"已成功設定身份組面板！訊息 ID: `{message.id}`", ephemeral=False)
+
     @commands.Cog.listener()
-    async def on_raw_reaction_add(self, payload):
-        if payload.guild_id is None: # 忽略私聊
+    async def on_interaction(self, interaction: discord.Interaction):
+        """元件式身分組面板的無狀態處理器，所需資訊皆從 custom_id 與訊息元件取得"""
+        if interaction.type != discord.InteractionType.component or interaction.guild is None:
+            return
+        custom_id = (interaction.data or {}).get('custom_id', '')
+        if not custom_id.startswith(COMPONENT_PREFIX):
+            return
+
+        guild = interaction.guild
+        member = interaction.user
+        action, _, argument = custom_id[len(COMPONENT_PREFIX):].partition(':')
+
+        if action == "toggle":
+            try:
+                role_id = int(argument)
+            except ValueError:
+                return
+            if member.get_role(role_id):
+                to_add, to_remove = set(), {role_id}
+            else:
+                to_add, to_remove = {role_id}, set()
+        elif action == "select":
+            option_ids = set()
+            for row in interaction.message.components:
+                for component in getattr(row, 'children', []):
+                    if getattr(component, 'custom_id', None) == custom_id:
+                        option_ids = {int(option.value) for option in component.options}
+            selected_ids = {int(value) for value in interaction.data.get('values', [])} & option_ids
+            current_ids = {role.id for role in member.roles}
+            to_add = selected_ids - current_ids
+            to_remove = (option_ids & current_ids) - selected_ids
+        else:
+            return
+
+        # 觸發速率限制時更新身分組可能超過 3 秒，先延遲回應
+        await interaction.response.defer(ephemeral=True)
+
+        bot_top_role = guild.me.top_role
+        added, removed, failed = [], [], []
+        new_roles = member.roles[1:] # 排除 @everyone
+        for role_id in to_add | to_remove:
+            role = self._resolve_role(guild, role_id)
+            if not role:
+                continue
+            if bot_top_role <= role:
+                failed.append(role.name)
+            elif role_id in to_add:
+                new_roles.append(role)
+                added.append(role.mention)
+            else:
+                new_roles.remove(role)
+                removed.append(role.mention)
+
+        if added or removed:
+            try:
+                await member.edit(roles=new_roles, reason="身份組面板")
+            except discord.Forbidden:
+                await interaction.followup.send("機器人缺少權限來更新您的身份組，請聯繫管理員。", ephemeral=True)
+                return
+            except discord.HTTPException as e:
+                await interaction.followup.send(f"更新身份組時發生錯誤：{e}", ephemeral=True)
+                return
+            # 透過元件面板取得或移除的身分組，不再由反應同步管理
+            for role_id in to_add | to_remove:
+                self._set_reaction_grant(guild.id, role_id, member.id, False)
+
+        lines = []
+        if added:
+            lines.append(f"已新增：{' '.join(added)}")
+        if removed:
+            lines.append(f"已移除：{' '.join(removed)}")
+        if failed:
+            lines.append(f"權限不足無法管理：{', '.join(failed)}")
+        await interaction.followup.send("\n".join(lines) or "您的身份組沒有變更。", ephemeral=True)
+
+    def queue_role_update(self, guild: discord.Guild, member_id: int, role: discord.Role, add: bool):
+        """記錄成員的身分組變更，並在延遲結束後合併成一次 API 呼叫"""
+        key = (guild.id, member_id)
+        # 只保留最後一次的意圖，新增後又移除的變更會在套用時與現有身分組比對而抵銷
+        self.pending_role_updates.setdefault(key, {})[role.id] = add
+        if key not in self.role_update_tasks:
+            self.role_update_tasks[key] = asyncio.create_task(self._flush_role_update(key))
+
+    async def _flush_role_update(self, key: Tuple[int, int]):
+        try:
+            await asyncio.sleep(ROLE_UPDATE_DELAY)
+        except asyncio.CancelledError:
+            return
+        finally:
+            self.role_update_tasks.pop(key, None)
+        deltas = self.pending_role_updates.pop(key, None)
+        if not deltas:
+            return
+
+        guild_id, member_id = key
+        guild = self.bot.get_guild(guild_id)
+        if not guild:
+            return
+        member = guild.get_member(member_id)
+        if not member:
             return
 
-        guild = self.bot.get_guild(payload.guild_id)
-        if not guild: return
+        bot_top_role = guild.me.top_role
+        current_roles = member.roles[1:] # 排除 @everyone
+        new_roles = list(current_roles)
+        for role_id, add in deltas.items():
+            role = self._resolve_role(guild, role_id)
+            if not role:
+                continue
+            if bot_top_role <= role:
+                print(f"機器人權限不足以{'賦予' if add else '移除'} {role.name} 給 {member.display_name}")
+                continue
+            if add and role not in new_roles:
+                new_roles.append(role)
+            elif not add and role in new_roles:
+                new_roles.remove(role)
 
-        member = guild.get_member(payload.user_id)
+        # 累積的變更互相抵銷時不需要呼叫 API
+        if set(new_roles) == set(current_roles):
+            return
+
+        try:
+            await member.edit(roles=new_roles, reason="反應身分組")
+        except discord.Forbidden:
+            print(f"機器人缺少權限來更新 {member.display_name} 的身份組。")
+            return
+        except Exception as e:
+            print(f"更新身份組時發生錯誤：{e}")
+            return
+
+        # 只記錄這次實際由反應新增的身分組，成員原本就有的身分組不算在內
+        added_roles = set(new_roles) - set(current_roles)
+        removed_roles = set(current_roles) - set(new_roles)
+        for role in added_roles:
+            self._set_reaction_grant(guild_id, role.id, member_id, True)
+        for role in removed_roles:
+            self._set_reaction_grant(guild_id, role.id, member_id, False)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        # 先以反向索引過濾，非反應身分組訊息的事件不做任何伺服器或成員查詢
+        routed = self._route_reaction(payload)
+        if routed is None:
+            return
+        guild, role = routed
+
+        member = payload.member or guild.get_member(payload.user_id)
         if not member or member.bot: # 忽略機器人自己的反應
             return
 
-        guild_id = str(payload.guild_id)
-        message_id = str(payload.message_id)
-        emoji_str = str(payload.emoji)
-        
-        if guild_id in self.reaction_messages and message_id in self.reaction_messages[guild_id]:
-            message_data = self.reaction_messages[guild_id][message_id]
-            
-            if emoji_str in message_data['roles']:
-                role_id = int(message_data['roles'][emoji_str])
-                role = guild.get_role(role_id)
-                if role and member:
-                    try:
-                        # 檢查機器人是否有權限賦予此身分組
-                        if guild.me.top_role > role:
-                            await member.add_roles(role)
-                        else:
-                            print(f"機器人權限不足以賦予 {role.name} 給 {member.display_name}")
-                    except discord.Forbidden:
-                        print(f"機器人缺少權限來賦予身份組 {role.name}。")
-                    except Exception as e:
-                        print(f"賦予身份組時發生錯誤：{e}")
+        self.queue_role_update(guild, member.id, role, add=True)
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload):
-        if payload.guild_id is None: # 忽略私聊
+        routed = self._route_reaction(payload)
+        if routed is None:
             return
-
-        guild = self.bot.get_guild(payload.guild_id)
-        if not guild: return
+        guild, role = routed
 
         member = guild.get_member(payload.user_id) # 在移除事件中，payload.member 可能為 None
         if not member or member.bot: # 忽略機器人自己的反應或已不在伺服器的成員
             return
 
-        guild_id = str(payload.guild_id)
-        message_id = str(payload.message_id)
-        emoji_str = str(payload.emoji)
-        
-        if guild_id in self.reaction_messages and message_id in self.reaction_messages[guild_id]:
-            message_data = self.reaction_messages[guild_id][message_id]
-            
-            if emoji_str in message_data['roles']:
-                role_id = int(message_data['roles'][emoji_str])
-                role = guild.get_role(role_id)
-                if role and member:
-                    try:
-                        # 檢查機器人是否有權限移除此身分組
-                        if guild.me.top_role > role:
-                            await member.remove_roles(role)
-                        else:
-                            print(f"機器人權限不足以移除 {role.name} 給 {member.display_name}")
-                    except discord.Forbidden:
-                        print(f"機器人缺少權限來移除身份組 {role.name}。")
-                    except Exception as e:
-                        print(f"移除身份組時發生錯誤：{e}")
+        self.queue_role_update(guild, member.id, role, add=False)
 
 async def setup(bot):
     await bot.add_cog(ReactRoles(bot))
\ No newline at end of file
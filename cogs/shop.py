@@ -4,131 +4,517 @@ from discord.ext import commands
 from discord import app_commands
 import json
 import os
-from typing import Optional, Literal
+import copy
+import asyncio
+import time
+from bisect import bisect_left, bisect_right
+from typing import Optional, Literal, Dict, List, Any
+
+from utils.single_flight import SingleFlight
+from utils.component_router import ComponentRouter, detach, modal_values
+from utils.purchase_log import PurchaseLog
 
 # 數據檔案
 SHOP_DATA_FILE = 'shop_data.json'
 CURRENCY_COG_NAME = "Currency"
+ITEMS_PER_PAGE = 5
+SHOP_SAVE_DELAY = 1.0 # 購買造成的庫存變動會合併在此秒數內一次寫入檔案
+PURCHASE_HISTORY_LIMIT = 10 # /購買紀錄 顯示的筆數
+SEARCH_MAX_LENGTH = 50 # 搜尋關鍵字會編碼在 custom_id 最後，需保留長度給其他狀態
+
+# 瀏覽模式的排序與篩選選項 (值: 顯示名稱)
+SORT_OPTIONS = {
+    "default": "上架順序",
+    "price_asc": "價格由低到高",
+    "price_desc": "價格由高到低",
+    "stock": "庫存由多到少",
+    "name": "商品名稱",
+}
+FILTER_OPTIONS = {
+    "all": "全部商品",
+    "in_stock": "只顯示有庫存",
+    "affordable": "只顯示我可購買",
+}
+
+class PurchaseError(Exception):
+    """購買失敗，訊息可直接回覆給使用者"""
+    pass
+
+class ShopCatalog:
+    """
+    單一伺服器的商品目錄，以商品名稱建立索引並快取已渲染的頁面。
+    瀏覽模式使用的排序索引在商品或庫存變動後才重建，每次查詢只需要二分搜尋與切片。
+    """
+    def __init__(self, items: List[Dict[str, Any]]):
+        self.items: List[Dict[str, Any]] = items
+        self.index: Dict[str, Dict[str, Any]] = {item['name']: item for item in items}
+        # 商品編號用於按鈕的 custom_id，舊資料沒有編號時在此補上
+        self.next_item_id = 1 + max((item.get('id', 0) for item in items), default=0)
+        for item in items:
+            if 'id' not in item:
+                item['id'] = self.next_item_id
+                self.next_item_id += 1
+        self.id_index: Dict[int, Dict[str, Any]] = {item['id']: item for item in items}
+        self.page_cache: Dict[int, discord.Embed] = {}
+        self.sorted_indexes: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self.in_stock_indexes: Dict[str, List[Dict[str, Any]]] = {}
+        self.ranks: Dict[str, Dict[str, int]] = {}
+        self.name_keys: List[str] = []
+        self.in_stock_price_keys: List[int] = []
+
+    @property
+    def total_pages(self) -> int:
+        return max(1, (len(self.items) + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE)
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.index.get(name)
+
+    def get_by_id(self, item_id: int) -> Optional[Dict[str, Any]]:
+        return self.id_index.get(item_id)
+
+    def add(self, item: Dict[str, Any]):
+        item['id'] = self.next_item_id
+        self.next_item_id += 1
+        self.items.append(item)
+        self.index[item['name']] = item
+        self.id_index[item['id']] = item
+        self.invalidate()
+
+    def remove(self, name: str) -> Optional[Dict[str, Any]]:
+        item = self.index.pop(name, None)
+        if item is not None:
+            self.items.remove(item)
+            self.id_index.pop(item['id'], None)
+            self.invalidate()
+        return item
+
+    def page_items(self, page: int) -> List[Dict[str, Any]]:
+        start_index = page * ITEMS_PER_PAGE
+        return self.items[start_index:start_index + ITEMS_PER_PAGE]
+
+    def invalidate(self):
+        """商品、庫存或身分組變動時清除已渲染的頁面與排序索引"""
+        self.page_cache.clear()
+        self.sorted_indexes = None
+
+    def uses_role(self, role_id: int) -> bool:
+        role_id_str = str(role_id)
+        return any(item.get('gained_role_id') == role_id_str or item.get('required_role_id') == role_id_str for item in self.items)
+
+    @staticmethod
+    def in_stock(item: Dict[str, Any]) -> bool:
+        return item.get('quantity') is None or item['quantity'] > 0
+
+    def _ensure_indexes(self):
+        if self.sorted_indexes is not None:
+            return
+        by_price = sorted(self.items, key=lambda item: item['cost'])
+        by_name = sorted(self.items, key=lambda item: item['name'].casefold())
+        self.sorted_indexes = {
+            "default": list(self.items),
+            "price_asc": by_price,
+            "price_desc": by_price[::-1],
+            # 無限庫存視為最多
+            "stock": sorted(self.items, key=lambda item: float('inf') if item.get('quantity') is None else item['quantity'], reverse=True),
+            "name": by_name,
+        }
+        self.in_stock_indexes = {
+            sort: [item for item in ordered if self.in_stock(item)]
+            for sort, ordered in self.sorted_indexes.items()
+        }
+        self.ranks = {
+            sort: {item['name']: rank for rank, item in enumerate(ordered)}
+            for sort, ordered in self.sorted_indexes.items()
+        }
+        self.name_keys = [item['name'].casefold() for item in by_name]
+        self.in_stock_price_keys = [item['cost'] for item in self.in_stock_indexes["price_asc"]]
+
+    def _sort_subset(self, items: List[Dict[str, Any]], sort: str) -> List[Dict[str, Any]]:
+        rank = self.ranks[sort]
+        return sorted(items, key=lambda item: rank[item['name']])
+
+    @staticmethod
+    def _meets_role_requirement(item: Dict[str, Any], member: discord.Member) -> bool:
+        required_role_id = item.get('required_role_id')
+        if not required_role_id:
+            return True
+        # 與購買時的檢查相同：身分組已被刪除時不再限制
+        if member.guild.get_role(int(required_role_id)) is None:
+            return True
+        return any(str(role.id) == required_role_id for role in member.roles)
+
+    def query(
+        self,
+        sort: str = "default",
+        stock_filter: str = "all",
+        search: Optional[str] = None,
+        member: Optional[discord.Member] = None,
+        balance: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        依排序、篩選與名稱前綴搜尋回傳商品列表。
+        「我可購買」會以價格索引二分搜尋出買得起的範圍，再檢查所需身分組。
+        回傳的列表可能是索引本身，呼叫端不可修改。
+        """
+        self._ensure_indexes()
+
+        if search:
+            keyword = search.casefold()
+            start = bisect_left(self.name_keys, keyword)
+            end = bisect_left(self.name_keys, keyword + "\U0010ffff")
+            results = self.sorted_indexes["name"][start:end]
+            results_sort = "name"
+            if stock_filter != "all":
+                results = [item for item in results if self.in_stock(item)]
+            if stock_filter == "affordable":
+                results = [item for item in results if balance is not None and item['cost'] <= balance]
+        elif stock_filter == "affordable":
+            end = bisect_right(self.in_stock_price_keys, balance if balance is not None else -1)
+            results = self.in_stock_indexes["price_asc"][:end]
+            results_sort = "price_asc"
+        elif stock_filter == "in_stock":
+            return self.in_stock_indexes[sort]
+        else:
+            return self.sorted_indexes[sort]
+
+        if stock_filter == "affordable" and member is not None:
+            results = [item for item in results if self._meets_role_requirement(item, member)]
+        if sort != results_sort:
+            results = self._sort_subset(results, sort)
+        return results
 
 class ShopView(discord.ui.View):
-    """商店介面視圖，包含購買按鈕和分頁功能。"""
-    def __init__(self, shop_cog, items, page=0):
+    """
+    商店介面視圖，包含購買按鈕和分頁功能。
+    商品超過一頁時提供搜尋、排序與篩選；personal 為 True 表示這是使用者自己的瀏覽結果 (僅自己可見)。
+    頁碼與瀏覽條件都編碼在元件的 custom_id 中，互動由 Shop.on_interaction 處理，
+    因此建立後立即停止，不會留在機器人的 View 儲存區。
+    """
+    def __init__(self, shop_cog, catalog: ShopCatalog, page=0, sort="default", stock_filter="all", search=None, personal=False):
         super().__init__(timeout=None)
         self.shop_cog = shop_cog
-        self.items = items
+        self.catalog = catalog
         self.page = page
-        self.items_per_page = 5
-        
-        if not self.items:
-            self.total_pages = 1
-        else:
-            self.total_pages = (len(self.items) + self.items_per_page - 1) // self.items_per_page
-        
+        self.sort = sort if sort in SORT_OPTIONS else "default"
+        self.stock_filter = stock_filter if stock_filter in FILTER_OPTIONS else "all"
+        self.search = search[:SEARCH_MAX_LENGTH] if search else None
+        self.personal = personal
+        self.results: List[Dict[str, Any]] = catalog.items
+        self.update_buttons()
+        detach(self)
+
+    @property
+    def total_pages(self) -> int:
+        return max(1, (len(self.results) + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE)
+
+    @property
+    def is_default_listing(self) -> bool:
+        return self.sort == "default" and self.stock_filter == "all" and not self.search
+
+    def page_items(self) -> List[Dict[str, Any]]:
+        start_index = self.page * ITEMS_PER_PAGE
+        return self.results[start_index:start_index + ITEMS_PER_PAGE]
+
+    def state(self, page: Optional[int] = None) -> tuple:
+        """custom_id 中的狀態欄位，搜尋關鍵字可能含有冒號，因此放在最後"""
+        return (self.page if page is None else page, self.sort, self.stock_filter, int(self.personal), self.search or "")
+
+    async def refresh(self, member: discord.Member):
+        """重新查詢目前條件下的商品；「我可購買」需要讀取使用者的代幣餘額"""
+        balance = None
+        if self.stock_filter == "affordable":
+            currency_cog = self.shop_cog.bot.get_cog(CURRENCY_COG_NAME)
+            balance = await currency_cog.get_user_money(member.id) if currency_cog else 0
+        self.results = self.catalog.query(self.sort, self.stock_filter, self.search, member, balance)
         self.update_buttons()
 
     def update_buttons(self):
         self.clear_items()
-        start_index = self.page * self.items_per_page
-        end_index = min(start_index + self.items_per_page, len(self.items))
-        
-        for i in range(start_index, end_index):
-            item = self.items[i]
+        self.page = max(0, min(self.page, self.total_pages - 1))
+        router = self.shop_cog.router
+        # 商品不多時維持原本的簡潔介面
+        browsable = self.catalog.total_pages > 1
+
+        if browsable:
+            self.add_item(discord.ui.Select(
+                custom_id=router.custom_id("sort", *self.state()),
+                placeholder="排序方式",
+                options=[discord.SelectOption(label=label, value=value, default=value == self.sort) for value, label in SORT_OPTIONS.items()],
+                row=0
+            ))
+            self.add_item(discord.ui.Select(
+                custom_id=router.custom_id("filter", *self.state()),
+                placeholder="篩選商品",
+                options=[discord.SelectOption(label=label, value=value, default=value == self.stock_filter) for value, label in FILTER_OPTIONS.items()],
+                row=1
+            ))
+
+        for item in self.page_items():
             # 只有當庫存大於 0 或為無限時，按鈕才啟用
-            is_disabled = item.get('quantity') is not None and item.get('quantity') <= 0
-            self.add_item(ShopButton(self.shop_cog, item, disabled=is_disabled))
+            is_disabled = not ShopCatalog.in_stock(item)
+            self.add_item(ShopButton(router.custom_id("buy", item['id'], *self.state()), item, disabled=is_disabled))
 
         if self.total_pages > 1:
-            self.add_item(self.prev_button)
-            self.add_item(self.next_button)
+            self.add_item(discord.ui.Button(
+                label="上一頁", style=discord.ButtonStyle.secondary, row=4,
+                custom_id=router.custom_id("page", *self.state(self.page - 1)), disabled=self.page == 0
+            ))
+            self.add_item(discord.ui.Button(
+                label="下一頁", style=discord.ButtonStyle.secondary, row=4,
+                custom_id=router.custom_id("page", *self.state(self.page + 1)), disabled=self.page >= self.total_pages - 1
+            ))
 
-    @discord.ui.button(label="上一頁", style=discord.ButtonStyle.secondary, row=4)
-    async def prev_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if self.page > 0:
-            self.page -= 1
-            await self.shop_cog._send_shop_page(interaction, self.items, self.page, self)
+        if browsable:
+            self.add_item(discord.ui.Button(
+                label=f"搜尋：{self.search}" if self.search else "搜尋", emoji="🔍", style=discord.ButtonStyle.primary, row=4,
+                custom_id=router.custom_id("search", *self.state())
+            ))
 
-    @discord.ui.button(label="下一頁", style=discord.ButtonStyle.secondary, row=4)
-    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if self.page < self.total_pages - 1:
-            self.page += 1
-            await self.shop_cog._send_shop_page(interaction, self.items, self.page, self)
 
-    async def on_error(self, interaction: discord.Interaction, error: Exception, item: discord.ui.Item) -> None:
-        await interaction.response.send_message(f"發生了未知錯誤：{error}", ephemeral=True)
+class ShopSearchModal(discord.ui.Modal):
+    """以商品名稱開頭搜尋商品，留空則清除搜尋；送出後由 Shop.on_interaction 處理"""
+    def __init__(self, view: ShopView):
+        super().__init__(title="搜尋商品", custom_id=view.shop_cog.router.custom_id("find", *view.state()))
+        self.keyword_input = discord.ui.TextInput(
+            label="商品名稱開頭 (留空為清除搜尋)",
+            custom_id="keyword",
+            default=view.search,
+            required=False,
+            max_length=SEARCH_MAX_LENGTH,
+        )
+        self.add_item(self.keyword_input)
+        detach(self)
 
 
 class ShopButton(discord.ui.Button):
-    """商店中的購買按鈕。"""
-    def __init__(self, shop_cog, item, disabled=False):
-        super().__init__(label=f"購買 {item['name']}", style=discord.ButtonStyle.green, disabled=disabled)
-        self.shop_cog = shop_cog
-        self.item = item
-        
-    async def callback(self, interaction: discord.Interaction):
-        await interaction.response.defer(ephemeral=True)
-        
-        user = interaction.user
-        item_name = self.item['name']
-        cost = self.item['cost']
-        required_role_id = self.item.get('required_role_id')
-        gained_role_id = self.item.get('gained_role_id')
-        quantity = self.item.get('quantity')
+    """商店中的購買按鈕，custom_id 包含商品編號與目前的瀏覽狀態"""
+    def __init__(self, custom_id: str, item, disabled=False):
+        super().__init__(label=f"購買 {item['name']}"[:80], style=discord.ButtonStyle.green, disabled=disabled, row=2, custom_id=custom_id)
+
+
+class Shop(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.shop_data_file = SHOP_DATA_FILE
+        # 舊版的全域商品列表，第一次存取某伺服器的目錄時會複製過去
+        self.legacy_items: List[Dict[str, Any]] = []
+        self.catalogs: Dict[str, ShopCatalog] = self._load_shop_data()
+        # 合併同一使用者對同一商品的重複點擊
+        self.purchase_flights = SingleFlight()
+        self.save_task: Optional[asyncio.Task] = None
+        # 購買紀錄在 cog_load 時於背景執行緒載入，購買與查詢會等待載入完成
+        self.purchase_log = PurchaseLog()
+        self.purchase_log_ready = asyncio.Event()
+        self.purchase_log_task: Optional[asyncio.Task] = None
+        # 所有商店元件的互動都由 on_interaction 依 custom_id 分派
+        self.router = ComponentRouter("shop")
+        self.router.add("page", self._on_page, 5)
+        self.router.add("sort", self._on_sort, 5)
+        self.router.add("filter", self._on_filter, 5)
+        self.router.add("search", self._on_search, 5)
+        self.router.add("find", self._on_find, 5)
+        self.router.add("buy", self._on_buy, 6)
+
+    def _load_shop_data(self) -> Dict[str, ShopCatalog]:
+        """啟動時讀取一次商品數據，之後瀏覽商店完全不讀取磁碟"""
+        data: Any = {}
+        if os.path.exists(self.shop_data_file):
+            with open(self.shop_data_file, 'r', encoding='utf-8') as f:
+                try:
+                    data = json.load(f)
+                except json.JSONDecodeError:
+                    data = {}
+        if isinstance(data, list):
+            self.legacy_items = data
+            return {}
+        return {guild_id: ShopCatalog(items) for guild_id, items in data.items()}
+
+    def _save_shop_data(self):
+        data = {guild_id: catalog.items for guild_id, catalog in self.catalogs.items()}
+        with open(self.shop_data_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+
+    def get_catalog(self, guild_id: int) -> ShopCatalog:
+        guild_id_str = str(guild_id)
+        catalog = self.catalogs.get(guild_id_str)
+        if catalog is None:
+            catalog = ShopCatalog(copy.deepcopy(self.legacy_items))
+            self.catalogs[guild_id_str] = catalog
+            if self.legacy_items:
+                self._save_shop_data()
+        return catalog
+
+    def _mark_catalog_changed(self, guild_id: int):
+        """商品變動後清除頁面快取，並排程合併寫入"""
+        self.get_catalog(guild_id).invalidate()
+        if self.save_task is None or self.save_task.done():
+            self.save_task = asyncio.create_task(self._delayed_save())
+
+    async def _delayed_save(self):
+        await asyncio.sleep(SHOP_SAVE_DELAY)
+        self._save_shop_data()
+
+    async def cog_load(self):
+        self.purchase_log_task = asyncio.create_task(self._load_purchase_log())
+
+    async def _load_purchase_log(self):
+        started = time.perf_counter()
+        try:
+            # 大型紀錄檔需要數秒解析，放到執行緒避免阻塞事件迴圈與心跳
+            await asyncio.to_thread(self.purchase_log.load)
+            print(f"已載入 {len(self.purchase_log)} 筆購買紀錄，耗時 {time.perf_counter() - started:.2f} 秒。")
+        except Exception as e:
+            print(f"載入購買紀錄時發生錯誤：{e}")
+        finally:
+            self.purchase_log_ready.set()
+
+    def cog_unload(self):
+        if self.save_task and not self.save_task.done():
+            self.save_task.cancel()
+            self._save_shop_data()
+        self.purchase_log.close()
+
+    @staticmethod
+    def _reserve_stock(item: Dict[str, Any]) -> bool:
+        """預留一件庫存；檢查與扣除之間沒有 await，因此不會被其他購買插隊"""
+        quantity = item.get('quantity')
+        if quantity is None:
+            return True
+        if quantity <= 0:
+            return False
+        item['quantity'] = quantity - 1
+        return True
+
+    @staticmethod
+    def _release_stock(item: Dict[str, Any]):
+        if item.get('quantity') is not None:
+            item['quantity'] += 1
+
+    async def purchase_item(self, guild: discord.Guild, member: discord.Member, item_name: str) -> Dict[str, Any]:
+        """
+        以單一交易完成購買：預留庫存後扣除代幣，扣款失敗時釋放預留。
+        同一使用者對同一商品的並行點擊只會執行一次。
+        """
+        key = (guild.id, member.id, item_name)
+        item, shared = await self.purchase_flights.do(key, lambda: self._purchase(guild, member, item_name))
+        if shared:
+            raise PurchaseError(f"您購買 **{item_name}** 的請求正在處理中，請勿重複點擊。")
+        return item
+
+    async def _purchase(self, guild: discord.Guild, member: discord.Member, item_name: str) -> Dict[str, Any]:
+        await self.purchase_log_ready.wait()
+        item = self.get_catalog(guild.id).get(item_name)
+        if item is None:
+            raise PurchaseError(f"商品 **{item_name}** 已下架。")
 
         # 獲取貨幣 Cog
-        currency_cog = self.shop_cog.bot.get_cog(CURRENCY_COG_NAME)
+        currency_cog = self.bot.get_cog(CURRENCY_COG_NAME)
         if not currency_cog:
-            await interaction.followup.send("錯誤：找不到貨幣系統。請聯繫管理員。", ephemeral=True)
-            return
-
-        # 檢查庫存
-        if quantity is not None and quantity <= 0:
-            await interaction.followup.send(f"商品 **{item_name}** 已售完。", ephemeral=True)
-            return
+            raise PurchaseError("錯誤：找不到貨幣系統。請聯繫管理員。")
 
         # 檢查是否滿足購買條件身分組
+        required_role_id = item.get('required_role_id')
         if required_role_id:
-            required_role = interaction.guild.get_role(int(required_role_id))
-            if required_role and required_role not in user.roles:
+            required_role = guild.get_role(int(required_role_id))
+            if required_role and required_role not in member.roles:
+                raise PurchaseError(f"您需要擁有身分組 **{required_role.name}** 才能購買此商品。")
+
+        if not self._reserve_stock(item):
+            raise PurchaseError(f"商品 **{item_name}** 已售完。")
+
+        cost = item['cost']
+        try:
+            deducted = await currency_cog.deduct_user_money(member.id, cost)
+        except Exception:
+            self._release_stock(item)
+            raise PurchaseError("扣除代幣失敗，請稍後再試。")
+        if not deducted:
+            self._release_stock(item)
+            raise PurchaseError(f"您的代幣不足，需要 {cost} 個代幣來購買 **{item_name}**。")
+
+        self.purchase_log.append(guild.id, member.id, item_name, cost)
+        if item.get('quantity') is not None:
+            self._mark_catalog_changed(guild.id)
+        return item
+
+    async def refund_purchase(self, guild_id: int, user_id: int, item: Dict[str, Any]):
+        """補償交易：退還代幣並恢復庫存"""
+        currency_cog = self.bot.get_cog(CURRENCY_COG_NAME)
+        if currency_cog:
+            await currency_cog.add_user_money(user_id, item['cost'])
+        await self.purchase_log_ready.wait()
+        self.purchase_log.append(guild_id, user_id, item['name'], -item['cost'])
+        if item.get('quantity') is not None and self.get_catalog(guild_id).get(item['name']) is item:
+            self._release_stock(item)
+            self._mark_catalog_changed(guild_id)
+
+    async def grant_purchased_role(self, interaction: discord.Interaction, item: Dict[str, Any], role: discord.Role) -> bool:
+        """給予購買的身分組，失敗時退款並恢復庫存，回傳是否成功"""
+        try:
+            await interaction.user.add_roles(role, reason=f"商店購買：{item['name']}")
+            return True
+        except Exception as e:
+            print(f"給予商店身分組 {role.name} 時發生錯誤，已退款：{e}")
+            await self.refund_purchase(interaction.guild_id, interaction.user.id, item)
+            try:
                 await interaction.followup.send(
-                    f"您需要擁有身分組 **{required_role.name}** 才能購買此商品。",
-                    ephemeral=True
+                    f"無法給予身分組 **{role.name}** (可能是權限不足)，已退還 {item['cost']} 個代幣，請聯繫管理員。", ephemeral=True
                 )
-                return
+            except discord.HTTPException:
+                pass
+            return False
 
-        # 檢查代幣是否足夠
-        user_money = await currency_cog.get_user_money(user.id)
-        if user_money < cost:
-            await interaction.followup.send(f"您的代幣不足，需要 {cost} 個代幣來購買 **{item_name}**。", ephemeral=True)
-            return
+    def _view_from_state(self, interaction: discord.Interaction, page: str, sort: str, stock_filter: str, personal: str, search: str) -> ShopView:
+        """依 custom_id 中的狀態重建視圖"""
+        return ShopView(
+            self, self.get_catalog(interaction.guild_id),
+            page=int(page) if page.lstrip('-').isdigit() else 0,
+            sort=sort, stock_filter=stock_filter, search=search or None, personal=personal == "1"
+        )
 
-        # 扣除代幣
-        deducted = await currency_cog.deduct_user_money(user.id, cost)
-        if not deducted:
-            await interaction.followup.send("扣除代幣失敗，請稍後再試。", ephemeral=True)
+    async def _on_page(self, interaction: discord.Interaction, *state: str):
+        view = self._view_from_state(interaction, *state)
+        await self._send_shop_page(interaction, view.page, view)
+
+    async def _on_sort(self, interaction: discord.Interaction, *state: str):
+        await self._browse(interaction, self._view_from_state(interaction, *state), sort=interaction.data['values'][0])
+
+    async def _on_filter(self, interaction: discord.Interaction, *state: str):
+        await self._browse(interaction, self._view_from_state(interaction, *state), stock_filter=interaction.data['values'][0])
+
+    async def _on_search(self, interaction: discord.Interaction, *state: str):
+        await interaction.response.send_modal(ShopSearchModal(self._view_from_state(interaction, *state)))
+
+    async def _on_find(self, interaction: discord.Interaction, *state: str):
+        keyword = modal_values(interaction).get('keyword', '').strip()
+        await self._browse(interaction, self._view_from_state(interaction, *state), search=keyword or None)
+
+    async def _on_buy(self, interaction: discord.Interaction, item_id: str, *state: str):
+        await interaction.response.defer(ephemeral=True)
+        view = self._view_from_state(interaction, *state)
+
+        listed_item = view.catalog.get_by_id(int(item_id)) if item_id.isdigit() else None
+        if listed_item is None:
+            await interaction.followup.send("此商品已下架。", ephemeral=True)
+            await self._send_shop_page(interaction, view.page, view)
             return
 
-        # 扣除庫存並儲存
-        if quantity is not None:
-            self.item['quantity'] -= 1
-            self.shop_cog._save_shop_data()
+        try:
+            item = await self.purchase_item(interaction.guild, interaction.user, listed_item['name'])
+        except PurchaseError as e:
+            await interaction.followup.send(str(e), ephemeral=True)
+            return
 
-        # 給予身分組
-        if gained_role_id:
-            gained_role = interaction.guild.get_role(int(gained_role_id))
-            try:
-                if gained_role:
-                    await user.add_roles(gained_role)
+        item_name = item['name']
+        cost = item['cost']
+        gained_role = interaction.guild.get_role(int(item['gained_role_id'])) if item.get('gained_role_id') else None
+        if gained_role:
+            # 確定給予身分組成功後才公開宣布，失敗時會自動退款並恢復庫存
+            if await self.grant_purchased_role(interaction, item, gained_role):
                 await interaction.followup.send(
                     f"🎉 恭喜！您成功以 {cost} 個代幣購買了 **{item_name}**，並獲得了身分組 **{gained_role.name}**！",
                     ephemeral=False
                 )
-            except discord.Forbidden:
-                await interaction.followup.send("我沒有足夠的權限來給予身分組，請聯繫管理員。", ephemeral=True)
-                # 如果給予身分組失敗，將代幣退還並恢復庫存
-                await currency_cog.add_user_money(user.id, cost)
-                if quantity is not None:
-                    self.item['quantity'] += 1
-                    self.shop_cog._save_shop_data()
         else:
             await interaction.followup.send(
                 f"🎉 恭喜！您成功以 {cost} 個代幣購買了 **{item_name}**！",
@@ -136,27 +522,25 @@ class ShopButton(discord.ui.Button):
             )
             
         # 重新發送商店頁面，以更新按鈕狀態和庫存顯示
-        await self.shop_cog._send_shop_page(interaction, self.shop_cog.shop_items, self.shop_cog._last_page, self.view)
+        await self._send_shop_page(interaction, view.page, view)
 
-class Shop(commands.Cog):
-    def __init__(self, bot):
-        self.bot = bot
-        self.shop_data_file = SHOP_DATA_FILE
-        self.shop_items = self._load_shop_data()
-        self._last_page = 0
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        if interaction.guild is None:
+            return
+        await self.router.dispatch(interaction)
 
-    def _load_shop_data(self):
-        if os.path.exists(self.shop_data_file):
-            with open(self.shop_data_file, 'r', encoding='utf-8') as f:
-                try:
-                    return json.load(f)
-                except json.JSONDecodeError:
-                    return []
-        return []
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        catalog = self.catalogs.get(str(after.guild.id))
+        if catalog and (before.name != after.name or before.color != after.color) and catalog.uses_role(after.id):
+            catalog.invalidate()
 
-    def _save_shop_data(self):
-        with open(self.shop_data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.shop_items, f, indent=4, ensure_ascii=False)
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        catalog = self.catalogs.get(str(role.guild.id))
+        if catalog and catalog.uses_role(role.id):
+            catalog.invalidate()
 
     @app_commands.command(name="上架商品", description="上架一個新的商店商品（需管理權限）")
     @app_commands.describe(
@@ -183,6 +567,11 @@ class Shop(commands.Cog):
             await interaction.response.send_message("庫存數量必須大於 0。", ephemeral=True)
             return
             
+        catalog = self.get_catalog(interaction.guild_id)
+        if catalog.get(名稱):
+            await interaction.response.send_message(f"❌ 已存在名稱為 **{名稱}** 的商品。", ephemeral=True)
+            return
+
         new_item = {
             "name": 名稱,
             "cost": 價格,
@@ -191,7 +580,7 @@ class Shop(commands.Cog):
             "quantity": 庫存
         }
         
-        self.shop_items.append(new_item)
+        catalog.add(new_item)
         self._save_shop_data()
         
         embed = discord.Embed(
@@ -212,30 +601,17 @@ class Shop(commands.Cog):
     @app_commands.describe(名稱="要下架的商品名稱")
     @commands.has_permissions(manage_guild=True)
     async def remove_shop_item(self, interaction: discord.Interaction, 名稱: str):
-        original_count = len(self.shop_items)
-        self.shop_items = [item for item in self.shop_items if item['name'] != 名稱]
-        
-        if len(self.shop_items) < original_count:
+        if self.get_catalog(interaction.guild_id).remove(名稱):
             self._save_shop_data()
             await interaction.response.send_message(f"✅ 商品 **{名稱}** 已成功下架！", ephemeral=True)
         else:
             await interaction.response.send_message(f"❌ 找不到名稱為 **{名稱}** 的商品。", ephemeral=True)
             
-    async def _create_shop_embed(self, items, page, guild):
-        items_per_page = 5
-        start_index = page * items_per_page
-        end_index = min(start_index + items_per_page, len(items))
-        
+    def _render_shop_embed(self, items: List[Dict[str, Any]], page: int, total_pages: int, guild: discord.Guild) -> discord.Embed:
         embed = discord.Embed(title="🛒 伺服器商店", color=discord.Color.blue())
-        embed.set_footer(text=f"第 {page + 1} / {(len(items) + items_per_page - 1) // items_per_page} 頁")
-        
-        if not items:
-            embed.description = "商店目前沒有任何商品。"
-            return embed
+        embed.set_footer(text=f"第 {page + 1} / {total_pages} 頁")
 
-        for i in range(start_index, end_index):
-            item = items[i]
-            
+        for item in items:
             gained_role_id = item.get('gained_role_id')
             required_role_id = item.get('required_role_id')
             quantity = item.get('quantity')
@@ -263,40 +639,139 @@ class Shop(commands.Cog):
                 ),
                 inline=False
             )
-            
         return embed
 
-    async def _send_shop_page(self, interaction, items, page, view):
-        self._last_page = page
+    def _create_shop_embed(self, catalog: ShopCatalog, page: int, guild: discord.Guild) -> discord.Embed:
+        """回傳快取的頁面，只有在商品或身分組變動後才重新渲染"""
+        embed = catalog.page_cache.get(page)
+        if embed is not None:
+            return embed
+
+        if not catalog.items:
+            embed = discord.Embed(title="🛒 伺服器商店", description="商店目前沒有任何商品。", color=discord.Color.blue())
+            embed.set_footer(text=f"第 {page + 1} / {catalog.total_pages} 頁")
+        else:
+            embed = self._render_shop_embed(catalog.page_items(page), page, catalog.total_pages, guild)
+        catalog.page_cache[page] = embed
+        return embed
+
+    def _create_browse_embed(self, view: ShopView, guild: discord.Guild) -> discord.Embed:
+        """搜尋、排序或篩選後的頁面因人而異，不放入快取"""
+        if view.is_default_listing:
+            return self._create_shop_embed(view.catalog, view.page, guild)
+
+        embed = self._render_shop_embed(view.page_items(), view.page, view.total_pages, guild)
+        conditions = [f"排序：{SORT_OPTIONS[view.sort]}", f"篩選：{FILTER_OPTIONS[view.stock_filter]}"]
+        if view.search:
+            conditions.insert(0, f"搜尋：{view.search}")
+        embed.description = "｜".join(conditions) + f"\n共 {len(view.results)} 項商品"
+        if not view.results:
+            embed.description += "\n\n沒有符合條件的商品。"
+        return embed
+
+    async def _send_shop_page(self, interaction, page, view):
         view.page = page
-        view.update_buttons()
-        embed = await self._create_shop_embed(items, page, interaction.guild)
-        await interaction.response.edit_message(embed=embed, view=view)
+        await view.refresh(interaction.user)
+        embed = self._create_browse_embed(view, interaction.guild)
+        if interaction.response.is_done():
+            await interaction.edit_original_response(embed=embed, view=view)
+        else:
+            await interaction.response.edit_message(embed=embed, view=view)
+
+    async def _browse(self, interaction: discord.Interaction, view: ShopView, **changes):
+        """
+        變更搜尋、排序或篩選條件。
+        在公開的商店訊息上操作時，改為傳送僅自己可見的瀏覽結果，避免影響其他人看到的頁面。
+        """
+        if view.personal:
+            for name, value in changes.items():
+                setattr(view, name, value)
+            await self._send_shop_page(interaction, 0, view)
+            return
+
+        state = {"sort": view.sort, "stock_filter": view.stock_filter, "search": view.search}
+        state.update(changes)
+        personal_view = ShopView(self, view.catalog, personal=True, **state)
+        await personal_view.refresh(interaction.user)
+        embed = self._create_browse_embed(personal_view, interaction.guild)
+        await interaction.response.send_message(embed=embed, view=personal_view, ephemeral=True)
 
+    @app_commands.command(name="購買紀錄", description="查看自己或其他成員的商店購買紀錄")
+    @app_commands.describe(成員="要查看的成員 (查看他人需要管理伺服器權限)")
+    async def purchase_history(self, interaction: discord.Interaction, 成員: Optional[discord.Member] = None):
+        target = 成員 or interaction.user
+        if target.id != interaction.user.id and not interaction.user.guild_permissions.manage_guild:
+            await interaction.response.send_message("您需要管理伺服器權限才能查看其他成員的購買紀錄。", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        await self.purchase_log_ready.wait()
+        records, totals = self.purchase_log.user_history(interaction.guild_id, target.id, PURCHASE_HISTORY_LIMIT)
+        embed = discord.Embed(title=f"🧾 {target.display_name} 的購買紀錄", color=discord.Color.blue())
+        if totals is None:
+            embed.description = "目前沒有任何購買紀錄。"
+            await interaction.followup.send(embed=embed, ephemeral=True)
+            return
+
+        embed.description = f"共購買 `{totals.purchases}` 次，淨花費 `{totals.spent}` 代幣。"
+        lines = []
+        for record in records:
+            if record.price >= 0:
+                lines.append(f"<t:{record.timestamp}:f> 購買 **{record.item_name}**：`{record.price}` 代幣")
+            else:
+                lines.append(f"<t:{record.timestamp}:f> 退款 **{record.item_name}**：`{-record.price}` 代幣")
+        embed.add_field(name=f"最近 {len(records)} 筆", value="\n".join(lines), inline=False)
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="商品銷售統計", description="查看商品的銷售統計")
+    @app_commands.describe(名稱="商品名稱 (留空顯示熱銷排行)")
+    async def item_sales(self, interaction: discord.Interaction, 名稱: Optional[str] = None):
+        await interaction.response.defer()
+        await self.purchase_log_ready.wait()
+        embed = discord.Embed(title="📊 商品銷售統計", color=discord.Color.blue())
+
+        if 名稱 is None:
+            ranking = self.purchase_log.top_items(interaction.guild_id)
+            if not ranking:
+                embed.description = "目前沒有任何銷售紀錄。"
+            else:
+                embed.description = "\n".join(
+                    f"**{rank}.** {item_name}：售出 `{stats.sold - stats.refunded}` 件，營收 `{stats.revenue}` 代幣"
+                    for rank, (item_name, stats) in enumerate(ranking, start=1)
+                )
+            await interaction.followup.send(embed=embed)
+            return
+
+        stats = self.purchase_log.get_item_stats(interaction.guild_id, 名稱)
+        if stats is None:
+            await interaction.followup.send(f"❌ 找不到商品 **{名稱}** 的銷售紀錄。")
+            return
+
+        embed.title = f"📊 {名稱} 的銷售統計"
+        embed.add_field(name="售出", value=f"{stats.sold} 件")
+        embed.add_field(name="退款", value=f"{stats.refunded} 件")
+        embed.add_field(name="淨營收", value=f"{stats.revenue} 代幣")
+        if stats.last_sold_at:
+            embed.add_field(name="最近售出", value=f"<t:{stats.last_sold_at}:R>", inline=False)
+        recent = self.purchase_log.recent_item_records(interaction.guild_id, 名稱)
+        buyers = [f"<@{record.user_id}> <t:{record.timestamp}:R>" for record in recent if record.price >= 0]
+        if buyers:
+            embed.add_field(name="最近購買者", value="\n".join(buyers), inline=False)
+        await interaction.followup.send(embed=embed)
 
     @app_commands.command(name="查看商店", description="查看所有可購買的商品")
     async def view_shop(self, interaction: discord.Interaction):
         await interaction.response.defer()
         
-        self.shop_items = self._load_shop_data()
+        catalog = self.get_catalog(interaction.guild_id)
         
-        if not self.shop_items:
+        if not catalog.items:
             embed = discord.Embed(title="🛒 伺服器商店", description="商店目前沒有任何商品。", color=discord.Color.blue())
             await interaction.followup.send(embed=embed)
             return
             
-        self._last_page = 0
-        view = ShopView(self, self.shop_items)
-        embed = await self._create_shop_embed(self.shop_items, 0, interaction.guild)
-        
-        # 根據頁數調整分頁按鈕的啟用狀態
-        if view.total_pages > 1:
-            view.prev_button.disabled = True
-            view.next_button.disabled = False
-        else:
-            view.prev_button.disabled = True
-            view.next_button.disabled = True
-        
+        view = ShopView(self, catalog)
+        embed = self._create_shop_embed(catalog, 0, interaction.guild)
         await interaction.followup.send(embed=embed, view=view)
 
 async def setup(bot):
@@ -3,20 +3,112 @@
 import discord
 from discord.ext import commands
 from discord import app_commands, ui
+import asyncio
 import datetime
+import heapq
 import json
 import os
-from typing import Optional, Dict, Any, List
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+from utils.single_flight import SingleFlight
+from utils.transcripts import export_transcript
 
 # 設定工單頻道類別的名稱
 TICKET_CATEGORY_NAME = "tickets"
 TICKET_DATA_FILE = "tickets.json" # 用於保存工單資訊的檔案
 
+# 預建頻道池設定
+POOL_CHANNEL_NAME = "ticket-pool"
+POOL_MAX_SIZE = 20
+POOL_REFILL_INTERVAL = 10 # 每建立一個預建頻道後等待的秒數，避免占用頻道建立的速率限制
+
+# 關閉工單時是否額外輸出 HTML 格式的對話紀錄 (JSONL 一律輸出)
+TRANSCRIPT_WRITE_HTML = False
+
+# 閒置自動關閉設定
+IDLE_SWEEP_INTERVAL = 60 # 檢查閒置工單的間隔（秒）
+IDLE_CLOSE_GRACE = 3600 # 發出警告後，仍無新訊息時等待多久自動關閉（秒）
+CLOSE_RETRY_DELAY = 300 # 自動關閉失敗 (例如對話紀錄無法保存) 時，多久後重試（秒）
+
 class TicketData:
     """用於管理工單數據的類別"""
     def __init__(self):
         self.file_path = TICKET_DATA_FILE
         self.data: Dict[str, Any] = self._load_data()
+        # 擁有者索引：guild_id -> {owner_id: ticket_channel_id}，避免每次點擊都掃描所有工單
+        self.owner_index: Dict[str, Dict[str, str]] = {}
+        # 閒置追蹤：只包含開啟中的工單頻道，on_message 以 O(1) 更新
+        self.last_activity: Dict[int, float] = {}
+        self.warned_at: Dict[int, float] = {}
+        self.channel_guilds: Dict[int, str] = {}
+        # 活動時間有變動、尚未寫回工單資料的頻道，定期儲存時只處理這些頻道
+        self.dirty_activity: set = set()
+        # 正在保存對話紀錄並關閉中的工單頻道，避免重複關閉
+        self.closing: set = set()
+        # 依截止時間排序的最小堆積 (deadline, channel_id)，過期項目在取出時才重新計算
+        self.idle_heap: List[Tuple[float, int]] = []
+        self.idle_heap_channels: set = set()
+        self._build_owner_index()
+        self.rebuild_idle_heap()
+
+    def _build_owner_index(self):
+        self.owner_index = {}
+        for guild_id_str, guild_data in self.data.items():
+            index = self.owner_index.setdefault(guild_id_str, {})
+            for ticket_channel_id, ticket_info in guild_data.get("active_tickets", {}).items():
+                index[ticket_info["owner_id"]] = ticket_channel_id
+                channel_id = int(ticket_channel_id)
+                self.channel_guilds[channel_id] = guild_id_str
+                self.last_activity[channel_id] = ticket_info.get("last_activity", ticket_info["created_at"])
+
+    def touch(self, channel_id: int, timestamp: float):
+        """記錄工單頻道的最新活動時間，並清除閒置警告"""
+        if channel_id in self.last_activity:
+            self.last_activity[channel_id] = timestamp
+            self.warned_at.pop(channel_id, None)
+            self.dirty_activity.add(channel_id)
+
+    def idle_deadline(self, channel_id: int) -> Optional[float]:
+        """計算工單下一次需要處理 (警告或關閉) 的時間，未啟用或已關閉時回傳 None"""
+        guild_id_str = self.channel_guilds.get(channel_id)
+        if guild_id_str is None:
+            return None
+        idle_seconds = self.data.get(guild_id_str, {}).get("idle_close_hours", 0) * 3600
+        if idle_seconds <= 0:
+            return None
+        if channel_id in self.warned_at:
+            return self.warned_at[channel_id] + IDLE_CLOSE_GRACE
+        return self.last_activity[channel_id] + idle_seconds
+
+    def schedule_idle_check(self, channel_id: int, deadline: Optional[float] = None):
+        if channel_id in self.idle_heap_channels:
+            return
+        deadline = deadline if deadline is not None else self.idle_deadline(channel_id)
+        if deadline is not None:
+            heapq.heappush(self.idle_heap, (deadline, channel_id))
+            self.idle_heap_channels.add(channel_id)
+
+    def rebuild_idle_heap(self):
+        """設定變更時重新建立堆積，確保縮短的閒置時間立即生效"""
+        self.idle_heap = []
+        self.idle_heap_channels = set()
+        for channel_id in self.last_activity:
+            self.schedule_idle_check(channel_id)
+
+    def persist_activity(self):
+        """將有變動的活動時間寫回工單資料，由定期清理時批次儲存"""
+        if not self.dirty_activity:
+            return
+        for channel_id in self.dirty_activity:
+            guild_id_str = self.channel_guilds.get(channel_id)
+            if guild_id_str is None:
+                continue
+            ticket_info = self.data[guild_id_str]["active_tickets"].get(str(channel_id))
+            if ticket_info is not None:
+                ticket_info["last_activity"] = self.last_activity[channel_id]
+        self.dirty_activity.clear()
+        self._save_data()
 
     def _load_data(self) -> Dict[str, Any]:
         if os.path.exists(self.file_path):
@@ -47,88 +139,265 @@ class TicketData:
             "owner_id": str(owner_id),
             "created_at": datetime.datetime.now().timestamp()
         }
+        self.owner_index.setdefault(str(guild_id), {})[str(owner_id)] = str(ticket_channel_id)
+        self.channel_guilds[ticket_channel_id] = str(guild_id)
+        self.last_activity[ticket_channel_id] = time.time()
+        self.schedule_idle_check(ticket_channel_id)
         self._save_data()
 
     def remove_ticket(self, guild_id: int, ticket_channel_id: int):
         guild_data = self.get_guild_data(guild_id)
-        guild_data["active_tickets"].pop(str(ticket_channel_id), None)
+        ticket_info = guild_data["active_tickets"].pop(str(ticket_channel_id), None)
+        if ticket_info:
+            index = self.owner_index.get(str(guild_id), {})
+            if index.get(ticket_info["owner_id"]) == str(ticket_channel_id):
+                del index[ticket_info["owner_id"]]
+        self.last_activity.pop(ticket_channel_id, None)
+        self.warned_at.pop(ticket_channel_id, None)
+        self.channel_guilds.pop(ticket_channel_id, None)
+        self.dirty_activity.discard(ticket_channel_id)
         self._save_data()
 
+    def get_owner_ticket(self, guild_id: int, owner_id: int) -> Optional[int]:
+        """回傳使用者開啟中的工單頻道 ID，沒有則回傳 None"""
+        ticket_channel_id = self.owner_index.get(str(guild_id), {}).get(str(owner_id))
+        return int(ticket_channel_id) if ticket_channel_id else None
+
+async def close_ticket_channel(ticket_data: TicketData, channel: discord.TextChannel, reason: Optional[str] = None) -> bool:
+    """
+    保存對話紀錄後刪除工單頻道，兩者都成功後才移除工單紀錄。
+    對話紀錄無法保存時不會刪除頻道，錯誤會往外拋出，工單維持開啟以便稍後重試。
+    已在關閉中的工單回傳 False。
+    """
+    if channel.id in ticket_data.closing:
+        return False
+    ticket_data.closing.add(channel.id)
+    try:
+        try:
+            jsonl_path, html_path, message_count = await export_transcript(channel, write_html=TRANSCRIPT_WRITE_HTML)
+        except Exception as e:
+            print(f"保存工單 {channel.name} 的對話紀錄時發生錯誤，已取消關閉：{e}")
+            raise
+        print(f"已保存工單 {channel.name} 的 {message_count} 則訊息至 {jsonl_path}" + (f" 及 {html_path}" if html_path else ""))
+
+        try:
+            await channel.delete(reason=reason)
+        except discord.NotFound:
+            pass # 頻道已被手動刪除，同樣視為已關閉
+        ticket_data.remove_ticket(channel.guild.id, channel.id)
+    finally:
+        ticket_data.closing.discard(channel.id)
+    return True
+
 class TicketPanel(ui.View):
     """使用者點擊後建立工單的按鈕"""
     def __init__(self, bot, ticket_data: TicketData):
         super().__init__(timeout=None)
         self.bot = bot
         self.ticket_data = ticket_data
+        # 每個伺服器預先計算好的權限覆寫範本 (不含工單擁有者)，身分組變動時失效
+        self.overwrite_templates: Dict[int, Dict[Any, discord.PermissionOverwrite]] = {}
+        # 合併同一使用者並行的工單建立
+        self.creation_flights = SingleFlight()
+        # 每個伺服器的預建頻道補充任務
+        self.pool_tasks: Dict[int, asyncio.Task] = {}
+
+    def get_overwrite_template(self, guild: discord.Guild) -> Dict[Any, discord.PermissionOverwrite]:
+        template = self.overwrite_templates.get(guild.id)
+        if template is None:
+            template = {
+                guild.default_role: discord.PermissionOverwrite(view_channel=False),
+                guild.me: discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True, attach_files=True)
+            }
+            for role in guild.roles:
+                if role.permissions.manage_channels:
+                    template[role] = discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True)
+            self.overwrite_templates[guild.id] = template
+        return template
+
+    def invalidate_overwrite_template(self, guild_id: int):
+        self.overwrite_templates.pop(guild_id, None)
+
+    async def get_ticket_category(self, guild: discord.Guild) -> discord.CategoryChannel:
+        """以快取的類別 ID 取得工單類別，找不到時才以名稱查找或建立"""
+        guild_data = self.ticket_data.get_guild_data(guild.id)
+        category_id = guild_data.get("category_id")
+        category = guild.get_channel(int(category_id)) if category_id else None
+        if isinstance(category, discord.CategoryChannel):
+            return category
+
+        category = discord.utils.get(guild.categories, name=TICKET_CATEGORY_NAME)
+        if not category:
+            category = await guild.create_category(TICKET_CATEGORY_NAME)
+        guild_data["category_id"] = str(category.id)
+        self.ticket_data._save_data()
+        return category
+
+    def _pool_overwrites(self, guild: discord.Guild) -> Dict[Any, discord.PermissionOverwrite]:
+        """預建頻道在被領取前只有機器人看得到"""
+        return {
+            guild.default_role: discord.PermissionOverwrite(view_channel=False),
+            guild.me: discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True, attach_files=True)
+        }
+
+    async def _claim_pool_channel(self, guild: discord.Guild, name: str, overwrites: Dict[Any, discord.PermissionOverwrite]) -> Optional[discord.TextChannel]:
+        """從預建頻道池取出一個頻道，以單次編輯套用名稱與權限；池為空時回傳 None"""
+        guild_data = self.ticket_data.get_guild_data(guild.id)
+        pool = guild_data.get("pool_channel_ids", [])
+        while pool:
+            # 先從記憶體中取出，避免同時開單時領取到同一個頻道；編輯成功後才寫入檔案
+            channel_id = pool.pop(0)
+            channel = guild.get_channel(int(channel_id))
+            if not isinstance(channel, discord.TextChannel):
+                self.ticket_data._save_data()
+                continue
+            try:
+                await channel.edit(name=name, overwrites=overwrites)
+            except discord.NotFound:
+                self.ticket_data._save_data()
+                continue
+            except discord.HTTPException as e:
+                print(f"領取預建頻道 {channel.id} 失敗，改為建立新頻道：{e}")
+                try:
+                    await channel.delete(reason="預建頻道無法使用")
+                except discord.NotFound:
+                    pass
+                except discord.HTTPException:
+                    # 無法刪除時放回池中，之後仍可被領取或由管理員清理
+                    pool.append(channel_id)
+                self.ticket_data._save_data()
+                break
+            self.ticket_data._save_data()
+            self.schedule_pool_refill(guild)
+            return channel
+        if guild_data.get("pool_size", 0) > 0:
+            self.schedule_pool_refill(guild)
+        return None
+
+    def schedule_pool_refill(self, guild: discord.Guild):
+        task = self.pool_tasks.get(guild.id)
+        if task is None or task.done():
+            self.pool_tasks[guild.id] = asyncio.create_task(self._refill_pool(guild))
+
+    async def _refill_pool(self, guild: discord.Guild):
+        """在背景以固定速率補充預建頻道，直到達到設定數量"""
+        guild_data = self.ticket_data.get_guild_data(guild.id)
+        pool = guild_data.setdefault("pool_channel_ids", [])
+        try:
+            while len(pool) < guild_data.get("pool_size", 0):
+                category, _ = await self.creation_flights.do(("category", guild.id), lambda: self.get_ticket_category(guild))
+                channel = await guild.create_text_channel(
+                    POOL_CHANNEL_NAME,
+                    category=category,
+                    overwrites=self._pool_overwrites(guild),
+                    reason="工單預建頻道"
+                )
+                pool.append(str(channel.id))
+                self.ticket_data._save_data()
+                await asyncio.sleep(POOL_REFILL_INTERVAL)
+        except asyncio.CancelledError:
+            pass
+        except discord.HTTPException as e:
+            print(f"補充伺服器 {guild.id} 的工單預建頻道時發生錯誤：{e}")
+
+    async def resize_pool(self, guild: discord.Guild, size: int):
+        """設定預建頻道數量，多出的頻道會被刪除"""
+        guild_data = self.ticket_data.get_guild_data(guild.id)
+        guild_data["pool_size"] = size
+        pool = guild_data.setdefault("pool_channel_ids", [])
+        # 清除已不存在的頻道
+        pool[:] = [channel_id for channel_id in pool if guild.get_channel(int(channel_id))]
+        while len(pool) > size:
+            channel = guild.get_channel(int(pool.pop()))
+            try:
+                await channel.delete(reason="工單預建頻道數量調整")
+            except discord.HTTPException as e:
+                print(f"刪除工單預建頻道時發生錯誤：{e}")
+        self.ticket_data._save_data()
+        if len(pool) < size:
+            self.schedule_pool_refill(guild)
 
     @ui.button(label="建立工單", style=discord.ButtonStyle.secondary, emoji="✉️", custom_id="create_ticket_button")
     async def create_ticket_button(self, interaction: discord.Interaction, button: ui.Button):
         guild = interaction.guild
         owner = interaction.user
 
-        guild_data = self.ticket_data.get_guild_data(guild.id)
-        active_tickets = guild_data["active_tickets"]
-        
         # 檢查使用者是否已經有開啟中的工單
-        for ticket_id, ticket_info in active_tickets.items():
-            if str(owner.id) == ticket_info["owner_id"]:
-                try:
-                    existing_channel = guild.get_channel(int(ticket_id))
-                    if existing_channel:
-                        await interaction.response.send_message(f"您已經有一個開啟中的工單：{existing_channel.mention}，請勿重複建立。", ephemeral=True)
-                        return
-                except (ValueError, TypeError):
-                    pass
+        existing_channel = self.get_existing_ticket(guild, owner)
+        if existing_channel:
+            await interaction.response.send_message(f"您已經有一個開啟中的工單：{existing_channel.mention}，請勿重複建立。", ephemeral=True)
+            return
+
+        # 連點時兩次點擊都可能通過上面的檢查，建立頻道前先延遲回覆，由 SingleFlight 合併重複的建立
+        await interaction.response.defer(ephemeral=True, thinking=True)
 
         # 尋找或建立工單類別
-        ticket_category = discord.utils.get(guild.categories, name=TICKET_CATEGORY_NAME)
-        if not ticket_category:
-            try:
-                ticket_category = await guild.create_category(TICKET_CATEGORY_NAME)
-            except discord.Forbidden:
-                await interaction.response.send_message("我沒有足夠的權限來建立工單類別，請檢查我的權限。", ephemeral=True)
-                return
-        
-        # 覆寫權限，確保工單只有創建者和管理員可見
-        overwrites = {
-            guild.default_role: discord.PermissionOverwrite(view_channel=False),
-            owner: discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True, attach_files=True),
-            guild.me: discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True, attach_files=True)
-        }
-        
-        manage_channels_roles = [role for role in guild.roles if role.permissions.manage_channels]
-        for role in manage_channels_roles:
-            overwrites[role] = discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True)
+        try:
+            ticket_category, _ = await self.creation_flights.do(("category", guild.id), lambda: self.get_ticket_category(guild))
+        except discord.Forbidden:
+            await interaction.followup.send("我沒有足夠的權限來建立工單類別，請檢查我的權限。", ephemeral=True)
+            return
 
         try:
+            (ticket_channel, created), shared = await self.creation_flights.do(
+                ("ticket", guild.id, owner.id),
+                lambda: self._open_ticket(guild, owner, ticket_category)
+            )
+            if shared or not created:
+                await interaction.followup.send(f"您的工單已建立：{ticket_channel.mention}，請勿重複建立。", ephemeral=True)
+            else:
+                await interaction.followup.send(f"您的工單已建立：{ticket_channel.mention}", ephemeral=True)
+
+        except discord.Forbidden:
+            await interaction.followup.send("我沒有足夠的權限來建立工單頻道，請檢查我的權限。", ephemeral=True)
+        except Exception as e:
+            await interaction.followup.send(f"建立工單時發生未知錯誤：{e}", ephemeral=True)
+
+    def get_existing_ticket(self, guild: discord.Guild, owner: discord.Member) -> Optional[discord.TextChannel]:
+        """回傳使用者開啟中的工單頻道，頻道已被手動刪除時順便清除過期的紀錄"""
+        existing_ticket_id = self.ticket_data.get_owner_ticket(guild.id, owner.id)
+        if not existing_ticket_id:
+            return None
+        existing_channel = guild.get_channel(existing_ticket_id)
+        if existing_channel is None:
+            self.ticket_data.remove_ticket(guild.id, existing_ticket_id)
+        return existing_channel
+
+    async def _open_ticket(self, guild: discord.Guild, owner: discord.Member, ticket_category: discord.CategoryChannel) -> Tuple[discord.TextChannel, bool]:
+        """建立工單頻道、發送歡迎訊息並記錄工單，回傳 (頻道, 是否為新建立)"""
+        # 重複的點擊可能在前一次建立完成、離開 SingleFlight 後才進入，此時直接回傳已建立的工單
+        existing_channel = self.get_existing_ticket(guild, owner)
+        if existing_channel:
+            return existing_channel, False
+
+        # 覆寫權限，確保工單只有創建者和管理員可見
+        overwrites = dict(self.get_overwrite_template(guild))
+        overwrites[owner] = discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True, attach_files=True)
+
+        ticket_channel = await self._claim_pool_channel(guild, f'ticket-{owner.name}', overwrites)
+        if ticket_channel is None:
             ticket_channel = await guild.create_text_channel(
                 f'ticket-{owner.name}',
                 category=ticket_category,
                 overwrites=overwrites
             )
-            
-            # 發送工單歡迎訊息
-            ticket_embed = discord.Embed(
-                title=f"工單已開啟",
-                description="請在此描述您的問題。管理員將盡快回覆您。",
-                color=discord.Color.green()
-            )
-            ticket_embed.add_field(name="工單創建者", value=owner.mention, inline=True)
-            ticket_embed.add_field(name="工單編號", value=f"#{ticket_channel.name}", inline=True)
-            ticket_embed.set_footer(text="要關閉此工單，請點擊下方的按鈕。")
-            
-            # 傳送工單歡迎訊息，並附加關閉按鈕
-            view = TicketCloseView(self.bot, self.ticket_data)
-            await ticket_channel.send(f"歡迎 {owner.mention}。", embed=ticket_embed, view=view)
-            
-            self.ticket_data.add_ticket(guild.id, ticket_channel.id, owner.id)
-            
-            await interaction.response.send_message(f"您的工單已建立：{ticket_channel.mention}", ephemeral=True)
-            
-        except discord.Forbidden:
-            await interaction.response.send_message("我沒有足夠的權限來建立工單頻道，請檢查我的權限。", ephemeral=True)
-        except Exception as e:
-            await interaction.response.send_message(f"建立工單時發生未知錯誤：{e}", ephemeral=True)
+        # 頻道建立後立即記錄，之後的點擊即可由擁有者索引直接攔截
+        self.ticket_data.add_ticket(guild.id, ticket_channel.id, owner.id)
+
+        # 發送工單歡迎訊息
+        ticket_embed = discord.Embed(
+            title=f"工單已開啟",
+            description="請在此描述您的問題。管理員將盡快回覆您。",
+            color=discord.Color.green()
+        )
+        ticket_embed.add_field(name="工單創建者", value=owner.mention, inline=True)
+        ticket_embed.add_field(name="工單編號", value=f"#{ticket_channel.name}", inline=True)
+        ticket_embed.set_footer(text="要關閉此工單，請點擊下方的按鈕。")
+
+        # 傳送工單歡迎訊息，並附加關閉按鈕
+        view = TicketCloseView(self.bot, self.ticket_data)
+        await ticket_channel.send(f"歡迎 {owner.mention}。", embed=ticket_embed, view=view)
+        return ticket_channel, True
 
 
 class TicketCloseView(ui.View):
@@ -158,10 +427,15 @@ class TicketCloseView(ui.View):
             await interaction.response.send_message("您沒有權限關閉此工單。", ephemeral=True)
             return
         
-        await interaction.response.send_message("正在關閉工單...", ephemeral=True)
-        
-        self.ticket_data.remove_ticket(guild.id, channel.id)
-        await channel.delete()
+        if channel.id in self.ticket_data.closing:
+            await interaction.response.send_message("此工單正在關閉中，請稍候。", ephemeral=True)
+            return
+
+        await interaction.response.send_message("正在保存對話紀錄並關閉工單...", ephemeral=True)
+        try:
+            await close_ticket_channel(self.ticket_data, channel)
+        except Exception as e:
+            await interaction.followup.send(f"關閉工單時發生錯誤，工單與對話紀錄均已保留，請稍後再試：{e}", ephemeral=True)
 
 
 class Tickets(commands.Cog):
@@ -169,13 +443,128 @@ class Tickets(commands.Cog):
         self.bot = bot
         self.ticket_data = TicketData()
         self.ticket_panel_view = TicketPanel(self.bot, self.ticket_data)
-        
+        self.idle_sweeper_task = self.bot.loop.create_task(self.idle_sweeper())
+
     @commands.Cog.listener()
     async def on_ready(self):
         # 機器人啟動時，重新註冊按鈕事件
         self.bot.add_view(self.ticket_panel_view)
         self.bot.add_view(TicketCloseView(self.bot, self.ticket_data))
 
+        # 檢查並補充各伺服器的預建頻道池
+        for guild_id_str, guild_data in self.ticket_data.data.items():
+            if guild_data.get("pool_size", 0) <= 0:
+                continue
+            guild = self.bot.get_guild(int(guild_id_str))
+            if guild:
+                await self.ticket_panel_view.resize_pool(guild, guild_data["pool_size"])
+
+    def cog_unload(self):
+        for task in self.ticket_panel_view.pool_tasks.values():
+            task.cancel()
+        self.idle_sweeper_task.cancel()
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        # 只更新記憶體中的時間戳，寫回檔案由定期清理批次處理
+        if not message.author.bot:
+            self.ticket_data.touch(message.channel.id, time.time())
+
+    async def idle_sweeper(self):
+        await self.bot.wait_until_ready()
+        while not self.bot.is_closed():
+            try:
+                await self.sweep_idle_tickets()
+            except Exception as e:
+                print(f"檢查閒置工單時發生錯誤：{e}")
+            await asyncio.sleep(IDLE_SWEEP_INTERVAL)
+
+    async def sweep_idle_tickets(self):
+        """只處理堆積頂端已到期的工單，未到期的工單完全不會被檢查"""
+        ticket_data = self.ticket_data
+        now = time.time()
+        while ticket_data.idle_heap and ticket_data.idle_heap[0][0] <= now:
+            _, channel_id = heapq.heappop(ticket_data.idle_heap)
+            ticket_data.idle_heap_channels.discard(channel_id)
+
+            # 取出時才重新計算截止時間，期間有新訊息的工單只需要重新排入
+            deadline = ticket_data.idle_deadline(channel_id)
+            if deadline is None:
+                continue
+            if deadline > now:
+                ticket_data.schedule_idle_check(channel_id, deadline)
+                continue
+
+            channel = self.bot.get_channel(channel_id)
+            if channel is None:
+                ticket_data.remove_ticket(int(ticket_data.channel_guilds[channel_id]), channel_id)
+                continue
+
+            if channel_id not in ticket_data.warned_at:
+                idle_hours = ticket_data.get_guild_data(channel.guild.id).get("idle_close_hours", 0)
+                ticket_data.warned_at[channel_id] = now
+                ticket_data.schedule_idle_check(channel_id)
+                try:
+                    await channel.send(
+                        f"⏰ 此工單已閒置超過 {idle_hours} 小時，若在 {IDLE_CLOSE_GRACE // 60} 分鐘內沒有新訊息，將自動關閉。"
+                    )
+                except discord.HTTPException as e:
+                    print(f"發送工單閒置警告時發生錯誤：{e}")
+            else:
+                try:
+                    closed = await close_ticket_channel(ticket_data, channel, reason="工單閒置自動關閉")
+                except Exception as e:
+                    # 工單紀錄仍保留，稍後重新排入堆積重試
+                    print(f"自動關閉工單 {channel.name} 時發生錯誤，{CLOSE_RETRY_DELAY} 秒後重試：{e}")
+                    closed = False
+                if not closed:
+                    # 關閉失敗或正由其他操作關閉中，稍後再確認；工單已被移除時重新排入會被略過
+                    ticket_data.schedule_idle_check(channel_id, now + CLOSE_RETRY_DELAY)
+
+        ticket_data.persist_activity()
+
+    @app_commands.command(name="工單閒置關閉", description="設定工單閒置多久後自動警告並關閉（0 為停用）")
+    @app_commands.describe(小時="閒置多少小時後發出警告")
+    @commands.has_permissions(manage_guild=True)
+    @app_commands.guild_only()
+    async def set_idle_close(self, interaction: discord.Interaction, 小時: app_commands.Range[int, 0, 720]):
+        guild_data = self.ticket_data.get_guild_data(interaction.guild_id)
+        guild_data["idle_close_hours"] = 小時
+        self.ticket_data._save_data()
+        self.ticket_data.rebuild_idle_heap()
+        if 小時 > 0:
+            await interaction.response.send_message(
+                f"已設定工單閒置 `{小時}` 小時後發出警告，再經過 {IDLE_CLOSE_GRACE // 60} 分鐘仍無新訊息將自動關閉。", ephemeral=True
+            )
+        else:
+            await interaction.response.send_message("已停用工單閒置自動關閉。", ephemeral=True)
+
+    @app_commands.command(name="工單預建頻道", description="設定預先建立的隱藏工單頻道數量，以加速大量開單（0 為停用）")
+    @app_commands.describe(數量="預建頻道的數量")
+    @commands.has_permissions(manage_guild=True)
+    @app_commands.guild_only()
+    async def set_ticket_pool(self, interaction: discord.Interaction, 數量: app_commands.Range[int, 0, POOL_MAX_SIZE]):
+        await interaction.response.defer(ephemeral=True)
+        await self.ticket_panel_view.resize_pool(interaction.guild, 數量)
+        if 數量 > 0:
+            await interaction.followup.send(f"已將工單預建頻道數量設定為 `{數量}`，將在背景以每 {POOL_REFILL_INTERVAL} 秒一個的速度建立。", ephemeral=True)
+        else:
+            await interaction.followup.send("已停用工單預建頻道，並刪除現有的預建頻道。", ephemeral=True)
+
+    # 身分組變動會影響管理員權限覆寫，讓該伺服器的範本失效
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role: discord.Role):
+        self.ticket_panel_view.invalidate_overwrite_template(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.ticket_panel_view.invalidate_overwrite_template(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        if before.permissions.manage_channels != after.permissions.manage_channels:
+            self.ticket_panel_view.invalidate_overwrite_template(after.guild.id)
+
     @app_commands.command(name="ticket_panel", description="建立一個客製化的工單建立面板")
     @app_commands.describe(
         標題="面板的標題",
@@ -1,8 +1,24 @@
 # cogs/weather.py
 import discord
+import asyncio
+import json
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Dict, List, Tuple
 from discord import app_commands
 from discord.ext import commands
-from utils.weather import get_weather_forecast
+from utils.weather import ForecastCache, FORECAST_TTL, close_client
+from utils.rate_limiter import RateLimitedQueue
+
+WEATHER_SUBSCRIPTIONS_FILE = 'weather_subscriptions.json'
+TAIWAN_TZ = timezone(timedelta(hours=8)) # 臺灣沒有日光節約時間，固定 UTC+8
+BROADCAST_SEND_INTERVAL = 1.0 # 每日預報推播時，每則訊息之間的間隔秒數
+BROADCAST_MISSED_GRACE = 15 * 60 # 整點推播延遲超過此秒數時視為錯過，不再補發
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+CITY_SEPARATORS = re.compile(r"[,，、\s]+")
 
 # 台灣各縣市列表，用於下拉式選單
 TAIWAN_CITIES = [
@@ -29,17 +45,217 @@ TAIWAN_CITIES = [
     app_commands.Choice(name="金門縣", value="金門縣"),
     app_commands.Choice(name="連江縣", value="連江縣")
 ]
+CITY_NAMES = [city.value for city in TAIWAN_CITIES]
+
+def parse_cities(cities_input: str) -> Tuple[List[str], List[str]]:
+    """解析以逗號或空白分隔的縣市名稱，回傳 (縣市列表, 無法辨識的輸入)；「台」會視為「臺」"""
+    cities: List[str] = []
+    unknown: List[str] = []
+    for token in CITY_SEPARATORS.split(cities_input.strip()):
+        if not token:
+            continue
+        name = token.replace("台", "臺")
+        if name in CITY_NAMES:
+            if name not in cities:
+                cities.append(name)
+        else:
+            unknown.append(token)
+    return cities, unknown
+
+def batch_embeds(embeds: List[discord.Embed]) -> List[List[discord.Embed]]:
+    """依 Discord 單則訊息的嵌入數量與總字數限制分批"""
+    batches: List[List[discord.Embed]] = []
+    current: List[discord.Embed] = []
+    current_chars = 0
+    for embed in embeds:
+        size = len(embed)
+        if current and (len(current) >= MAX_EMBEDS_PER_MESSAGE or current_chars + size > MAX_EMBED_CHARS_PER_MESSAGE):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append(embed)
+        current_chars += size
+    if current:
+        batches.append(current)
+    return batches
 
 class Weather(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.forecast_cache = ForecastCache(CITY_NAMES)
+        # {"guild_id": {"channel_id": {"cities": ["臺北市"], "hour": 7}}}
+        self.subscriptions: Dict[str, Dict[str, dict]] = self._load_subscriptions()
+        self.broadcast_queue = RateLimitedQueue(BROADCAST_SEND_INTERVAL)
+        self.prefetch_task = self.bot.loop.create_task(self.prefetch_forecasts())
+        self.broadcast_task = self.bot.loop.create_task(self.broadcast_scheduler())
+
+    async def cog_unload(self):
+        self.prefetch_task.cancel()
+        self.broadcast_task.cancel()
+        self.broadcast_queue.close()
+        self.forecast_cache.close()
+        # 關閉共用的 HTTP 連線池
+        await close_client()
+
+    async def prefetch_forecasts(self):
+        """定期一次抓取所有縣市的預報，讓查詢指令直接從記憶體回應"""
+        await self.bot.wait_until_ready()
+        while not self.bot.is_closed():
+            try:
+                await self.forecast_cache.refresh()
+            except Exception as e:
+                print(f"預先抓取天氣預報時發生錯誤：{e}")
+            await asyncio.sleep(FORECAST_TTL)
+
+    def _load_subscriptions(self) -> Dict[str, Dict[str, dict]]:
+        if os.path.exists(WEATHER_SUBSCRIPTIONS_FILE):
+            with open(WEATHER_SUBSCRIPTIONS_FILE, 'r', encoding='utf-8') as f:
+                try:
+                    return json.load(f)
+                except json.JSONDecodeError:
+                    return {}
+        return {}
+
+    def _save_subscriptions(self):
+        with open(WEATHER_SUBSCRIPTIONS_FILE, 'w', encoding='utf-8') as f:
+            json.dump(self.subscriptions, f, indent=4, ensure_ascii=False)
+
+    async def broadcast_scheduler(self):
+        """每到整點 (臺灣時間) 推播該小時訂閱的預報"""
+        await self.bot.wait_until_ready()
+        # 目標時間只由上一次的目標遞增，不從醒來時的時鐘重新計算；
+        # 計時器提早觸發或系統時鐘稍慢時會再等待剩餘時間，同一小時不會推播兩次
+        target = (datetime.now(TAIWAN_TZ) + timedelta(hours=1)).replace(minute=0, second=0, microsecond=0)
+        while not self.bot.is_closed():
+            delay = (target - datetime.now(TAIWAN_TZ)).total_seconds()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            if -delay <= BROADCAST_MISSED_GRACE:
+                try:
+                    await self.broadcast(target.hour)
+                except Exception as e:
+                    print(f"推播天氣預報時發生錯誤：{e}")
+            else:
+                # 系統休眠或事件迴圈長時間阻塞時，略過已經錯過太久的整點
+                print(f"已錯過 {target.strftime('%m/%d %H:%M')} 的天氣預報推播，略過。")
+            target += timedelta(hours=1)
+
+    async def render_forecast_embeds(self, cities: List[str]) -> Dict[str, discord.Embed]:
+        """每個縣市只渲染一次，所有訂閱的頻道共用同一個嵌入訊息"""
+        if not self.forecast_cache.is_fresh:
+            try:
+                await self.forecast_cache.refresh()
+            except Exception as e:
+                print(f"更新天氣預報失敗，推播將使用舊資料：{e}")
+
+        embeds = {}
+        for city in cities:
+            forecast = self.forecast_cache.forecasts.get(city)
+            if forecast is None:
+                continue
+            embed = discord.Embed(title=f"🌤️ {city} 今明天氣預報", description=forecast, color=discord.Color.blue())
+            embed.set_footer(text="資料來源：中央氣象署")
+            embeds[city] = embed
+        return embeds
+
+    async def broadcast(self, hour: int) -> Dict[str, int]:
+        """
+        推播指定小時的所有訂閱：先渲染所有用到的縣市一次，
+        再透過限速佇列依序送到各頻道，回傳推播統計。
+        """
+        due: List[Tuple[discord.abc.Messageable, List[str]]] = []
+        for guild_id, channels in self.subscriptions.items():
+            guild = self.bot.get_guild(int(guild_id))
+            if guild is None:
+                continue
+            for channel_id, subscription in channels.items():
+                if subscription.get("hour") != hour:
+                    continue
+                channel = guild.get_channel(int(channel_id))
+                if channel is None:
+                    print(f"找不到天氣預報訂閱的頻道 {channel_id}，已略過。")
+                    continue
+                due.append((channel, subscription["cities"]))
+
+        stats = {"channels": len(due), "cities": 0, "messages": 0, "failed": 0}
+        if not due:
+            return stats
+
+        embeds = await self.render_forecast_embeds(sorted({city for _, cities in due for city in cities}))
+        stats["cities"] = len(embeds)
+
+        completed, failed = self.broadcast_queue.completed, self.broadcast_queue.failed
+        for channel, cities in due:
+            for batch in batch_embeds([embeds[city] for city in cities if city in embeds]):
+                await self.broadcast_queue.put(partial(channel.send, embeds=batch))
+        await self.broadcast_queue.join()
+        stats["messages"] = self.broadcast_queue.completed - completed
+        stats["failed"] = self.broadcast_queue.failed - failed
+        return stats
+
+    @app_commands.command(name="訂閱天氣預報", description="每天在指定時間將縣市天氣預報發送到頻道（需管理權限）")
+    @app_commands.describe(
+        頻道="要發送天氣預報的頻道",
+        縣市="要推播的縣市，以逗號分隔 (例如：臺北市,新北市)",
+        時間="每天發送的時間 (臺灣時間，0-23 點)"
+    )
+    @commands.has_permissions(manage_guild=True)
+    async def subscribe_forecast(self, interaction: discord.Interaction, 頻道: discord.TextChannel, 縣市: str, 時間: app_commands.Range[int, 0, 23]):
+        cities, unknown = parse_cities(縣市)
+        if unknown:
+            await interaction.response.send_message(f"❌ 無法辨識的縣市：`{'`, `'.join(unknown)}`。", ephemeral=True)
+            return
+        if not cities:
+            await interaction.response.send_message("❌ 請至少指定一個縣市。", ephemeral=True)
+            return
+        permissions = 頻道.permissions_for(interaction.guild.me)
+        if not permissions.send_messages or not permissions.embed_links:
+            await interaction.response.send_message(f"❌ 我沒有在 {頻道.mention} 發送訊息或嵌入連結的權限。", ephemeral=True)
+            return
+
+        guild_subscriptions = self.subscriptions.setdefault(str(interaction.guild_id), {})
+        guild_subscriptions[str(頻道.id)] = {"cities": cities, "hour": 時間}
+        self._save_subscriptions()
+        await interaction.response.send_message(
+            f"✅ 每天 {時間:02d}:00 會在 {頻道.mention} 發送 {'、'.join(cities)} 的天氣預報。", ephemeral=True
+        )
+
+    @app_commands.command(name="取消天氣預報", description="取消頻道的每日天氣預報（需管理權限）")
+    @app_commands.describe(頻道="要取消推播的頻道")
+    @commands.has_permissions(manage_guild=True)
+    async def unsubscribe_forecast(self, interaction: discord.Interaction, 頻道: discord.TextChannel):
+        guild_subscriptions = self.subscriptions.get(str(interaction.guild_id), {})
+        if guild_subscriptions.pop(str(頻道.id), None) is None:
+            await interaction.response.send_message(f"❌ {頻道.mention} 沒有訂閱天氣預報。", ephemeral=True)
+            return
+        if not guild_subscriptions:
+            self.subscriptions.pop(str(interaction.guild_id), None)
+        self._save_subscriptions()
+        await interaction.response.send_message(f"✅ 已取消 {頻道.mention} 的每日天氣預報。", ephemeral=True)
+
+    @app_commands.command(name="天氣預報訂閱列表", description="查看本伺服器的每日天氣預報設定")
+    async def list_forecast_subscriptions(self, interaction: discord.Interaction):
+        guild_subscriptions = self.subscriptions.get(str(interaction.guild_id), {})
+        if not guild_subscriptions:
+            await interaction.response.send_message("本伺服器沒有設定每日天氣預報。", ephemeral=True)
+            return
+        lines = [
+            f"<#{channel_id}>：每天 {subscription['hour']:02d}:00，{'、'.join(subscription['cities'])}"
+            for channel_id, subscription in sorted(guild_subscriptions.items(), key=lambda entry: entry[1]['hour'])
+        ]
+        embed = discord.Embed(title="🌤️ 每日天氣預報", description="\n".join(lines), color=discord.Color.blue())
+        await interaction.response.send_message(embed=embed, ephemeral=True)
 
     @app_commands.command(name="查詢天氣", description="查詢指定地區未來3個時段的天氣預報")
     @app_commands.describe(location="查詢天氣的縣市")
     @app_commands.choices(location=TAIWAN_CITIES)
     async def weather_command(self, interaction: discord.Interaction, location: app_commands.Choice[str]):
+        # 快取命中時直接回應；尚未抓取過資料時才需要等待 API
+        if self.forecast_cache.has(location.value):
+            await interaction.response.send_message(await self.forecast_cache.get(location.value))
+            return
         await interaction.response.defer(thinking=True)
-        forecast_message = await get_weather_forecast(location.value)
+        forecast_message = await self.forecast_cache.get(location.value)
         await interaction.followup.send(forecast_message)
 
 async def setup(bot):
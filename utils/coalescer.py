@@ -0,0 +1,78 @@
+# utils/coalescer.py
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+# 回呼參數：key、保留的項目、超過上限而只計數的項目數量
+FlushCallback = Callable[[Hashable, List[Any], int], Awaitable[None]]
+
+class _Batch:
+    __slots__ = ("items", "overflow", "task", "last_flush", "interval")
+
+    def __init__(self, min_interval: float):
+        self.items: List[Any] = []
+        self.overflow = 0
+        self.task: Optional[asyncio.Task] = None
+        self.last_flush = float('-inf')
+        self.interval = min_interval
+
+class AdaptiveCoalescer:
+    """
+    依 key 合併短時間內的大量事件，以單次回呼處理。
+    安靜時事件會立即送出；距離上次送出不到 interval 秒的事件則累積到下一次送出，
+    每次合併超過一個事件時 interval 加倍 (最多 max_interval)，只送出單一事件時減半，
+    讓負載越高時批次越大、送出次數越少。
+    """
+    def __init__(self, callback: FlushCallback, min_interval: float = 2.0, max_interval: float = 30.0, max_items: int = 20):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_items = max_items
+        self.batches: Dict[Hashable, _Batch] = {}
+
+    def add(self, key: Hashable, item: Any):
+        batch = self.batches.get(key)
+        if batch is None:
+            batch = self.batches[key] = _Batch(self.min_interval)
+
+        if len(batch.items) < self.max_items:
+            batch.items.append(item)
+        else:
+            batch.overflow += 1
+
+        if batch.task is None:
+            now = time.monotonic()
+            if now - batch.last_flush >= batch.interval * 2:
+                # 已經安靜一段時間，回到立即送出
+                batch.interval = self.min_interval
+            delay = batch.last_flush + batch.interval - now
+            batch.task = asyncio.create_task(self._flush_later(key, batch, max(delay, 0)))
+
+    async def _flush_later(self, key: Hashable, batch: _Batch, delay: float):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self._flush(key, batch)
+
+    async def _flush(self, key: Hashable, batch: _Batch):
+        items, overflow = batch.items, batch.overflow
+        batch.items, batch.overflow = [], 0
+        batch.task = None
+        if not items:
+            return
+        if len(items) + overflow > 1:
+            batch.interval = min(batch.interval * 2, self.max_interval)
+        else:
+            batch.interval = max(batch.interval / 2, self.min_interval)
+        batch.last_flush = time.monotonic()
+        try:
+            await self.callback(key, items, overflow)
+        except Exception as e:
+            print(f"合併送出 {key} 的事件時發生錯誤：{e}")
+
+    async def flush_all(self):
+        """立即送出所有累積中的事件，用於卸載 Cog 前"""
+        for key, batch in list(self.batches.items()):
+            if batch.task is not None:
+                batch.task.cancel()
+                await self._flush(key, batch)
+        self.batches.clear()
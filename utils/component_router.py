@@ -0,0 +1,81 @@
+# utils/component_router.py
+import discord
+from typing import Any, Awaitable, Callable, Dict, Tuple, TypeVar, Union
+
+CUSTOM_ID_MAX_LENGTH = 100 # Discord 對 custom_id 的長度限制
+
+ComponentHandler = Callable[..., Awaitable[Any]]
+Detachable = TypeVar("Detachable", bound=Union[discord.ui.View, discord.ui.Modal])
+
+class ComponentRouter:
+    """
+    無狀態的元件路由，custom_id 格式為 <prefix>:<action>:<參數1>:<參數2>...。
+    所有狀態都編碼在 custom_id 中，由 Cog 的 on_interaction 監聽器呼叫 dispatch 統一分派，
+    送出的 View 與 Modal 不需要保存在機器人的 View 儲存區，重啟後按鈕也依然有效。
+    """
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.handlers: Dict[str, Tuple[ComponentHandler, int]] = {}
+
+    def add(self, action: str, handler: ComponentHandler, arg_count: int = 0):
+        """
+        註冊 handler(interaction, *參數)。最後一個參數可以包含冒號，
+        因此使用者輸入的文字 (例如搜尋關鍵字) 應放在最後。
+        """
+        self.handlers[action] = (handler, arg_count)
+
+    def custom_id(self, action: str, *args: Any) -> str:
+        custom_id = ":".join([self.prefix, action, *map(str, args)])
+        if len(custom_id) > CUSTOM_ID_MAX_LENGTH:
+            raise ValueError(f"custom_id 超過 {CUSTOM_ID_MAX_LENGTH} 個字元：{custom_id}")
+        return custom_id
+
+    async def dispatch(self, interaction: discord.Interaction) -> bool:
+        """處理屬於此路由的元件或 Modal 互動，回傳是否已處理"""
+        if interaction.type not in (discord.InteractionType.component, discord.InteractionType.modal_submit):
+            return False
+        custom_id = (interaction.data or {}).get('custom_id', '')
+        prefix, _, rest = custom_id.partition(':')
+        if prefix != self.prefix:
+            return False
+        action, _, argument = rest.partition(':')
+        route = self.handlers.get(action)
+        if route is None:
+            return False
+
+        handler, arg_count = route
+        args = argument.split(':', arg_count - 1) if arg_count else []
+        if len(args) != arg_count:
+            print(f"無法解析元件 custom_id：{custom_id}")
+            return True
+
+        try:
+            await handler(interaction, *args)
+        except Exception as e:
+            print(f"處理元件 {custom_id} 時發生錯誤：{e}")
+            try:
+                if interaction.response.is_done():
+                    await interaction.followup.send(f"發生了未知錯誤：{e}", ephemeral=True)
+                else:
+                    await interaction.response.send_message(f"發生了未知錯誤：{e}", ephemeral=True)
+            except discord.HTTPException:
+                pass
+        return True
+
+def detach(view: Detachable) -> Detachable:
+    """
+    在送出前停止 View 或 Modal，discord.py 就不會把它放進儲存區。
+    適用於所有元件都由 ComponentRouter 處理、本身沒有 callback 的 View / Modal。
+    """
+    view.stop()
+    return view
+
+def modal_values(interaction: discord.Interaction) -> Dict[str, str]:
+    """從 Modal 送出的互動資料中取出 {custom_id: 輸入值}"""
+    values: Dict[str, str] = {}
+    for row in (interaction.data or {}).get('components', []):
+        children = row.get('components') or ([row['component']] if 'component' in row else [row])
+        for component in children:
+            if 'custom_id' in component:
+                values[component['custom_id']] = component.get('value', '')
+    return values
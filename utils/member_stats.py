@@ -0,0 +1,142 @@
+# utils/member_stats.py
+import base64
+import json
+import os
+import sys
+import zlib
+from array import array
+from typing import Dict, List, Optional
+
+MEMBER_GROWTH_FILE = 'member_growth.json'
+# 解析度名稱 -> (每格秒數, 格數)：每分鐘保留 1 天、每小時保留 30 天、每天保留 1 年
+RESOLUTIONS = {
+    "minute": (60, 1440),
+    "hour": (3600, 720),
+    "day": (86400, 365)
+}
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+class RingCounter:
+    """
+    以固定大小的陣列保存最近 size 個時間格的計數，時間格依牆上時間對齊。
+    加入事件時只需要清除經過的時間格，記憶體大小與事件數量無關。
+    """
+    __slots__ = ("resolution", "counts", "last_slot")
+
+    def __init__(self, resolution: int, size: int, counts: Optional[array] = None, last_slot: int = 0):
+        self.resolution = resolution
+        self.counts = counts if counts is not None and len(counts) == size else array('I', bytes(4 * size))
+        self.last_slot = last_slot
+
+    def _advance(self, slot: int):
+        elapsed = slot - self.last_slot
+        if elapsed <= 0:
+            return
+        size = len(self.counts)
+        if elapsed >= size:
+            self.counts = array('I', bytes(4 * size))
+        else:
+            for index in range(self.last_slot + 1, slot + 1):
+                self.counts[index % size] = 0
+        self.last_slot = slot
+
+    def add(self, timestamp: float, amount: int = 1):
+        slot = int(timestamp // self.resolution)
+        self._advance(slot)
+        # 時鐘稍微倒退時仍計入對應的舊時間格，超出保留範圍則忽略
+        if self.last_slot - slot < len(self.counts):
+            self.counts[slot % len(self.counts)] += amount
+
+    def series(self, timestamp: float, slots: int) -> List[int]:
+        """回傳最近 slots 格的計數 (舊到新)，包含目前這一格"""
+        self._advance(int(timestamp // self.resolution))
+        size = len(self.counts)
+        slots = min(slots, size)
+        return [self.counts[(self.last_slot - offset) % size] for offset in range(slots - 1, -1, -1)]
+
+    def total(self, timestamp: float, slots: int) -> int:
+        return sum(self.series(timestamp, slots))
+
+    def to_dict(self) -> dict:
+        counts = self.counts
+        if sys.byteorder == 'big':
+            counts = array('I', counts)
+            counts.byteswap()
+        # 大部分時間格為 0，壓縮後通常只有幾百位元組
+        return {"last_slot": self.last_slot, "counts": base64.b64encode(zlib.compress(counts.tobytes())).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, resolution: int, size: int, data: dict) -> "RingCounter":
+        counts = array('I')
+        counts.frombytes(zlib.decompress(base64.b64decode(data["counts"])))
+        if sys.byteorder == 'big':
+            counts.byteswap()
+        return cls(resolution, size, counts, data.get("last_slot", 0))
+
+class GuildGrowth:
+    """單一伺服器在各解析度下的加入與離開計數"""
+    __slots__ = ("joins", "leaves")
+
+    def __init__(self, data: Optional[dict] = None):
+        self.joins: Dict[str, RingCounter] = {}
+        self.leaves: Dict[str, RingCounter] = {}
+        for name, (resolution, size) in RESOLUTIONS.items():
+            for counters, key in ((self.joins, "joins"), (self.leaves, "leaves")):
+                saved = (data or {}).get(key, {}).get(name)
+                try:
+                    counters[name] = RingCounter.from_dict(resolution, size, saved) if saved else RingCounter(resolution, size)
+                except (ValueError, KeyError, TypeError, zlib.error) as e:
+                    print(f"成員成長資料 {key}/{name} 格式錯誤，已重新計數：{e}")
+                    counters[name] = RingCounter(resolution, size)
+
+    def record(self, joined: bool, timestamp: float):
+        for counter in (self.joins if joined else self.leaves).values():
+            counter.add(timestamp)
+
+    def to_dict(self) -> dict:
+        return {
+            "joins": {name: counter.to_dict() for name, counter in self.joins.items()},
+            "leaves": {name: counter.to_dict() for name, counter in self.leaves.items()}
+        }
+
+class MemberGrowthStore:
+    """所有伺服器的成員成長紀錄，只保存各時間格的計數，不保存個別事件"""
+    def __init__(self, path: str = MEMBER_GROWTH_FILE):
+        self.path = path
+        self.guilds: Dict[int, GuildGrowth] = {}
+        self.dirty = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError:
+                return
+        for guild_id, guild_data in data.items():
+            self.guilds[int(guild_id)] = GuildGrowth(guild_data)
+
+    def save(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({str(guild_id): growth.to_dict() for guild_id, growth in self.guilds.items()}, f)
+        self.dirty = False
+
+    def get(self, guild_id: int) -> GuildGrowth:
+        growth = self.guilds.get(guild_id)
+        if growth is None:
+            growth = self.guilds[guild_id] = GuildGrowth()
+        return growth
+
+    def record(self, guild_id: int, joined: bool, timestamp: float):
+        self.get(guild_id).record(joined, timestamp)
+        self.dirty = True
+
+def sparkline(values: List[int]) -> str:
+    peak = max(values, default=0)
+    if peak == 0:
+        return SPARK_CHARS[0] * len(values)
+    # 0 使用最低的字元，其餘依比例分配到剩下的字元，最大值使用最高的字元
+    steps = len(SPARK_CHARS) - 2
+    return "".join(SPARK_CHARS[0 if value == 0 else 1 + value * steps // peak] for value in values)
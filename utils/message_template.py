@@ -0,0 +1,83 @@
+# utils/message_template.py
+import re
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Tuple, Union
+
+# 可用的標記與說明，新增標記時也要在 Cog 中提供對應的解析函式
+PLACEHOLDERS = {
+    "user": "成員標記 (多位成員時為合併後的列表)",
+    "username": "成員名稱",
+    "server": "伺服器名稱",
+    "member_count": "伺服器目前人數",
+    "account_age": "帳號建立多久",
+    "count": "這則訊息包含的成員數"
+}
+
+# {{ 與 }} 為跳脫的大括號，{名稱} 為標記，其餘單獨出現的大括號視為錯誤
+TOKEN_PATTERN = re.compile(r"\{\{|\}\}|\{([^{}]*)\}|[{}]")
+
+class TemplateError(ValueError):
+    """訊息範本格式錯誤，例如未知的標記或不成對的大括號"""
+    pass
+
+class Placeholder(str):
+    """編譯後的標記片段，與一般文字片段區分"""
+    __slots__ = ()
+
+class MessageTemplate:
+    """
+    儲存時解析一次的訊息範本。
+    範本編譯成文字與標記交錯的片段列表，發送時只需要串接片段；
+    標記的值由呼叫端提供的函式計算，且只有範本實際用到的標記才會被計算。
+    """
+    __slots__ = ("source", "segments", "placeholders")
+
+    def __init__(self, source: str):
+        self.source = source
+        self.segments: Tuple[Union[str, Placeholder], ...] = tuple(self._compile(source))
+        self.placeholders = frozenset(segment for segment in self.segments if isinstance(segment, Placeholder))
+
+    @staticmethod
+    def _compile(source: str) -> List[Union[str, Placeholder]]:
+        segments: List[Union[str, Placeholder]] = []
+        text: List[str] = []
+        position = 0
+        for match in TOKEN_PATTERN.finditer(source):
+            text.append(source[position:match.start()])
+            position = match.end()
+            token = match.group(0)
+            if token in ("{{", "}}"):
+                text.append(token[0])
+            elif match.group(1) is not None:
+                name = match.group(1).strip()
+                if name not in PLACEHOLDERS:
+                    available = "、".join(f"{{{key}}}" for key in PLACEHOLDERS)
+                    raise TemplateError(f"未知的標記 {token}，可用的標記：{available}")
+                if any(text):
+                    segments.append("".join(text))
+                text = []
+                segments.append(Placeholder(name))
+            else:
+                raise TemplateError(f"第 {match.start() + 1} 個字元的「{token}」沒有成對，若要顯示大括號請輸入 {token * 2}")
+        text.append(source[position:])
+        if any(text):
+            segments.append("".join(text))
+        return segments
+
+    @classmethod
+    def literal(cls, source: str) -> "MessageTemplate":
+        """將整段文字視為純文字，用於載入舊版無法編譯的範本"""
+        return cls(source.replace("{", "{{").replace("}", "}}"))
+
+    def render(self, resolvers: Dict[str, Callable[[], str]]) -> str:
+        values = {name: str(resolvers[name]()) for name in self.placeholders}
+        return "".join(values[segment] if isinstance(segment, Placeholder) else segment for segment in self.segments)
+
+def format_account_age(created_at: datetime) -> str:
+    days = (datetime.now(timezone.utc) - created_at).days
+    if days < 1:
+        return "不到 1 天"
+    years, days = divmod(days, 365)
+    if years:
+        return f"{years} 年 {days} 天" if days else f"{years} 年"
+    return f"{days} 天"
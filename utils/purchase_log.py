@@ -0,0 +1,158 @@
+# utils/purchase_log.py
+import os
+import time
+from array import array
+from typing import Dict, List, NamedTuple, Optional, TextIO, Tuple
+
+PURCHASE_LOG_FILE = 'shop_purchases.log'
+
+class PurchaseRecord(NamedTuple):
+    timestamp: int
+    guild_id: int
+    user_id: int
+    item_name: str
+    price: int # 退款為負數
+
+class ItemStats:
+    """單一商品的累計銷售數據，以及購買紀錄的位置 (依時間排序)"""
+    __slots__ = ("sold", "refunded", "revenue", "last_sold_at", "positions")
+
+    def __init__(self):
+        self.sold = 0
+        self.refunded = 0
+        self.revenue = 0
+        self.last_sold_at = 0
+        self.positions = array('I')
+
+class UserTotals:
+    __slots__ = ("purchases", "spent", "positions")
+
+    def __init__(self):
+        self.purchases = 0
+        self.spent = 0
+        self.positions = array('I')
+
+class PurchaseLog:
+    """
+    只追加的購買紀錄檔，每筆一行：時間戳<TAB>伺服器ID<TAB>使用者ID<TAB>價格<TAB>商品名稱，退款以負價格記錄。
+    記錄以欄位陣列保存在記憶體中，載入時建立每位使用者與每項商品的索引與累計值，
+    查詢只需要字典查找與切片，不會掃描整份紀錄。
+    建立後需呼叫 load() 讀取既有紀錄；大型紀錄檔載入耗時，應在執行緒中呼叫。
+    """
+    def __init__(self, path: str = PURCHASE_LOG_FILE):
+        self.path = path
+        self.timestamps = array('Q')
+        self.user_ids = array('Q')
+        self.prices = array('q')
+        self.item_codes = array('I')
+        # 商品以 (伺服器ID, 商品名稱) 編碼成整數，避免每筆紀錄都保存字串
+        self.item_keys: List[Tuple[int, str]] = []
+        self.item_codes_by_key: Dict[Tuple[int, str], int] = {}
+        self.item_stats: Dict[int, ItemStats] = {}
+        self.user_totals: Dict[Tuple[int, int], UserTotals] = {}
+        self.guild_items: Dict[int, List[int]] = {}
+        self.file: Optional[TextIO] = None
+
+    def load(self):
+        """讀取既有紀錄並開啟檔案以供追加，讀取失敗時仍可繼續記錄新的購買"""
+        try:
+            self._load()
+        finally:
+            self.file = open(self.path, 'a', encoding='utf-8', buffering=1)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        skipped = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t', 4)
+                try:
+                    timestamp, guild_id, user_id, price = map(int, fields[:4])
+                    item_name = fields[4]
+                except (ValueError, IndexError):
+                    skipped += 1
+                    continue
+                self._index(timestamp, guild_id, user_id, item_name, price)
+        if skipped:
+            print(f"購買紀錄中有 {skipped} 行格式錯誤，已略過。")
+
+    def _item_code(self, guild_id: int, item_name: str) -> int:
+        key = (guild_id, item_name)
+        code = self.item_codes_by_key.get(key)
+        if code is None:
+            code = len(self.item_keys)
+            self.item_keys.append(key)
+            self.item_codes_by_key[key] = code
+            self.item_stats[code] = ItemStats()
+            self.guild_items.setdefault(guild_id, []).append(code)
+        return code
+
+    def _index(self, timestamp: int, guild_id: int, user_id: int, item_name: str, price: int):
+        position = len(self.timestamps)
+        code = self._item_code(guild_id, item_name)
+        self.timestamps.append(timestamp)
+        self.user_ids.append(user_id)
+        self.prices.append(price)
+        self.item_codes.append(code)
+
+        stats = self.item_stats[code]
+        stats.positions.append(position)
+        stats.revenue += price
+        if price >= 0:
+            stats.sold += 1
+            stats.last_sold_at = timestamp
+        else:
+            stats.refunded += 1
+
+        totals = self.user_totals.get((guild_id, user_id))
+        if totals is None:
+            totals = self.user_totals[(guild_id, user_id)] = UserTotals()
+        totals.positions.append(position)
+        totals.spent += price
+        totals.purchases += 1 if price >= 0 else -1
+
+    def append(self, guild_id: int, user_id: int, item_name: str, price: int):
+        """記錄一筆購買 (price 為負數表示退款)，同時更新索引"""
+        timestamp = int(time.time())
+        # 商品名稱放在最後一欄，只需要避免換行與定位字元
+        item_name = item_name.replace('\t', ' ').replace('\n', ' ')
+        self.file.write(f"{timestamp}\t{guild_id}\t{user_id}\t{price}\t{item_name}\n")
+        self._index(timestamp, guild_id, user_id, item_name, price)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+    def record(self, position: int) -> PurchaseRecord:
+        guild_id, item_name = self.item_keys[self.item_codes[position]]
+        return PurchaseRecord(self.timestamps[position], guild_id, self.user_ids[position], item_name, self.prices[position])
+
+    def user_history(self, guild_id: int, user_id: int, limit: int = 10) -> Tuple[List[PurchaseRecord], Optional[UserTotals]]:
+        """回傳使用者最近的紀錄 (新到舊) 與累計值"""
+        totals = self.user_totals.get((guild_id, user_id))
+        if totals is None:
+            return [], None
+        return [self.record(position) for position in reversed(totals.positions[-limit:])], totals
+
+    def get_item_stats(self, guild_id: int, item_name: str) -> Optional[ItemStats]:
+        code = self.item_codes_by_key.get((guild_id, item_name))
+        return self.item_stats[code] if code is not None else None
+
+    def recent_item_records(self, guild_id: int, item_name: str, limit: int = 5) -> List[PurchaseRecord]:
+        stats = self.get_item_stats(guild_id, item_name)
+        if stats is None:
+            return []
+        return [self.record(position) for position in reversed(stats.positions[-limit:])]
+
+    def top_items(self, guild_id: int, limit: int = 10) -> List[Tuple[str, ItemStats]]:
+        """依淨售出數量排序的熱銷商品，只會檢查該伺服器曾售出的商品種類"""
+        ranked = sorted(
+            self.guild_items.get(guild_id, []),
+            key=lambda code: (self.item_stats[code].sold - self.item_stats[code].refunded, self.item_stats[code].revenue),
+            reverse=True
+        )
+        return [(self.item_keys[code][1], self.item_stats[code]) for code in ranked[:limit]]
@@ -0,0 +1,141 @@
+# utils/purge.py
+import datetime
+import re
+import time
+from typing import Awaitable, Callable, List, Optional
+
+import discord
+
+from utils.rate_limiter import RateLimitedQueue
+
+BULK_DELETE_MAX = 100 # 批量刪除 API 一次最多 100 則
+BULK_DELETE_MAX_AGE = datetime.timedelta(days=14) # 超過 14 天的訊息不能批量刪除
+BULK_DELETE_AGE_MARGIN = datetime.timedelta(minutes=5) # 保留緩衝，避免刪除途中跨過 14 天的界線
+SINGLE_DELETE_INTERVAL = 1.0 # 舊訊息逐則刪除的間隔秒數
+PROGRESS_INTERVAL = 5.0 # 進度回報的最短間隔秒數
+
+class PurgeFilter:
+    """組合多個條件的訊息篩選器，未設定的條件不做限制"""
+    def __init__(
+        self,
+        user_id: Optional[int] = None,
+        pattern: Optional[re.Pattern] = None,
+        has_attachment: bool = False,
+        bot_only: bool = False,
+        skip_pinned: bool = True
+    ):
+        self.user_id = user_id
+        self.pattern = pattern
+        self.has_attachment = has_attachment
+        self.bot_only = bot_only
+        self.skip_pinned = skip_pinned
+
+    def __call__(self, message: discord.Message) -> bool:
+        if self.skip_pinned and message.pinned:
+            return False
+        if self.user_id is not None and message.author.id != self.user_id:
+            return False
+        if self.bot_only and not message.author.bot:
+            return False
+        if self.has_attachment and not message.attachments:
+            return False
+        if self.pattern is not None and not self.pattern.search(message.content):
+            return False
+        return True
+
+class PurgeStats:
+    def __init__(self):
+        self.scanned = 0
+        self.matched = 0
+        self.bulk_deleted = 0
+        self.single_deleted = 0
+        self.bulk_failed = 0
+        self.single_failed = 0
+        self.finished = False
+
+    @property
+    def deleted(self) -> int:
+        return self.bulk_deleted + self.single_deleted
+
+    @property
+    def failed(self) -> int:
+        return self.bulk_failed + self.single_failed
+
+ProgressCallback = Callable[[PurgeStats], Awaitable[None]]
+
+async def purge_messages(
+    channel: discord.TextChannel,
+    check: Callable[[discord.Message], bool],
+    limit: Optional[int] = None,
+    before: Optional[discord.abc.Snowflake] = None,
+    after: Optional[discord.abc.Snowflake] = None,
+    scan_limit: Optional[int] = None,
+    progress_callback: Optional[ProgressCallback] = None,
+    single_delete_interval: float = SINGLE_DELETE_INTERVAL
+) -> PurgeStats:
+    """
+    串流掃描頻道歷史訊息並刪除符合條件的訊息，直到刪除 limit 則或掃描 scan_limit 則。
+    14 天內的訊息每 100 則以批量刪除 API 處理，較舊的訊息交給限速佇列逐則刪除；
+    記憶體中最多只保留一批待刪除的訊息，與清理的總量無關。
+    """
+    stats = PurgeStats()
+    cutoff = discord.utils.time_snowflake(discord.utils.utcnow() - BULK_DELETE_MAX_AGE + BULK_DELETE_AGE_MARGIN)
+    single_queue = RateLimitedQueue(single_delete_interval)
+    batch: List[discord.Message] = []
+    last_report = time.monotonic()
+
+    async def flush_batch():
+        if not batch:
+            return
+        try:
+            await channel.delete_messages(batch)
+            stats.bulk_deleted += len(batch)
+        except discord.NotFound:
+            # 批次中有訊息已被刪除時整批會失敗，改為逐則刪除
+            for message in batch:
+                await single_queue.put(message.delete)
+        except discord.HTTPException as e:
+            stats.bulk_failed += len(batch)
+            print(f"批量刪除 {len(batch)} 則訊息失敗：{e}")
+        batch.clear()
+
+    async def report():
+        nonlocal last_report
+        stats.single_deleted = single_queue.completed
+        stats.single_failed = single_queue.failed
+        last_report = time.monotonic()
+        if progress_callback:
+            try:
+                await progress_callback(stats)
+            except discord.HTTPException:
+                pass
+
+    try:
+        # 由新到舊掃描，舊訊息出現後之後的訊息都只能逐則刪除
+        async for message in channel.history(limit=scan_limit, before=before, after=after, oldest_first=False):
+            stats.scanned += 1
+            # 篩選條件之前回報，符合的訊息很少時長時間掃描也會更新進度
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                await report()
+            if not check(message):
+                continue
+            stats.matched += 1
+            if message.id < cutoff:
+                # 跨過 14 天的界線後不會再有可批量刪除的訊息，立即送出剩餘的批次以免過期
+                await flush_batch()
+                await single_queue.put(message.delete)
+            else:
+                batch.append(message)
+                if len(batch) >= BULK_DELETE_MAX:
+                    await flush_batch()
+            if limit is not None and stats.matched >= limit:
+                break
+
+        await flush_batch()
+        await single_queue.join()
+    finally:
+        single_queue.close()
+
+    stats.finished = True
+    await report()
+    return stats
@@ -0,0 +1,51 @@
+# utils/rate_limiter.py
+import asyncio
+import discord
+from typing import Any, Awaitable, Callable, Optional
+
+class RateLimitedQueue:
+    """
+    以固定間隔依序執行 Discord API 操作的有界佇列。
+    佇列滿時 put 會等待，讓產生工作的一方不會一次把所有操作堆在記憶體中。
+    """
+    def __init__(self, interval: float, maxsize: int = 100):
+        self.interval = interval
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.completed = 0
+        self.failed = 0
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def put(self, action: Callable[[], Awaitable[Any]]):
+        """加入一個無參數的協程函式，例如 functools.partial(member.add_roles, role)"""
+        self.start()
+        await self.queue.put(action)
+
+    async def join(self):
+        """等待目前佇列中的所有操作完成"""
+        await self.queue.join()
+
+    def close(self):
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+
+    async def _run(self):
+        while True:
+            action = await self.queue.get()
+            try:
+                await action()
+                self.completed += 1
+            except discord.HTTPException as e:
+                self.failed += 1
+                print(f"佇列中的 API 操作失敗：{e}")
+            except Exception as e:
+                self.failed += 1
+                print(f"佇列中的操作發生未知錯誤：{e}")
+            finally:
+                self.queue.task_done()
+            # discord.py 會自行處理 429，這裡再保留固定間隔以免占滿全域速率限制
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,80 @@
+# utils/role_jobs.py
+import time
+from typing import Any, Dict, List, Optional
+
+import discord
+
+ROLE_JOBS_FILE = 'role_jobs.json'
+ROLE_JOB_STATUSES = {
+    "running": "進行中",
+    "paused": "已暫停",
+    "cancelled": "已取消",
+    "completed": "已完成",
+    "failed": "失敗"
+}
+ACTIVE_STATUSES = ("running", "paused")
+
+class MemberFilter:
+    """批量身分組工作的成員篩選條件，未設定的條件不做限制"""
+    def __init__(
+        self,
+        role_id: Optional[int] = None,
+        joined_before: Optional[float] = None,
+        min_level: Optional[int] = None
+    ):
+        self.role_id = role_id
+        self.joined_before = joined_before # Unix 時間戳
+        self.min_level = min_level
+
+    def __call__(self, member: discord.Member, level: int = 0) -> bool:
+        """level 只在設定 min_level 時才需要提供"""
+        if self.role_id is not None and member.get_role(self.role_id) is None:
+            return False
+        if self.joined_before is not None and (member.joined_at is None or member.joined_at.timestamp() >= self.joined_before):
+            return False
+        if self.min_level is not None and level < self.min_level:
+            return False
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"role_id": self.role_id, "joined_before": self.joined_before, "min_level": self.min_level}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MemberFilter":
+        return cls(data.get("role_id"), data.get("joined_before"), data.get("min_level"))
+
+    def describe(self) -> str:
+        conditions: List[str] = []
+        if self.role_id is not None:
+            conditions.append(f"擁有 <@&{self.role_id}>")
+        if self.joined_before is not None:
+            conditions.append(f"在 <t:{int(self.joined_before)}:d> 之前加入")
+        if self.min_level is not None:
+            conditions.append(f"等級 ≥ {self.min_level}")
+        return "、".join(conditions) or "所有成員"
+
+def new_role_job(job_id: str, guild_id: int, role_id: int, action: str, member_filter: MemberFilter, created_by: int) -> Dict[str, Any]:
+    """
+    建立可直接存入 JSON 的工作紀錄。
+    成員依 ID 由小到大處理，cursor 是已完成處理的最後一位成員 ID，重新啟動後從 cursor 之後繼續。
+    """
+    return {
+        "id": job_id,
+        "guild_id": guild_id,
+        "role_id": role_id,
+        "action": action, # "add" 或 "remove"
+        "filter": member_filter.to_dict(),
+        "status": "running",
+        "cursor": 0,
+        "scanned": 0,
+        "matched": 0,
+        "changed": 0,
+        "failed": 0,
+        "total": 0,
+        "channel_id": None,
+        "message_id": None,
+        "created_by": created_by,
+        "created_at": int(time.time()),
+        "finished_at": None,
+        "error": None
+    }
@@ -0,0 +1,39 @@
+# utils/single_flight.py
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+class SingleFlight:
+    """
+    合併相同 key 的並行操作：同一時間只會執行一次，
+    其餘呼叫者等待並取得同一個結果 (或同一個例外)。
+    適用於按鈕連點等會重複建立資源的互動處理器。
+    """
+    def __init__(self):
+        self.in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        執行 factory() 並回傳 (結果, 是否為共用結果)。
+        若相同 key 的操作正在進行，則不會再次呼叫 factory，而是等待前一次的結果。
+        """
+        future = self.in_flight.get(key)
+        if future is not None:
+            # shield 避免其中一個等待者被取消時連帶取消共用的操作
+            return await asyncio.shield(future), True
+
+        future = asyncio.ensure_future(factory())
+        self.in_flight[key] = future
+        try:
+            return await asyncio.shield(future), False
+        finally:
+            if future.done():
+                self._forget(key, future)
+            else:
+                future.add_done_callback(lambda f: self._forget(key, f))
+
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        if self.in_flight.get(key) is future:
+            del self.in_flight[key]
+
+    def is_running(self, key: Hashable) -> bool:
+        return key in self.in_flight
@@ -0,0 +1,42 @@
+# utils/sliding_window.py
+from typing import List
+
+class SlidingWindowCounter:
+    """
+    以固定數量的時間桶近似滑動視窗的計數器。
+    每次加入只需要清除經過的時間桶 (最多 buckets 個)，記憶體大小固定，與事件數量無關。
+    """
+    __slots__ = ("bucket_width", "counts", "last_bucket", "total")
+
+    def __init__(self, window: float, buckets: int = 10):
+        self.bucket_width = window / buckets
+        self.counts: List[int] = [0] * buckets
+        self.last_bucket = 0
+        self.total = 0
+
+    def _advance(self, now: float):
+        bucket = int(now // self.bucket_width)
+        elapsed = bucket - self.last_bucket
+        if elapsed <= 0:
+            return
+        size = len(self.counts)
+        if elapsed >= size:
+            self.counts = [0] * size
+            self.total = 0
+        else:
+            for index in range(self.last_bucket + 1, bucket + 1):
+                slot = index % size
+                self.total -= self.counts[slot]
+                self.counts[slot] = 0
+        self.last_bucket = bucket
+
+    def add(self, now: float, amount: int = 1) -> int:
+        """加入 amount 並回傳視窗內的總數"""
+        self._advance(now)
+        self.counts[self.last_bucket % len(self.counts)] += amount
+        self.total += amount
+        return self.total
+
+    def value(self, now: float) -> int:
+        self._advance(now)
+        return self.total
@@ -0,0 +1,113 @@
+# utils/transcripts.py
+import asyncio
+import datetime
+import gzip
+import html
+import json
+import os
+from typing import List, Optional, Tuple
+
+import discord
+
+TRANSCRIPT_DIR = "transcripts" # 對話紀錄的存放資料夾
+TRANSCRIPT_BATCH_SIZE = 100 # 與 channel.history 每頁數量相同，每頁寫入一次檔案
+
+HTML_HEADER = """<!DOCTYPE html>
+<html lang="zh-Hant">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: sans-serif; background: #313338; color: #dbdee1; }}
+.message {{ padding: 4px 8px; border-bottom: 1px solid #3f4147; }}
+.author {{ font-weight: bold; color: #f2f3f5; }}
+.time {{ color: #949ba4; font-size: 0.8em; margin-left: 8px; }}
+.content {{ white-space: pre-wrap; }}
+a {{ color: #00a8fc; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+"""
+HTML_FOOTER = "</body>\n</html>\n"
+
+def _message_record(message: discord.Message) -> dict:
+    """將訊息轉為可序列化的紀錄，附件只保存網址"""
+    return {
+        "id": str(message.id),
+        "author_id": str(message.author.id),
+        "author": str(message.author),
+        "bot": message.author.bot,
+        "created_at": message.created_at.isoformat(),
+        "edited_at": message.edited_at.isoformat() if message.edited_at else None,
+        "content": message.content,
+        "attachments": [
+            {"filename": attachment.filename, "url": attachment.url, "size": attachment.size}
+            for attachment in message.attachments
+        ],
+        "embeds": [embed.to_dict() for embed in message.embeds],
+    }
+
+def _html_row(record: dict) -> str:
+    attachments = "".join(
+        f'<div><a href="{html.escape(a["url"])}">{html.escape(a["filename"])}</a></div>'
+        for a in record["attachments"]
+    )
+    return (
+        '<div class="message">'
+        f'<span class="author">{html.escape(record["author"])}</span>'
+        f'<span class="time">{html.escape(record["created_at"])}</span>'
+        f'<div class="content">{html.escape(record["content"])}</div>'
+        f'{attachments}</div>\n'
+    )
+
+async def export_transcript(channel: discord.TextChannel, write_html: bool = False, directory: str = TRANSCRIPT_DIR) -> Tuple[str, Optional[str], int]:
+    """
+    以串流方式將頻道的完整對話紀錄寫成 gzip 壓縮的 JSONL (可選 HTML)。
+    每次只在記憶體中保留一頁訊息，與工單長度無關。
+    回傳 (JSONL 路徑, HTML 路徑或 None, 訊息數量)。
+    """
+    guild_directory = os.path.join(directory, str(channel.guild.id))
+    os.makedirs(guild_directory, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    base_name = os.path.join(guild_directory, f"{channel.name}-{channel.id}-{timestamp}")
+    jsonl_path = f"{base_name}.jsonl.gz"
+    html_path = f"{base_name}.html" if write_html else None
+
+    jsonl_file = gzip.open(jsonl_path, 'wt', encoding='utf-8')
+    html_file = open(html_path, 'w', encoding='utf-8') if html_path else None
+    count = 0
+    try:
+        if html_file:
+            await asyncio.to_thread(html_file.write, HTML_HEADER.format(title=html.escape(f"#{channel.name}")))
+
+        json_lines: List[str] = []
+        html_rows: List[str] = []
+
+        async def flush():
+            # 檔案寫入與壓縮移到執行緒中，避免阻塞事件迴圈
+            if json_lines:
+                await asyncio.to_thread(jsonl_file.write, "".join(json_lines))
+                json_lines.clear()
+            if html_rows:
+                await asyncio.to_thread(html_file.write, "".join(html_rows))
+                html_rows.clear()
+
+        async for message in channel.history(limit=None, oldest_first=True):
+            record = _message_record(message)
+            json_lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+            if html_file:
+                html_rows.append(_html_row(record))
+            count += 1
+            if len(json_lines) >= TRANSCRIPT_BATCH_SIZE:
+                await flush()
+        await flush()
+
+        if html_file:
+            await asyncio.to_thread(html_file.write, HTML_FOOTER)
+    finally:
+        jsonl_file.close()
+        if html_file:
+            html_file.close()
+
+    return jsonl_path, html_path, count
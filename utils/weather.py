@@ -1,67 +1,225 @@
 # utils/weather.py
-import requests
-from config import WEATHER_API_KEY
-import json
+import asyncio
+import random
+import ssl
+import time
 from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import aiohttp
+
+from config import WEATHER_API_KEY
+from utils.single_flight import SingleFlight
+
+CWA_API_BASE = "https://opendata.cwa.gov.tw/api/v1/rest/datastore"
+FORECAST_DATASET = "F-C0032-001" # 一般天氣預報 - 今明 36 小時天氣預報
+CWA_CA_FILE: Optional[str] = None # 若系統憑證庫缺少中央氣象署的憑證鏈，可指定額外的 CA 檔案路徑
 
-async def get_weather_forecast(location: str):
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=15, connect=5, sock_read=10)
+MAX_RETRIES = 3 # 首次請求之外最多重試的次數
+RETRY_BACKOFF = 0.5 # 第一次重試前等待的秒數，之後每次加倍
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_CONNECTIONS = 10
+
+FORECAST_TTL = 30 * 60 # 預報在此秒數內視為最新，之後回傳舊資料並在背景更新
+FORECAST_MAX_STALE = 6 * 60 * 60 # 超過此秒數的舊資料不再使用，需等待重新抓取
+
+class WeatherAPIError(Exception):
+    """中央氣象署 API 回應錯誤或重試後仍然失敗"""
+    pass
+
+def _create_ssl_context() -> ssl.SSLContext:
+    context = ssl.create_default_context(cafile=CWA_CA_FILE)
+    # 中央氣象署的憑證缺少 Python 3.13 起預設要求的延伸欄位，
+    # 只關閉這項嚴格檢查，憑證鏈與主機名稱仍會完整驗證。
+    if hasattr(ssl, "VERIFY_X509_STRICT"):
+        context.verify_flags &= ~ssl.VERIFY_X509_STRICT
+    return context
+
+class CWAClient:
     """
-    從中央氣象署 API 獲取未來3天的天氣預報。
+    共用的中央氣象署 API 客戶端。
+    所有請求共用同一個連線池並保持連線，設定明確的逾時，
+    遇到網路錯誤、429 或 5xx 時以指數退避重試，不會阻塞事件迴圈。
     """
-    api_url = f"https://opendata.cwa.gov.tw/api/v1/rest/datastore/F-C0032-001?Authorization={WEATHER_API_KEY}&locationName={location}"
-    
-    try:
-        # 添加 verify=False 來禁用 SSL 證書驗證
-        # 注意：這會降低安全性，但可以解決 SSLCertVerificationError。
-        # 僅在您了解風險的情況下使用。
-        response = requests.get(api_url, verify=False)
-        response.raise_for_status()  # 檢查 HTTP 請求是否成功
-        data = response.json()
-        
-        if 'records' not in data or not data['records']['location']:
+    def __init__(self, api_key: str, base_url: str = CWA_API_BASE):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            ssl_context = _create_ssl_context() if self.base_url.startswith("https://") else None
+            connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, ssl=ssl_context, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=REQUEST_TIMEOUT)
+        return self.session
+
+    async def get_json(self, dataset: str, params: Dict[str, str]) -> Dict[str, Any]:
+        url = f"{self.base_url}/{dataset}"
+        query = {"Authorization": self.api_key, **params}
+        delay = RETRY_BACKOFF
+        for attempt in range(MAX_RETRIES + 1):
+            retry_after = None
+            try:
+                async with self._get_session().get(url, params=query) as response:
+                    if response.status == 200:
+                        return await response.json(content_type=None)
+                    if response.status not in RETRY_STATUSES:
+                        raise WeatherAPIError(f"中央氣象署 API 回應 HTTP {response.status}")
+                    error: Exception = WeatherAPIError(f"中央氣象署 API 回應 HTTP {response.status}")
+                    retry_after = response.headers.get("Retry-After")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            if attempt == MAX_RETRIES:
+                break
+            wait = float(retry_after) if retry_after and retry_after.isdigit() else delay
+            print(f"呼叫天氣 API 失敗 ({error})，{wait:.1f} 秒後重試 ({attempt + 1}/{MAX_RETRIES})。")
+            # 加入少量隨機延遲，避免多個請求同時重試
+            await asyncio.sleep(wait + random.uniform(0, wait / 2))
+            delay *= 2
+        raise WeatherAPIError(f"重試 {MAX_RETRIES} 次後仍無法取得天氣資料：{error}")
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+_client: Optional[CWAClient] = None
+
+def get_client() -> CWAClient:
+    """回傳全域共用的客戶端，第一次呼叫時建立"""
+    global _client
+    if _client is None:
+        _client = CWAClient(WEATHER_API_KEY)
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+def format_location_forecast(location: str, location_data: Dict[str, Any]) -> str:
+    """將 API 回傳的單一縣市資料轉為訊息文字"""
+    forecast = location_data['weatherElement']
+
+    wx = next((item for item in forecast if item['elementName'] == 'Wx'), None)
+    min_temp = next((item for item in forecast if item['elementName'] == 'MinT'), None)
+    max_temp = next((item for item in forecast if item['elementName'] == 'MaxT'), None)
+    pop = next((item for item in forecast if item['elementName'] == 'PoP'), None)
+
+    if not wx or not min_temp or not max_temp or not pop:
+        return f"無法獲取 **{location}** 的詳細天氣資訊。"
+
+    forecast_str = f"**未來 {len(wx['time'])} 個時段 {location} 的天氣預報：**\n\n"
+
+    for i in range(len(wx['time'])):
+        day_forecast = wx['time'][i]['parameter']['parameterName']
+        min_t = min_temp['time'][i]['parameter']['parameterName']
+        max_t = max_temp['time'][i]['parameter']['parameterName']
+        rain_chance = pop['time'][i]['parameter']['parameterName']
+
+        # 使用 startTime 和 endTime 建立更精準的時間標籤
+        start_time = datetime.fromisoformat(wx['time'][i]['startTime'])
+        end_time = datetime.fromisoformat(wx['time'][i]['endTime'])
+
+        # 格式化為易於閱讀的時段標籤
+        time_period = f"{start_time.strftime('%m/%d %H:%M')} 至 {end_time.strftime('%m/%d %H:%M')}"
+
+        forecast_str += (
+            f"**時段：** {time_period}\n"
+            f"**天氣狀況：** {day_forecast}\n"
+            f"**溫度：** {min_t}°C ~ {max_t}°C\n"
+            f"**降雨機率：** {rain_chance}%\n\n"
+        )
+
+    return forecast_str
+
+class ForecastCache:
+    """
+    所有縣市預報的記憶體快取。
+    一次請求抓取全部縣市並預先轉為訊息文字，查詢時直接回傳；
+    資料過期後仍先回傳舊資料 (stale-while-revalidate) 並在背景更新，
+    同時發生的重新抓取只會送出一次請求。
+    """
+    def __init__(self, locations: Iterable[str], ttl: float = FORECAST_TTL, max_stale: float = FORECAST_MAX_STALE):
+        self.locations: List[str] = list(locations)
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.forecasts: Dict[str, str] = {}
+        self.fetched_at: Optional[float] = None
+        self.flights = SingleFlight()
+        self.revalidate_task: Optional[asyncio.Task] = None
+
+    @property
+    def age(self) -> Optional[float]:
+        return None if self.fetched_at is None else time.monotonic() - self.fetched_at
+
+    async def refresh(self) -> Dict[str, str]:
+        """重新抓取所有縣市，並行的呼叫會共用同一次請求"""
+        forecasts, _ = await self.flights.do("all", self._fetch_all)
+        return forecasts
+
+    async def _fetch_all(self) -> Dict[str, str]:
+        data = await get_client().get_json(FORECAST_DATASET, {"locationName": ",".join(self.locations)})
+        forecasts = {}
+        for location_data in data.get('records', {}).get('location', []):
+            location = location_data.get('locationName')
+            try:
+                forecasts[location] = format_location_forecast(location, location_data)
+            except (KeyError, IndexError, ValueError) as e:
+                print(f"解析 {location} 的天氣資料時發生錯誤：{e}")
+        if not forecasts:
+            raise WeatherAPIError("天氣 API 沒有回傳任何縣市的資料")
+        # 一次替換整份快取，讀取端不會看到新舊混雜的資料
+        self.forecasts = forecasts
+        self.fetched_at = time.monotonic()
+        return forecasts
+
+    def _revalidate_in_background(self):
+        if self.revalidate_task is None or self.revalidate_task.done():
+            self.revalidate_task = asyncio.create_task(self._revalidate())
+
+    async def _revalidate(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            print(f"背景更新天氣預報失敗，繼續使用舊資料：{e}")
+
+    @property
+    def is_fresh(self) -> bool:
+        age = self.age
+        return age is not None and age < self.ttl
+
+    def has(self, location: str) -> bool:
+        """是否能直接從記憶體回應 (可能是等待背景更新的舊資料)"""
+        age = self.age
+        return location in self.forecasts and age is not None and age < self.max_stale
+
+    async def get(self, location: str) -> str:
+        forecast = self.forecasts.get(location)
+        if self.has(location):
+            if self.age >= self.ttl:
+                self._revalidate_in_background()
+            return forecast
+        if forecast is None and self.is_fresh:
+            # 剛更新過的資料中沒有此地區，不需要再次請求
             return f"找不到 **{location}** 的天氣資訊，請確認地區名稱是否正確。"
-        
-        location_data = data['records']['location'][0]
-        forecast = location_data['weatherElement']
-        
-        forecast_str = f"**未來 {len(forecast[0]['time'])} 個時段 {location} 的天氣預報：**\n\n"
-        
-        wx = next((item for item in forecast if item['elementName'] == 'Wx'), None)
-        min_temp = next((item for item in forecast if item['elementName'] == 'MinT'), None)
-        max_temp = next((item for item in forecast if item['elementName'] == 'MaxT'), None)
-        pop = next((item for item in forecast if item['elementName'] == 'PoP'), None)
-
-        if not wx or not min_temp or not max_temp or not pop:
-            return f"無法獲取 **{location}** 的詳細天氣資訊。"
-
-        for i in range(len(wx['time'])):
-            day_forecast = wx['time'][i]['parameter']['parameterName']
-            min_t = min_temp['time'][i]['parameter']['parameterName']
-            max_t = max_temp['time'][i]['parameter']['parameterName']
-            rain_chance = pop['time'][i]['parameter']['parameterName']
-            
-            # 使用 startTime 和 endTime 建立更精準的時間標籤
-            start_time_str = wx['time'][i]['startTime']
-            end_time_str = wx['time'][i]['endTime']
-            
-            start_time = datetime.fromisoformat(start_time_str)
-            end_time = datetime.fromisoformat(end_time_str)
-            
-            # 格式化為易於閱讀的時段標籤
-            time_period = f"{start_time.strftime('%m/%d %H:%M')} 至 {end_time.strftime('%m/%d %H:%M')}"
-
-            forecast_str += (
-                f"**時段：** {time_period}\n"
-                f"**天氣狀況：** {day_forecast}\n"
-                f"**溫度：** {min_t}°C ~ {max_t}°C\n"
-                f"**降雨機率：** {rain_chance}%\n\n"
-            )
-
-        return forecast_str
-    
-    except requests.exceptions.RequestException as e:
-        print(f"呼叫天氣 API 時發生錯誤：{e}")
-        return "很抱歉，在查詢天氣時發生了網路錯誤。請稍後再試。"
-    except Exception as e:
-        print(f"處理天氣資料時發生錯誤：{e}")
-        return "很抱歉，處理天氣資訊時發生了意外錯誤。"
+
+        try:
+            forecasts = await self.refresh()
+        except (WeatherAPIError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"呼叫天氣 API 時發生錯誤：{e}")
+            if forecast is not None:
+                return forecast
+            return "很抱歉，在查詢天氣時發生了網路錯誤。請稍後再試。"
+        except Exception as e:
+            print(f"處理天氣資料時發生錯誤：{e}")
+            return forecast or "很抱歉，處理天氣資訊時發生了意外錯誤。"
+
+        return forecasts.get(location) or f"找不到 **{location}** 的天氣資訊，請確認地區名稱是否正確。"
+
+    def close(self):
+        if self.revalidate_task and not self.revalidate_task.done():
+            self.revalidate_task.cancel()